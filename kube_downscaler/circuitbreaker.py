@@ -0,0 +1,80 @@
+import threading
+from typing import Optional
+
+
+class RetryBudget:
+    """
+    Retries shared by all API calls of one cycle.
+
+    A retry is only allowed while the retries of the cycle stay below min_retries plus ratio times the number of
+    successful calls, so an overloaded API server is not flooded with retries.
+    """
+
+    def __init__(self, ratio: float, min_retries: int = 10):
+        self.ratio = ratio
+        self.min_retries = min_retries
+        self.lock = threading.Lock()
+        self.successes = 0
+        self.retries = 0
+        self.denied = 0
+
+    def reset(self):
+        with self.lock:
+            self.successes = 0
+            self.retries = 0
+            self.denied = 0
+
+    def record_success(self):
+        with self.lock:
+            self.successes += 1
+
+    def try_spend(self) -> bool:
+        with self.lock:
+            if self.retries < self.min_retries + self.ratio * self.successes:
+                self.retries += 1
+                return True
+            self.denied += 1
+            return False
+
+
+class CircuitBreaker:
+    """
+    Open the circuit for the rest of the cycle after threshold consecutive 429 or 5xx responses.
+
+    While the circuit is open, non-essential calls (events, health checks) are skipped and resources which have not
+    been processed yet are deferred to the next cycle.
+    """
+
+    def __init__(self, threshold: int):
+        self.threshold = threshold
+        self.lock = threading.Lock()
+        self.consecutive_failures = 0
+        self.is_open = False
+        self.reason: Optional[str] = None
+        self.deferred = 0
+
+    def reset(self):
+        with self.lock:
+            self.consecutive_failures = 0
+            self.is_open = False
+            self.reason = None
+            self.deferred = 0
+
+    def record_success(self):
+        with self.lock:
+            self.consecutive_failures = 0
+
+    def record_failure(self, status_code: int, context_msg: Optional[str] = None):
+        with self.lock:
+            self.consecutive_failures += 1
+            if self.is_open or self.consecutive_failures < self.threshold:
+                return
+            self.is_open = True
+            self.reason = f"{self.consecutive_failures} consecutive overload responses from the API server (last: HTTP {status_code}"
+            if context_msg:
+                self.reason += f" for {context_msg}"
+            self.reason += ")"
+
+    def defer(self, count: int = 1):
+        with self.lock:
+            self.deferred += count
@@ -0,0 +1,173 @@
+import logging
+import multiprocessing
+import os
+import time
+from typing import Callable
+from typing import Dict
+from typing import List
+from typing import NamedTuple
+from typing import Optional
+from typing import Union
+
+import pykube
+
+logger = logging.getLogger(__name__)
+
+# delay before the process of a crashed cluster is restarted, doubled on every crash up to the maximum
+RESTART_DELAY_SECONDS = 5.0
+MAX_RESTART_DELAY_SECONDS = 300.0
+# how often the processes of the clusters are checked
+SUPERVISE_INTERVAL_SECONDS = 1.0
+# modules imported once by the fork server, shared copy-on-write by the processes of all clusters
+FORKSERVER_PRELOAD = ["kube_downscaler.main"]
+
+
+class Cluster(NamedTuple):
+    """A context of a kubeconfig file (its current context if None), reconciled by a process of its own."""
+
+    name: str
+    kubeconfig: str
+    context: Optional[str]
+
+
+def get_clusters(kubeconfig_contexts: str, kubeconfig_dir: str) -> List[Cluster]:
+    """
+    Return the clusters of --kubeconfig-contexts and --kubeconfig-dir.
+
+    Contexts are looked up in the kubeconfig of the KUBECONFIG environment variable (default: ~/.kube/config),
+    every file of the directory not starting with a dot is a kubeconfig for one cluster, named after the file.
+    """
+    clusters = []
+    if kubeconfig_contexts:
+        path = os.path.expanduser(os.getenv("KUBECONFIG", "~/.kube/config"))
+        contexts = load_kubeconfig(path).contexts
+        for context in kubeconfig_contexts.split(","):
+            if context not in contexts:
+                raise ValueError(f"context {context} not found in {path}")
+            clusters.append(Cluster(context, path, context))
+    if kubeconfig_dir:
+        try:
+            file_names = sorted(os.listdir(kubeconfig_dir))
+        except OSError as e:
+            raise ValueError(f"cannot read kubeconfig directory {kubeconfig_dir}: {e}")
+        for file_name in file_names:
+            path = os.path.join(kubeconfig_dir, file_name)
+            # Secrets mounted as volumes come with hidden ..data directories
+            if file_name.startswith(".") or not os.path.isfile(path):
+                continue
+            load_kubeconfig(path)
+            clusters.append(Cluster(os.path.splitext(file_name)[0], path, None))
+
+    names = [cluster.name for cluster in clusters]
+    duplicates = sorted({name for name in names if names.count(name) > 1})
+    if duplicates:
+        raise ValueError(f"duplicate cluster names: {', '.join(duplicates)}")
+    return clusters
+
+
+def load_kubeconfig(path: str) -> pykube.KubeConfig:
+    try:
+        return pykube.KubeConfig.from_file(path)
+    except Exception as e:
+        raise ValueError(f"invalid kubeconfig {path}: {e}")
+
+
+def run_cluster(cluster: Cluster, args: List[str]):
+    """Run the main loop for one cluster, in the process of that cluster."""
+    # imported here, main imports this module
+    from kube_downscaler.main import main
+
+    main(args, cluster)
+
+
+class ClusterProcesses:
+    """
+    One process per cluster, each running the main loop with the same arguments against its own kubeconfig.
+
+    The downscaler keeps its API client, rate limiter, retry budget, circuit breaker, informer cache and namespace
+    policies in module globals, so clusters are isolated by processes rather than threads. To keep the footprint
+    of many clusters low, processes are forked from a fork server which imported the downscaler once: the
+    interpreter and the modules are shared copy-on-write, a process adds about 4 MiB of private memory at startup
+    instead of about 26 MiB for a spawned interpreter, plus the clients, caches and threads of its cycles. Clusters
+    run their cycles concurrently and a slow or unreachable API server only delays its own cluster. A process which
+    crashes is restarted with backoff, one which returns (e.g. with --once) is not.
+    """
+
+    def __init__(
+        self,
+        clusters: List[Cluster],
+        args: List[str],
+        target: Callable[[Cluster, List[str]], None] = run_cluster,
+    ):
+        self.clusters = clusters
+        self.args = args
+        self.target = target
+        # every process starts from a clean module state, forked from the fork server where available
+        self.context: Union[
+            multiprocessing.context.ForkServerContext,
+            multiprocessing.context.SpawnContext,
+        ]
+        if "forkserver" in multiprocessing.get_all_start_methods():
+            self.context = multiprocessing.get_context("forkserver")
+            self.context.set_forkserver_preload(FORKSERVER_PRELOAD)
+        else:
+            self.context = multiprocessing.get_context("spawn")
+        self.processes: Dict[str, multiprocessing.process.BaseProcess] = {}
+        self.started_at: Dict[str, float] = {}
+        self.restart_at: Dict[str, float] = {}
+        self.restart_delays: Dict[str, float] = {}
+
+    def start(self, cluster: Cluster):
+        process = self.context.Process(
+            target=self.target,
+            args=(cluster, self.args),
+            name=f"cluster-{cluster.name}",
+        )
+        process.start()
+        self.processes[cluster.name] = process
+        self.started_at[cluster.name] = time.monotonic()
+
+    def run(self, handler):
+        """Supervise the processes until all of them returned or handler received a shutdown signal."""
+        for cluster in self.clusters:
+            self.start(cluster)
+        logger.info(
+            f"Reconciling {len(self.clusters)} clusters in their own processes: {', '.join(self.processes)}"
+        )
+        running = {cluster.name: cluster for cluster in self.clusters}
+        while running and not handler.shutdown_now:
+            self.supervise(running, time.monotonic())
+            time.sleep(SUPERVISE_INTERVAL_SECONDS)
+        self.stop()
+
+    def supervise(self, running: Dict[str, Cluster], now: float):
+        for name, cluster in list(running.items()):
+            if name in self.restart_at:
+                if now >= self.restart_at[name]:
+                    del self.restart_at[name]
+                    self.start(cluster)
+                continue
+            process = self.processes[name]
+            if process.is_alive():
+                continue
+            if process.exitcode == 0:
+                logger.info(f"Process of cluster {name} exited")
+                del running[name]
+                continue
+            delay = self.restart_delays.get(name, RESTART_DELAY_SECONDS)
+            if now - self.started_at[name] > MAX_RESTART_DELAY_SECONDS:
+                # it ran fine for a while, start over with the shortest delay
+                delay = RESTART_DELAY_SECONDS
+            logger.warning(
+                f"Process of cluster {name} exited with code {process.exitcode}, restarting it in {delay:.0f}s"
+            )
+            self.restart_at[name] = now + delay
+            self.restart_delays[name] = min(delay * 2, MAX_RESTART_DELAY_SECONDS)
+
+    def stop(self):
+        """Forward the shutdown to the processes, they finish their cycle and release their Leases."""
+        for process in self.processes.values():
+            if process.is_alive():
+                process.terminate()
+        for process in self.processes.values():
+            process.join()
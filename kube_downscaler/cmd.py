@@ -1,6 +1,7 @@
 import argparse
 import os
 
+
 VALID_RESOURCES = frozenset(
     [
         "deployments",
@@ -45,6 +46,23 @@ def get_parser():
     parser.add_argument(
         "--interval", type=int, help="Loop interval (default: 30s)", default=30
     )
+    parser.add_argument(
+        "--max-resync-interval",
+        type=int,
+        help="Sleep until the next uptime/downtime transition instead of --interval, running a full cycle at least every N seconds (0 disables, default: 0)",
+        default=os.getenv("MAX_RESYNC_INTERVAL", 0),
+    )
+    parser.add_argument(
+        "--incremental",
+        help="Re-evaluate only resources whose resourceVersion or schedule inputs changed, or whose schedule crossed a boundary, since the previous cycle (default: false)",
+        action="store_true",
+    )
+    parser.add_argument(
+        "--full-resync-interval",
+        type=int,
+        help="With --incremental, evaluate all resources again at least every N seconds (default: 3600s)",
+        default=os.getenv("FULL_RESYNC_INTERVAL", 3600),
+    )
     parser.add_argument(
         "--upscale-target-only",
         help="Upscale only resource in target when waking up namespaces",
@@ -89,6 +107,28 @@ def get_parser():
         help="Maximum burst of requests allowed above the QPS limit. Defines how many requests can be sent at once (0 disables bursting).",
         default=os.getenv("BURST", 0),
     )
+    parser.add_argument(
+        "--retry-budget",
+        type=float,
+        help="Maximum ratio of retries to successful API calls within one cycle, on top of 10 retries always allowed (0 disables the budget, default: 0)",
+        default=os.getenv("RETRY_BUDGET", 0),
+    )
+    parser.add_argument(
+        "--circuit-breaker-threshold",
+        type=int,
+        help="Number of consecutive 429/5xx responses after which events and health checks are stopped and the remaining resources are deferred to the next cycle (0 disables, default: 0)",
+        default=os.getenv("CIRCUIT_BREAKER_THRESHOLD", 0),
+    )
+    parser.add_argument(
+        "--adaptive-rate-limit",
+        help="Lower the --qps rate limit when the API server throttles requests (HTTP 429) and raise it back gradually (default: false)",
+        action="store_true",
+    )
+    parser.add_argument(
+        "--request-costs",
+        help="Tokens charged per request verb by the rate limiter, comma separated <verb>=<tokens> pairs, e.g. list=5,watch=2 (default: 1 token per request)",
+        default=os.getenv("REQUEST_COSTS", ""),
+    )
     parser.add_argument(
         "--max-retries-on-throttling",
         type=int,
@@ -142,6 +182,12 @@ def get_parser():
         help="Emit Kubernetes events for scale up/down",
         action="store_true",
     )
+    parser.add_argument(
+        "--events-api",
+        choices=["core", "events.k8s.io"],
+        help="API used to emit events with --enable-events: core/v1 Events or events.k8s.io/v1 Events with event series (default: core)",
+        default=os.getenv("EVENTS_API", "core"),
+    )
     parser.add_argument(
         "--matching-labels",
         default=os.getenv("MATCHING_LABELS", ""),
@@ -152,6 +198,128 @@ def get_parser():
         default=os.getenv("ADMISSION_CONTROLLER", ""),
         help="Apply downscaling to jobs using the supplied admission controller. Jobs should be included inside --include-resources if you want to use this parameter. kyverno and gatekeeper are supported.",
     )
+    parser.add_argument(
+        "--minimal-patches",
+        help="Send only the changed fields (replicas, suspend, nodeSelector and annotations) instead of the whole object when scaling, and skip writes that would not change anything (default: false)",
+        action="store_true",
+    )
+    parser.add_argument(
+        "--workers",
+        type=int,
+        help="Number of worker threads reconciling resources concurrently, resources of the same namespace are always processed in order (default: 1)",
+        default=os.getenv("WORKERS", 1),
+    )
+    parser.add_argument(
+        "--processes",
+        type=int,
+        help="Number of worker processes evaluating disjoint shards of namespaces, each with its own API client and an even share of --qps/--burst (default: 1, no worker processes)",
+        default=os.getenv("PROCESSES", 1),
+    )
+    parser.add_argument(
+        "--list-page-size",
+        type=int,
+        help="Maximum number of objects requested per page when listing resources (0 disables pagination)",
+        default=os.getenv("LIST_PAGE_SIZE", 0),
+    )
+    parser.add_argument(
+        "--list-concurrency",
+        type=int,
+        help="Maximum number of namespaces queried concurrently in constrained mode (default: 1)",
+        default=os.getenv("LIST_CONCURRENCY", 1),
+    )
+    parser.add_argument(
+        "--connection-pool-size",
+        type=int,
+        help="Maximum number of connections kept open to the Kubernetes API Server, should match the number of concurrent workers (default: 10)",
+        default=os.getenv("CONNECTION_POOL_SIZE", 10),
+    )
+    parser.add_argument(
+        "--informer-cache",
+        help="Keep resources in an in-memory cache fed by LIST and WATCH instead of listing them on every cycle (default: false)",
+        action="store_true",
+    )
+    parser.add_argument(
+        "--informer-resync-period",
+        type=int,
+        help="Interval in seconds after which the informer cache relists all resources (default: 600s)",
+        default=os.getenv("INFORMER_RESYNC_PERIOD", 600),
+    )
+    parser.add_argument(
+        "--leader-election",
+        help="Run as one of several replicas electing a leader with a Lease, only the leader scales resources while the others stay on hot standby (default: false)",
+        action="store_true",
+    )
+    parser.add_argument(
+        "--leader-election-lease-name",
+        help="Name of the Lease used for leader election (default: py-kube-downscaler)",
+        default=os.getenv("LEADER_ELECTION_LEASE_NAME", "py-kube-downscaler"),
+    )
+    parser.add_argument(
+        "--leader-election-namespace",
+        help="Namespace of the Lease used for leader election (default: the namespace of the pod)",
+        default=os.getenv("LEADER_ELECTION_NAMESPACE", ""),
+    )
+    parser.add_argument(
+        "--leader-election-lease-duration",
+        type=float,
+        help="Seconds after which standby replicas take over a Lease that was not renewed (default: 15s)",
+        default=os.getenv("LEADER_ELECTION_LEASE_DURATION", 15),
+    )
+    parser.add_argument(
+        "--leader-election-renew-deadline",
+        type=float,
+        help="Seconds after which the leader steps down if it could not renew the Lease (default: 10s)",
+        default=os.getenv("LEADER_ELECTION_RENEW_DEADLINE", 10),
+    )
+    parser.add_argument(
+        "--leader-election-retry-period",
+        type=float,
+        help="Seconds between two attempts to acquire or renew the Lease (default: 2s)",
+        default=os.getenv("LEADER_ELECTION_RETRY_PERIOD", 2),
+    )
+    parser.add_argument(
+        "--shard-index",
+        type=int,
+        help="Index of the shard of namespaces this replica scales, from 0 to --shard-count - 1 (default: 0)",
+        default=os.getenv("SHARD_INDEX", 0),
+    )
+    parser.add_argument(
+        "--shard-count",
+        type=int,
+        help="Number of replicas the namespaces are sharded across, each started with its own --shard-index (default: 1)",
+        default=os.getenv("SHARD_COUNT", 1),
+    )
+    parser.add_argument(
+        "--dynamic-sharding",
+        help="Shard the namespaces across the replicas alive in the group, discovered through their Leases (default: false)",
+        action="store_true",
+    )
+    parser.add_argument(
+        "--shard-group",
+        help="Group of replicas sharing the namespaces with --dynamic-sharding, also the prefix of their Leases (default: py-kube-downscaler)",
+        default=os.getenv("SHARD_GROUP", "py-kube-downscaler"),
+    )
+    parser.add_argument(
+        "--shard-lease-namespace",
+        help="Namespace of the Leases of --dynamic-sharding (default: the namespace of the pod)",
+        default=os.getenv("SHARD_LEASE_NAMESPACE", ""),
+    )
+    parser.add_argument(
+        "--shard-lease-duration",
+        type=float,
+        help="Seconds after which a replica which did not renew its Lease leaves the group with --dynamic-sharding (default: 15s)",
+        default=os.getenv("SHARD_LEASE_DURATION", 15),
+    )
+    parser.add_argument(
+        "--kubeconfig-contexts",
+        help="Reconcile several clusters, comma separated list of contexts of the kubeconfig, each in its own process (default: the current cluster only)",
+        default=os.getenv("KUBECONFIG_CONTEXTS", ""),
+    )
+    parser.add_argument(
+        "--kubeconfig-dir",
+        help="Reconcile several clusters, one per kubeconfig file of this directory, each in its own process (default: the current cluster only)",
+        default=os.getenv("KUBECONFIG_DIR", ""),
+    )
     parser.add_argument(
         "--json-logs",
         help="Output logs in JSON format instead of plain text (default: false)",
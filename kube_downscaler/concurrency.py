@@ -0,0 +1,67 @@
+import collections
+import contextvars
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable
+from typing import Dict
+from typing import Iterable
+from typing import List
+from typing import TypeVar
+
+T = TypeVar("T")
+R = TypeVar("R")
+
+
+def map_bounded(
+    func: Callable[[T], R],
+    items: Iterable[T],
+    max_workers: int,
+    thread_name_prefix: str = "downscaler",
+) -> List[R]:
+    """
+    Apply func to every item using at most max_workers threads.
+
+    Results are returned in input order. The first exception raised by func is re-raised, like a serial loop would do.
+    With max_workers <= 1 the items are processed serially in the calling thread.
+    """
+    items = list(items)
+    if max_workers <= 1 or len(items) <= 1:
+        return [func(item) for item in items]
+    with ThreadPoolExecutor(
+        max_workers=min(max_workers, len(items)), thread_name_prefix=thread_name_prefix
+    ) as executor:
+        # copy the context so context variables of the caller are visible in the worker threads
+        futures = [
+            executor.submit(contextvars.copy_context().run, func, item)
+            for item in items
+        ]
+        return [future.result() for future in futures]
+
+
+class WorkerStats:
+    """Count the resources processed by each worker thread during one cycle."""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.processed: Dict[str, int] = collections.defaultdict(int)
+        self.busy_seconds: Dict[str, float] = collections.defaultdict(float)
+
+    def record(self, processed: int, busy_seconds: float):
+        worker = threading.current_thread().name
+        with self.lock:
+            self.processed[worker] += processed
+            self.busy_seconds[worker] += busy_seconds
+
+    def summary(self) -> str:
+        with self.lock:
+            workers = sorted(self.processed)
+            if not workers:
+                return "no resources processed"
+            parts = []
+            for worker in workers:
+                busy_seconds = self.busy_seconds[worker]
+                rate = self.processed[worker] / busy_seconds if busy_seconds else 0.0
+                parts.append(
+                    f"{worker}: {self.processed[worker]} resources in {busy_seconds:.2f}s ({rate:.1f}/s)"
+                )
+            return ", ".join(parts)
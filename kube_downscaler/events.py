@@ -0,0 +1,237 @@
+import collections
+import datetime
+import logging
+import os
+import queue
+import threading
+from typing import Any
+from typing import Dict
+from typing import NamedTuple
+from typing import Optional
+from typing import Tuple
+
+import pykube
+import requests
+from pykube.exceptions import HTTPError
+
+from kube_downscaler import helper
+from kube_downscaler.resources.event import EventsV1Event
+from kube_downscaler.tokenbucket import LANE_BACKGROUND
+
+logger = logging.getLogger(__name__)
+
+EVENT_QUEUE_SIZE = 1000
+EVENT_CACHE_SIZE = 4096
+EVENT_BATCH_SIZE = 100
+FLUSH_INTERVAL_SECONDS = 1.0
+REPORTING_CONTROLLER = "py-kube-downscaler"
+
+
+class EventRecord(NamedTuple):
+    api: Any
+    involved_object: dict
+    reason: str
+    message: str
+    event_type: str
+    timestamp: datetime.datetime
+
+    @property
+    def key(self) -> Tuple[Optional[str], str, str]:
+        return self.involved_object["uid"], self.reason, self.message
+
+
+class EventRecorder:
+    """
+    Emit Kubernetes Events from a background thread, off the scaling path.
+
+    Records are put on a bounded queue and dropped when it is full. The queue is flushed in batches: records of the
+    same object, reason and message are merged into one write, and events emitted before are found in a local LRU
+    cache and bumped with a patch instead of being listed. With series=True the events are written to the
+    events.k8s.io/v1 API, where repetitions are recorded as an event series.
+    """
+
+    def __init__(
+        self,
+        series: bool = False,
+        queue_size: int = EVENT_QUEUE_SIZE,
+        cache_size: int = EVENT_CACHE_SIZE,
+    ):
+        self.series = series
+        self.queue: queue.Queue = queue.Queue(maxsize=queue_size)
+        self.cache: collections.OrderedDict = collections.OrderedDict()
+        self.cache_size = cache_size
+        self.lock = threading.Lock()
+        self.dropped = 0
+        self.stopping = threading.Event()
+        self.thread: Optional[threading.Thread] = None
+
+    def start(self):
+        self.thread = threading.Thread(
+            target=self.run, name="event-recorder", daemon=True
+        )
+        self.thread.start()
+
+    def stop(self, timeout: float = 10.0):
+        """Write the queued events and stop the background thread."""
+        self.stopping.set()
+        if self.thread is not None:
+            self.thread.join(timeout)
+
+    def record(
+        self, resource, message: str, reason: str, event_type: str, dry_run: bool
+    ):
+        if dry_run:
+            return
+        record = EventRecord(
+            resource.api,
+            {
+                "apiVersion": resource.version,
+                "name": resource.name,
+                "namespace": resource.namespace,
+                "kind": resource.kind,
+                "resourceVersion": resource.metadata.get("resourceVersion"),
+                # https://kubernetes.io/docs/concepts/overview/working-with-objects/names/#uids
+                "uid": resource.metadata.get("uid"),
+            },
+            reason,
+            message,
+            event_type,
+            datetime.datetime.now(datetime.timezone.utc),
+        )
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            with self.lock:
+                self.dropped += 1
+            logger.debug(
+                f"Event queue is full, dropping {reason} event for {resource.namespace}/{resource.name}"
+            )
+
+    def run(self):
+        while not (self.stopping.is_set() and self.queue.empty()):
+            try:
+                batch = [self.queue.get(timeout=FLUSH_INTERVAL_SECONDS)]
+            except queue.Empty:
+                continue
+            while len(batch) < EVENT_BATCH_SIZE:
+                try:
+                    batch.append(self.queue.get_nowait())
+                except queue.Empty:
+                    break
+            self.flush(batch)
+
+    def flush(self, batch):
+        grouped: collections.OrderedDict = collections.OrderedDict()
+        for record in batch:
+            if record.key in grouped:
+                count = grouped[record.key][1]
+                grouped[record.key] = (record, count + 1)
+            else:
+                grouped[record.key] = (record, 1)
+        for record, count in grouped.values():
+            if helper.circuit_open():
+                logger.debug(
+                    f"Skipping {record.reason} event for {record.involved_object['namespace']}/{record.involved_object['name']}, circuit breaker is open"
+                )
+                continue
+            try:
+                self.emit(record, count)
+            except Exception as e:
+                logger.error(
+                    f"Could not write {record.reason} event for {record.involved_object['namespace']}/{record.involved_object['name']}: {e}"
+                )
+
+    def emit(self, record: EventRecord, count: int):
+        event = self.cache.pop(record.key, None)
+        if event is not None:
+            try:
+                self.bump(event, record, count)
+            except (requests.HTTPError, HTTPError) as e:
+                # the event may have expired on the API server, emit a new one
+                logger.debug(
+                    f"Could not update {record.reason} event for {record.involved_object['namespace']}/{record.involved_object['name']}: {e}"
+                )
+                event = None
+        if event is None:
+            event = self.create(record, count)
+        self.cache[record.key] = event
+        while len(self.cache) > self.cache_size:
+            self.cache.popitem(last=False)
+
+    def create(self, record: EventRecord, count: int):
+        if self.series:
+            event = EventsV1Event(record.api, self.series_event_obj(record, count))
+        else:
+            timestamp = record.timestamp.strftime("%Y-%m-%dT%H:%M:%SZ")
+            event = pykube.Event(
+                record.api,
+                {
+                    "metadata": {
+                        "namespace": record.involved_object["namespace"],
+                        "generateName": "py-kube-downscaler-",
+                    },
+                    "type": record.event_type,
+                    "count": count,
+                    "firstTimestamp": timestamp,
+                    "lastTimestamp": timestamp,
+                    "reason": record.reason,
+                    "involvedObject": record.involved_object,
+                    "message": record.message,
+                    "source": {"component": REPORTING_CONTROLLER},
+                },
+            )
+        helper.call_with_exponential_backoff(
+            lambda: event.create(),
+            context_msg=f"creating event for {record.involved_object['namespace']}/{record.involved_object['name']}",
+            verb="create",
+            lane=LANE_BACKGROUND,
+        )
+        return event
+
+    def bump(self, event, record: EventRecord, count: int):
+        patch: Dict[str, Any]
+        if self.series:
+            series = event.obj.get("series") or {"count": 1}
+            patch = {
+                "series": {
+                    "count": series["count"] + count,
+                    "lastObservedTime": micro_time(record.timestamp),
+                }
+            }
+        else:
+            patch = {
+                "count": event.obj.get("count", 1) + count,
+                "lastTimestamp": record.timestamp.strftime("%Y-%m-%dT%H:%M:%SZ"),
+            }
+        helper.call_with_exponential_backoff(
+            lambda: event.patch(patch),
+            context_msg=f"updating event for {record.involved_object['namespace']}/{record.involved_object['name']}",
+            verb="patch",
+            lane=LANE_BACKGROUND,
+        )
+
+    def series_event_obj(self, record: EventRecord, count: int) -> dict:
+        obj = {
+            "metadata": {
+                "namespace": record.involved_object["namespace"],
+                "generateName": "py-kube-downscaler-",
+            },
+            "eventTime": micro_time(record.timestamp),
+            "type": record.event_type,
+            "reason": record.reason,
+            "action": record.reason,
+            "regarding": record.involved_object,
+            "note": record.message,
+            "reportingController": REPORTING_CONTROLLER,
+            "reportingInstance": os.getenv("HOSTNAME", REPORTING_CONTROLLER),
+        }
+        if count > 1:
+            obj["series"] = {
+                "count": count,
+                "lastObservedTime": micro_time(record.timestamp),
+            }
+        return obj
+
+
+def micro_time(timestamp: datetime.datetime) -> str:
+    return timestamp.strftime("%Y-%m-%dT%H:%M:%S.%fZ")
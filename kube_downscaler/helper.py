@@ -2,109 +2,221 @@ import datetime
 import json
 import logging
 import os
-import re
 import sys
+import threading
 import time
+from typing import Any
 from typing import Callable
-from typing import Match
+from typing import Dict
+from typing import List
 from typing import Optional
+from typing import Tuple
+from typing import TYPE_CHECKING
 from typing import TypeVar
+from typing import Union
 
 import pykube
-import pytz
 import requests
-
+from pykube.exceptions import HTTPError
+from pykube.query import Query
+
+from kube_downscaler.circuitbreaker import CircuitBreaker
+from kube_downscaler.circuitbreaker import RetryBudget
+from kube_downscaler.timespec import compile_time_spec
+from kube_downscaler.timespec import record_time_spec
+from kube_downscaler.tokenbucket import AdaptiveRateLimiter
+from kube_downscaler.tokenbucket import LANE_BACKGROUND
+from kube_downscaler.tokenbucket import LANE_DEFAULT
+from kube_downscaler.tokenbucket import LANE_SCALE
 from kube_downscaler.tokenbucket import TokenBucket
 
+if TYPE_CHECKING:
+    from kube_downscaler.events import EventRecorder
+
 logger = logging.getLogger(__name__)
 
+# requests raises for the raw API calls, pykube for the requests of its objects (create/update/patch/delete/get)
+ApiError = Union[requests.HTTPError, HTTPError]
+API_ERRORS = (requests.HTTPError, HTTPError)
+
 DEFAULT_TIMEZONE = os.getenv("DEFAULT_TIMEZONE", None)
 DEFAULT_WEEKFRAME = os.getenv("DEFAULT_WEEKFRAME", None)
 
-WEEKDAYS = ["MON", "TUE", "WED", "THU", "FRI", "SAT", "SUN"]
-
-TIME_SPEC_PATTERN = re.compile(
-    r"^([a-zA-Z]{3})-([a-zA-Z]{3}) (\d\d):(\d\d)-(\d\d):(\d\d) (?P<tz>[a-zA-Z/_]+)$"
-)
-TIME_SPEC_PATTERN_WO_TZ = re.compile(r".*(\d\d)$")
-TIME_SPEC_PATTERN_WO_WF = re.compile(
-    r"^(\d\d):(\d\d)-(\d\d):(\d\d) (?P<tz>[a-zA-Z/_]+)$"
-)
-_ISO_8601_TIME_SPEC_PATTERN = r"(\d{4}-\d{2}-\d{2}T\d{2}:\d{2}:\d{2}[-+]\d{2}:\d{2})"
-ABSOLUTE_TIME_SPEC_PATTERN = re.compile(
-    r"^{0}-{0}$".format(_ISO_8601_TIME_SPEC_PATTERN)
-)
+SERVICE_ACCOUNT_TOKEN_PATH = "/var/run/secrets/kubernetes.io/serviceaccount/token"
 TOKEN_BUCKET: TokenBucket
+RATE_LIMITER: Optional[AdaptiveRateLimiter] = None
+RETRY_BUDGET: Optional[RetryBudget] = None
+CIRCUIT_BREAKER: Optional[CircuitBreaker] = None
+EVENT_RECORDER: Optional["EventRecorder"] = None
 MAX_RETRIES: int
+LIST_PAGE_SIZE = 0
+LIST_CONCURRENCY = 1
+# kubeconfig file and context API clients are created from, KubeConfig.from_env() if None
+KUBE_CONFIG: Optional[Tuple[str, Optional[str]]] = None
+# with --leader-election, whether this replica still holds the Lease, checked before every scale write
+LEADER_CHECK: Optional[Callable[[], bool]] = None
 
 
-def matches_time_spec(time: datetime.datetime, spec: str):
-    if spec.lower() == "always":
-        return True
-    elif spec.lower() == "never":
-        return False
-    for spec_ in spec.split(","):
-        spec_ = spec_.strip()
-        match = TIME_SPEC_PATTERN_WO_TZ.match(spec_)
-        if match and not ABSOLUTE_TIME_SPEC_PATTERN.match(spec_):
-            if DEFAULT_TIMEZONE:
-                spec_ = spec_ + " " + DEFAULT_TIMEZONE
-            else:
-                raise ValueError(
-                    "No default timezone defined in environment variable 'DEFAULT_TIMEZONE'"
-                )
-        if TIME_SPEC_PATTERN_WO_WF.match(spec_):
-            if DEFAULT_WEEKFRAME:
-                spec_ = DEFAULT_WEEKFRAME + " " + spec_
-            else:
-                raise ValueError(
-                    "No default week frame defined in environment variable 'DEFAULT_WEEKFRAME'"
-                )
-        recurring_match = TIME_SPEC_PATTERN.match(spec_)
-        if recurring_match is not None and _matches_recurring_time_spec(
-            time, recurring_match
-        ):
-            return True
-        absolute_match = ABSOLUTE_TIME_SPEC_PATTERN.match(spec_)
-        if absolute_match and _matches_absolute_time_spec(time, absolute_match):
-            return True
-        if not recurring_match and not absolute_match:
-            raise ValueError(
-                f'Time spec value "{spec_}" does not match format ("Mon-Fri 06:30-20:30 Europe/Berlin" or "2019-01-01T00:00:00+00:00-2019-01-02T12:34:56+00:00")'
-            )
-    return False
+class NotLeaderError(Exception):
+    """Raised instead of sending a scale write when this replica is no longer the leader."""
 
 
-def _matches_recurring_time_spec(time: datetime.datetime, match: Match):
-    tz = pytz.timezone(match.group("tz"))
-    local_time = tz.fromutc(time.replace(tzinfo=tz))
-    day_from = WEEKDAYS.index(match.group(1).upper())
-    day_to = WEEKDAYS.index(match.group(2).upper())
-    if day_from > day_to:
-        # wrap around, e.g. Sun-Fri (makes sense for countries with work week starting on Sunday)
-        day_matches = local_time.weekday() >= day_from or local_time.weekday() <= day_to
-    else:
-        # e.g. Mon-Fri
-        day_matches = day_from <= local_time.weekday() <= day_to
-    local_time_minutes = local_time.hour * 60 + local_time.minute
-    minute_from = int(match.group(3)) * 60 + int(match.group(4))
-    minute_to = int(match.group(5)) * 60 + int(match.group(6))
-    time_matches = minute_from <= local_time_minutes < minute_to
-    return day_matches and time_matches
+def matches_time_spec(time: datetime.datetime, spec: str):
+    time_spec = compile_time_spec(spec, DEFAULT_TIMEZONE, DEFAULT_WEEKFRAME)
+    record_time_spec(time_spec, time)
+    return time_spec.matches(time)
 
 
-def _matches_absolute_time_spec(time: datetime.datetime, match: Match):
-    time_from = datetime.datetime.fromisoformat(match.group(1))
-    time_to = datetime.datetime.fromisoformat(match.group(2))
-    return time_from <= time <= time_to
+def initialize_kube_config(path: Optional[str], context: Optional[str] = None):
+    global KUBE_CONFIG
+    KUBE_CONFIG = (path, context) if path is not None else None
 
 
-def get_kube_api(timeout: int):
-    config = pykube.KubeConfig.from_env()
-    api = pykube.HTTPClient(config, timeout=timeout)
+def get_kube_api(timeout: int, pool_size: Optional[int] = None):
+    if KUBE_CONFIG is not None:
+        path, context = KUBE_CONFIG
+        config = pykube.KubeConfig.from_file(path, current_context=context)
+    else:
+        config = pykube.KubeConfig.from_env()
+    if pool_size:
+        http_adapter = pykube.http.KubernetesHTTPAdapter(
+            config, pool_connections=pool_size, pool_maxsize=pool_size
+        )
+        api = pykube.HTTPClient(config, timeout=timeout, http_adapter=http_adapter)
+    else:
+        api = pykube.HTTPClient(config, timeout=timeout)
     return api
 
 
+def get_credentials_mtime() -> Optional[float]:
+    """Return the modification time of the file get_kube_api() reads credentials from."""
+    if KUBE_CONFIG is not None:
+        paths = [KUBE_CONFIG[0]]
+    else:
+        paths = [
+            SERVICE_ACCOUNT_TOKEN_PATH,
+            os.path.expanduser(os.getenv("KUBECONFIG", "~/.kube/config")),
+        ]
+    for path in paths:
+        try:
+            return os.stat(path).st_mtime
+        except OSError:
+            continue
+    return None
+
+
+class KubeApiProvider:
+    """Long-lived Kubernetes API client, reused across cycles and only rebuilt when the credentials change on disk."""
+
+    def __init__(self, timeout: int, pool_size: int = 10):
+        self.timeout = timeout
+        self.pool_size = pool_size
+        self.api = None
+        self.credentials_mtime: Optional[float] = None
+        self.connections_opened = 0
+        self.requests_sent = 0
+        # informer threads share the client with the main loop
+        self.lock = threading.Lock()
+
+    def get(self):
+        credentials_mtime = get_credentials_mtime()
+        with self.lock:
+            if self.api is None or credentials_mtime != self.credentials_mtime:
+                if self.api is not None:
+                    logger.info("Kubernetes credentials changed, recreating API client")
+                    self.api.session.close()
+                self.api = get_kube_api(self.timeout, self.pool_size)
+                self.credentials_mtime = credentials_mtime
+                self.connections_opened = 0
+                self.requests_sent = 0
+            return self.api
+
+    def connection_stats(self):
+        """Return the number of connections opened and reused since the last call."""
+        if self.api is None:
+            return 0, 0
+        connections_opened = 0
+        requests_sent = 0
+        for adapter in self.api.session.adapters.values():
+            pools = adapter.poolmanager.pools
+            for key in pools.keys():
+                pool = pools[key]
+                connections_opened += pool.num_connections
+                requests_sent += pool.num_requests
+        opened = connections_opened - self.connections_opened
+        sent = requests_sent - self.requests_sent
+        self.connections_opened = connections_opened
+        self.requests_sent = requests_sent
+        return opened, max(sent - opened, 0)
+
+
+def json_pointer(path: List[str]) -> str:
+    return "".join("/" + key.replace("~", "~0").replace("/", "~1") for key in path)
+
+
+def compute_json_patch(
+    original: dict, modified: dict, path: Optional[List[str]] = None
+) -> List[Dict[str, Any]]:
+    """
+    Return the JSON patch (RFC 6902) that turns original into modified, empty if nothing changed.
+
+    Every value which is replaced or removed is first checked with a test operation, so the API server rejects the
+    patch (422) instead of overwriting a concurrent change, e.g. of the replicas by an HPA or a user.
+    """
+    # None values delete the key on the API server
+    path = path or []
+    operations: List[Dict[str, Any]] = []
+    for key, value in modified.items():
+        pointer = json_pointer(path + [key])
+        # pykube adds empty labels and annotations on access, they may not exist on the API server
+        if key not in original or (
+            key in ("labels", "annotations") and original[key] == {}
+        ):
+            if isinstance(value, dict):
+                value = strip_none(value)
+            if value is not None and value != {}:
+                operations.append({"op": "add", "path": pointer, "value": value})
+        elif isinstance(value, dict) and isinstance(original[key], dict):
+            operations += compute_json_patch(original[key], value, path + [key])
+        elif value is None:
+            operations.append({"op": "test", "path": pointer, "value": original[key]})
+            operations.append({"op": "remove", "path": pointer})
+        elif value != original[key]:
+            operations.append({"op": "test", "path": pointer, "value": original[key]})
+            operations.append({"op": "replace", "path": pointer, "value": value})
+    for key in original:
+        if key not in modified:
+            pointer = json_pointer(path + [key])
+            operations.append({"op": "test", "path": pointer, "value": original[key]})
+            operations.append({"op": "remove", "path": pointer})
+    return operations
+
+
+def strip_none(obj: dict) -> dict:
+    """Return obj without the None values (deletions) and the dicts left empty by them."""
+    stripped = {}
+    for key, value in obj.items():
+        if isinstance(value, dict):
+            value = strip_none(value)
+            if not value:
+                continue
+        if value is not None:
+            stripped[key] = value
+    return stripped
+
+
+def json_patch(resource: pykube.objects.APIObject, operations: List[Dict[str, Any]]):
+    """Patch the resource with a JSON patch, pykube only sends merge patches."""
+    r = resource.api.patch(
+        **resource.api_kwargs(
+            headers={"Content-Type": "application/json-patch+json"},
+            data=json.dumps(operations),
+        )
+    )
+    resource.api.raise_for_status(r)
+    resource.set_obj(r.json())
+
+
 def parse_int_or_percent(value, context, allow_negative):
     s = str(value).strip()
 
@@ -135,6 +247,14 @@ def parse_int_or_percent(value, context, allow_negative):
 
 def add_event(resource, message: str, reason: str, event_type: str, dry_run: bool):
     uid = resource.metadata.get("uid")
+    if circuit_open():
+        logger.debug(
+            f"Skipping {reason} event for {resource.namespace}/{resource.name}, circuit breaker is open"
+        )
+        return None
+    if EVENT_RECORDER is not None:
+        EVENT_RECORDER.record(resource, message, reason, event_type, dry_run)
+        return None
     try:
         event = call_with_exponential_backoff(
             lambda: pykube.objects.Event.objects(resource.api)
@@ -148,6 +268,8 @@ def add_event(resource, message: str, reason: str, event_type: str, dry_run: boo
             )
             .get_or_none(),
             context_msg=f"getting event for id {uid}",
+            verb="list",
+            lane=LANE_BACKGROUND,
         )
     except requests.HTTPError as e:
         event = None
@@ -165,6 +287,8 @@ def add_event(resource, message: str, reason: str, event_type: str, dry_run: boo
             call_with_exponential_backoff(
                 lambda: event.update(),
                 context_msg=f"updating event for id {uid}",
+                verb="update",
+                lane=LANE_BACKGROUND,
             )
             return event
         except requests.HTTPError as e:
@@ -212,6 +336,8 @@ def create_event(resource, message: str, reason: str, event_type: str, dry_run:
             call_with_exponential_backoff(
                 lambda: event.create(),
                 context_msg=f"creating event for {resource.namespace}/{resource.name}",
+                verb="create",
+                lane=LANE_BACKGROUND,
             )
             return event
         except requests.HTTPError as e:
@@ -225,17 +351,22 @@ def create_event(resource, message: str, reason: str, event_type: str, dry_run:
 
 
 class JsonFormatter(logging.Formatter):
+    def __init__(self, cluster: Optional[str] = None):
+        super().__init__()
+        self.cluster = cluster
+
     def format(self, record: logging.LogRecord) -> str:
-        return json.dumps(
-            {
-                "time": self.formatTime(record),
-                "severity": record.levelname,
-                "message": record.getMessage().replace('"', "'"),
-            }
-        )
+        entry = {
+            "time": self.formatTime(record),
+            "severity": record.levelname,
+            "message": record.getMessage().replace('"', "'"),
+        }
+        if self.cluster is not None:
+            entry["cluster"] = self.cluster
+        return json.dumps(entry)
 
 
-def setup_logging(debug: bool, json_logs: bool):
+def setup_logging(debug: bool, json_logs: bool, cluster: Optional[str] = None):
     root_logger = logging.getLogger()
     root_logger.handlers.clear()
     root_logger.setLevel(logging.DEBUG if debug else logging.INFO)
@@ -244,7 +375,12 @@ def setup_logging(debug: bool, json_logs: bool):
 
     formatter: logging.Formatter
     if json_logs:
-        formatter = JsonFormatter()
+        formatter = JsonFormatter(cluster)
+    elif cluster is not None:
+        # processes of several clusters share the same stream
+        formatter = logging.Formatter(
+            f"%(asctime)s %(levelname)s: [{cluster.replace('%', '%%')}] %(message)s"
+        )
     else:
         formatter = logging.Formatter("%(asctime)s %(levelname)s: %(message)s")
 
@@ -252,17 +388,21 @@ def setup_logging(debug: bool, json_logs: bool):
     root_logger.addHandler(stderr_handler)
 
 
-def initialize_token_bucket(qps, burst):
-    global TOKEN_BUCKET
+def initialize_token_bucket(qps, burst, costs=None, adaptive=False):
+    global TOKEN_BUCKET, RATE_LIMITER
+    RATE_LIMITER = None
     if qps == 0 and burst == 0:
         TOKEN_BUCKET = None
+        if adaptive:
+            raise ValueError("adaptive rate limiting requires qps and burst to be set")
         return
     if qps <= 0 or burst <= 0:
         raise ValueError("qps and burst must be both zero (disabled) or both positive integers")
     if burst < qps:
         raise ValueError("Failed to start, burst value must be greater than or equal to qps value")
-    TOKEN_BUCKET = TokenBucket(qps=qps, burst=burst)
-
+    TOKEN_BUCKET = TokenBucket(qps=qps, burst=burst, costs=costs)
+    if adaptive:
+        RATE_LIMITER = AdaptiveRateLimiter(TOKEN_BUCKET)
 
 
 def initialize_max_retries(max_retries):
@@ -270,6 +410,208 @@ def initialize_max_retries(max_retries):
     MAX_RETRIES = max_retries
 
 
+def initialize_overload_protection(retry_budget_ratio, circuit_breaker_threshold):
+    global RETRY_BUDGET, CIRCUIT_BREAKER
+    if retry_budget_ratio < 0:
+        raise ValueError("retry budget must be zero (disabled) or a positive number")
+    if circuit_breaker_threshold < 0:
+        raise ValueError(
+            "circuit breaker threshold must be zero (disabled) or a positive integer"
+        )
+    RETRY_BUDGET = RetryBudget(retry_budget_ratio) if retry_budget_ratio else None
+    CIRCUIT_BREAKER = (
+        CircuitBreaker(circuit_breaker_threshold) if circuit_breaker_threshold else None
+    )
+
+
+def reset_overload_protection():
+    """Start a new cycle with a fresh retry budget and a closed circuit."""
+    if RETRY_BUDGET is not None:
+        RETRY_BUDGET.reset()
+    if CIRCUIT_BREAKER is not None:
+        CIRCUIT_BREAKER.reset()
+
+
+def initialize_event_recorder(recorder: Optional["EventRecorder"]):
+    global EVENT_RECORDER
+    EVENT_RECORDER = recorder
+
+
+def initialize_list_page_size(page_size):
+    global LIST_PAGE_SIZE
+    if page_size < 0:
+        raise ValueError("list page size must be zero (disabled) or a positive integer")
+    LIST_PAGE_SIZE = page_size
+
+
+def initialize_list_concurrency(concurrency):
+    global LIST_CONCURRENCY
+    if concurrency < 1:
+        raise ValueError("list concurrency must be a positive integer")
+    LIST_CONCURRENCY = concurrency
+
+
+def initialize_leader_check(check: Optional[Callable[[], bool]]):
+    global LEADER_CHECK
+    LEADER_CHECK = check
+
+
+def leadership_lost() -> bool:
+    return LEADER_CHECK is not None and not LEADER_CHECK()
+
+
+def ensure_leader(lane: int, context_msg: Optional[str] = None):
+    """Raise NotLeaderError for a scale write when this replica lost the leadership, e.g. in the middle of a cycle."""
+    if lane == LANE_SCALE and leadership_lost():
+        raise NotLeaderError(
+            f"Not {context_msg or 'writing'}: this replica is no longer the leader"
+        )
+
+
+def list_objects(
+    kind,
+    api,
+    namespace=pykube.all,
+    page_size: int = 0,
+    params: Optional[dict] = None,
+    headers: Optional[dict] = None,
+    context_msg: Optional[str] = None,
+):
+    """Yield the objects of a LIST call, fetched page by page by list_pages."""
+    for page in list_pages(
+        kind, api, namespace, page_size, params, headers, context_msg
+    ):
+        yield from page
+
+
+def list_pages(
+    kind,
+    api,
+    namespace=pykube.all,
+    page_size: int = 0,
+    params: Optional[dict] = None,
+    headers: Optional[dict] = None,
+    context_msg: Optional[str] = None,
+):
+    """
+    Yield the objects of a LIST call page by page using limit/continue, so only one page is held in memory at a time.
+
+    If the continue token expires between two pages (HTTP 410) the listing resumes with the fresh token
+    returned by the API server, or restarts from the beginning skipping the objects already yielded.
+    """
+    seen_uids = set()
+    continue_token = None
+    while True:
+        page_params = dict(params or {})
+        if page_size:
+            page_params["limit"] = page_size
+        if continue_token:
+            page_params["continue"] = continue_token
+        kwargs = {"url": kind.endpoint, "params": page_params}
+        if kind.base:
+            kwargs["base"] = kind.base
+        if kind.version:
+            kwargs["version"] = kind.version
+        if namespace is not pykube.all:
+            kwargs["namespace"] = namespace
+        if headers:
+            kwargs["headers"] = headers
+
+        def fetch_page():
+            response = api.get(**kwargs)
+            response.raise_for_status()
+            return response
+
+        try:
+            response = call_with_exponential_backoff(
+                fetch_page, context_msg=context_msg, verb="list"
+            )
+        except requests.HTTPError as e:
+            if e.response.status_code != 410 or not continue_token:
+                raise e
+            try:
+                continue_token = e.response.json().get("metadata", {}).get("continue")
+            except ValueError:
+                continue_token = None
+            if continue_token:
+                logger.debug(
+                    f"List continue token expired while {context_msg}, resuming with the token provided by the API server"
+                )
+            else:
+                logger.warning(
+                    f"List continue token expired while {context_msg}, restarting the list"
+                )
+            continue
+
+        data = response.json()
+        page = []
+        for obj in data.get("items") or []:
+            uid = obj.get("metadata", {}).get("uid")
+            if uid is not None:
+                if uid in seen_uids:
+                    continue
+                seen_uids.add(uid)
+            page.append(kind(api, obj))
+        yield page
+        continue_token = data.get("metadata", {}).get("continue")
+        if not continue_token:
+            return
+
+
+def get_status_code(e: ApiError) -> Optional[int]:
+    """Return the HTTP status code of e, None if the request got no response."""
+    if isinstance(e, HTTPError):
+        return e.code
+    return e.response.status_code if e.response is not None else None
+
+
+def get_response_headers(e: ApiError):
+    """Return the response headers of e, empty for pykube errors which only keep the status code and message."""
+    if isinstance(e, requests.HTTPError) and e.response is not None:
+        return e.response.headers
+    return {}
+
+
+def report_throttling(e: ApiError):
+    """Let the adaptive rate limiter lower the rate when the API server answered 429 Too Many Requests."""
+    if RATE_LIMITER is None or get_status_code(e) != 429:
+        return
+    headers = get_response_headers(e)
+    retry_after = headers.get("Retry-After")
+    RATE_LIMITER.throttled(
+        retry_after=(
+            float(retry_after) if retry_after and retry_after.isdigit() else None
+        ),
+        # set when the request was rejected by API Priority and Fairness
+        priority_level=headers.get("X-Kubernetes-PF-PriorityLevel-UID"),
+    )
+
+
+def record_api_success():
+    if RATE_LIMITER is not None:
+        RATE_LIMITER.succeeded()
+    if RETRY_BUDGET is not None:
+        RETRY_BUDGET.record_success()
+    if CIRCUIT_BREAKER is not None:
+        CIRCUIT_BREAKER.record_success()
+
+
+def record_api_error(e: ApiError, context_msg: Optional[str] = None):
+    report_throttling(e)
+    status_code = get_status_code(e)
+    if CIRCUIT_BREAKER is None or status_code is None:
+        return
+    if status_code == 429 or status_code >= 500:
+        CIRCUIT_BREAKER.record_failure(status_code, context_msg)
+    else:
+        # the API server answered, it is not overloaded
+        CIRCUIT_BREAKER.record_success()
+
+
+def circuit_open() -> bool:
+    return CIRCUIT_BREAKER is not None and CIRCUIT_BREAKER.is_open
+
+
 T = TypeVar("T")
 
 
@@ -282,6 +624,8 @@ def call_with_exponential_backoff(
     retry_on_status_codes: tuple = (429,),
     context_msg: Optional[str] = None,
     use_token_bucket: bool = True,
+    verb: Optional[str] = None,
+    lane: int = LANE_DEFAULT,
 ) -> T:
     """
     Generic function to call any function with exponential backoff on HTTP errors.
@@ -295,6 +639,8 @@ def call_with_exponential_backoff(
         retry_on_status_codes: Tuple of HTTP status codes that should trigger retry
         context_msg: Optional context message for logging
         use_token_bucket: Whether to use the global token bucket (default: True)
+        verb: Kubernetes API verb of the request, used to weight it with the configured request costs
+        lane: Token bucket lane of the request, scale writes are served before the default and background lanes
 
     Returns:
         The return value of the called function
@@ -310,13 +656,19 @@ def call_with_exponential_backoff(
         while retry_count <= MAX_RETRIES:
             try:
                 if use_token_bucket and TOKEN_BUCKET:
-                    TOKEN_BUCKET.acquire()
+                    TOKEN_BUCKET.acquire(lane=lane, verb=verb)
+                # checked right before every attempt, waiting for a token or a retry may take a while
+                ensure_leader(lane, context_msg)
 
-                return func()
+                result = run_request(func)
+                record_api_success()
+                return result
 
-            except requests.HTTPError as e:
+            except API_ERRORS as e:
                 last_exception = e
-                if e.response.status_code in retry_on_status_codes:
+                record_api_error(e, context_msg)
+                status_code = get_status_code(e)
+                if status_code in retry_on_status_codes:
                     if retry_count >= MAX_RETRIES:
                         error_msg = f"Max retries ({MAX_RETRIES}) reached"
                         if context_msg:
@@ -324,9 +676,19 @@ def call_with_exponential_backoff(
                         error_msg += ". giving up."
                         logger.error(error_msg)
                         raise e
+                    if circuit_open():
+                        logger.warning(
+                            f"Not retrying {context_msg or 'API call'}: circuit breaker is open"
+                        )
+                        raise e
+                    if RETRY_BUDGET is not None and not RETRY_BUDGET.try_spend():
+                        logger.warning(
+                            f"Not retrying {context_msg or 'API call'}: retry budget of this cycle is exhausted"
+                        )
+                        raise e
 
                     # check for "Retry-After" header
-                    retry_after = e.response.headers.get("Retry-After")
+                    retry_after = get_response_headers(e).get("Retry-After")
 
                     if retry_after:
                         try:
@@ -368,7 +730,7 @@ def call_with_exponential_backoff(
                         jitter_amount = delay * 0.1 * (time.time() % 1)
                         delay += jitter_amount
 
-                    warning_msg = f"HTTP {e.response.status_code} error"
+                    warning_msg = f"HTTP {status_code} error"
                     if context_msg:
                         warning_msg += f" for {context_msg}"
                     warning_msg += f". retrying in {delay:.2f} seconds (attempt {retry_count + 1}/{MAX_RETRIES})"
@@ -386,6 +748,22 @@ def call_with_exponential_backoff(
 
     else:
         if use_token_bucket and TOKEN_BUCKET:
-            TOKEN_BUCKET.acquire()
+            TOKEN_BUCKET.acquire(lane=lane, verb=verb)
+        ensure_leader(lane, context_msg)
 
-        return func()
+        try:
+            result = run_request(func)
+        except API_ERRORS as e:
+            record_api_error(e, context_msg)
+            raise e
+        record_api_success()
+        return result
+
+
+def run_request(func: Callable[[], T]) -> T:
+    """Call func, if it returns a lazy pykube Query send its request now, so it is retried and recorded here."""
+    result = func()
+    if isinstance(result, Query):
+        # the objects are cached by the Query, iterating it later does not send the request again
+        result.query_cache
+    return result
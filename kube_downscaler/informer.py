@@ -0,0 +1,236 @@
+import copy
+import json
+import logging
+import threading
+import time
+from typing import Dict
+from typing import FrozenSet
+from typing import List
+from typing import Optional
+from typing import Tuple
+
+import pykube
+import requests
+from pykube.exceptions import HTTPError
+
+from kube_downscaler import helper
+
+logger = logging.getLogger(__name__)
+
+# the API server closes the watch after this many seconds, the informer then resumes from the last resourceVersion
+WATCH_TIMEOUT_SECONDS = 300
+
+
+class Informer:
+    """Keep an in-memory store of one resource kind, filled by an initial LIST and kept up to date by a WATCH."""
+
+    def __init__(
+        self, api_provider, kind, namespace=pykube.all, resync_period: int = 600
+    ):
+        # the API client is fetched from the provider on every request, to follow credential rotations
+        self.api_provider = api_provider
+        self.kind = kind
+        self.namespace = namespace
+        self.resync_period = resync_period
+        self.store: Dict[Tuple[str, str], dict] = {}
+        self.resource_version: Optional[str] = None
+        self.synced = threading.Event()
+        self.forbidden = False
+        self.last_list = 0.0
+        self.lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    @property
+    def description(self):
+        if self.namespace is pykube.all:
+            return f"{self.kind.endpoint} cluster-wide"
+        return f"{self.kind.endpoint} in namespace {self.namespace}"
+
+    def start(self):
+        self._thread = threading.Thread(
+            target=self.run, name=f"informer-{self.kind.endpoint}", daemon=True
+        )
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+
+    def list(self) -> List[dict]:
+        """Return a deep copy of all cached objects, callers are free to mutate them."""
+        with self.lock:
+            return [copy.deepcopy(obj) for obj in self.store.values()]
+
+    def request_kwargs(self, params: dict) -> dict:
+        kwargs = {"url": self.kind.endpoint, "params": params}
+        if self.kind.base:
+            kwargs["base"] = self.kind.base
+        if self.kind.version:
+            kwargs["version"] = self.kind.version
+        if self.namespace is not pykube.all:
+            kwargs["namespace"] = self.namespace
+        return kwargs
+
+    def relist(self):
+        api = self.api_provider.get()
+        response = helper.call_with_exponential_backoff(
+            lambda: api.get(**self.request_kwargs({})),
+            context_msg=f"listing {self.description} for informer cache",
+            verb="list",
+        )
+        response.raise_for_status()
+        data = response.json()
+        store = {}
+        for obj in data.get("items") or []:
+            store[object_key(obj)] = obj
+        with self.lock:
+            self.store = store
+            self.resource_version = data.get("metadata", {}).get("resourceVersion")
+        self.last_list = time.monotonic()
+        self.synced.set()
+        logger.debug(f"Informer cache listed {len(store)} {self.description}")
+
+    def watch(self):
+        params = {
+            "watch": "true",
+            "allowWatchBookmarks": "true",
+            "timeoutSeconds": WATCH_TIMEOUT_SECONDS,
+        }
+        if self.resource_version:
+            params["resourceVersion"] = self.resource_version
+        api = self.api_provider.get()
+        kwargs = self.request_kwargs(params)
+        kwargs["stream"] = True
+        kwargs["timeout"] = (api.timeout, WATCH_TIMEOUT_SECONDS + 30)
+        response = helper.call_with_exponential_backoff(
+            lambda: api.get(**kwargs),
+            context_msg=f"watching {self.description} for informer cache",
+            verb="watch",
+        )
+        response.raise_for_status()
+        for line in response.iter_lines():
+            if self._stop.is_set() or self.resync_due():
+                response.close()
+                return
+            if line:
+                self.handle_event(json.loads(line))
+
+    def handle_event(self, event: dict):
+        event_type = event.get("type")
+        obj = event.get("object") or {}
+        if event_type == "ERROR":
+            raise HTTPError(obj.get("code"), obj.get("message"))
+        resource_version = obj.get("metadata", {}).get("resourceVersion")
+        with self.lock:
+            if event_type in ("ADDED", "MODIFIED"):
+                self.store[object_key(obj)] = obj
+            elif event_type == "DELETED":
+                self.store.pop(object_key(obj), None)
+            if resource_version:
+                self.resource_version = resource_version
+
+    def resync_due(self) -> bool:
+        return time.monotonic() - self.last_list >= self.resync_period
+
+    def run(self):
+        while not self._stop.is_set():
+            try:
+                if not self.synced.is_set() or self.resync_due():
+                    self.relist()
+                self.watch()
+            except (requests.HTTPError, HTTPError) as e:
+                status_code = (
+                    e.response.status_code
+                    if isinstance(e, requests.HTTPError)
+                    else e.code
+                )
+                if status_code == 410:
+                    logger.debug(
+                        f"Watch for {self.description} expired (410 Gone), relisting"
+                    )
+                    self.synced.clear()
+                elif status_code == 403:
+                    logger.warning(
+                        f"KubeDownscaler is not authorized to list/watch {self.description} (403), "
+                        f"falling back to listing on every cycle"
+                    )
+                    self.forbidden = True
+                    self.synced.set()
+                    return
+                else:
+                    logger.warning(
+                        f"Informer for {self.description} failed: {e}, retrying"
+                    )
+                    self._stop.wait(1)
+            except Exception as e:
+                logger.warning(f"Informer for {self.description} failed: {e}, retrying")
+                self._stop.wait(1)
+
+
+class InformerCache:
+    """
+    Informers for all kinds handled by the downscaler, created lazily on first use.
+
+    Without configured namespaces there is a single cluster-wide informer per kind, whatever namespaces a cycle
+    asks for (e.g. the namespaces of a shard), in constrained mode one informer per kind and configured namespace.
+    """
+
+    def __init__(
+        self,
+        api_provider,
+        namespaces: FrozenSet[str] = frozenset(),
+        resync_period: int = 600,
+        sync_timeout: int = 60,
+    ):
+        self.api_provider = api_provider
+        self.namespaces = namespaces
+        self.resync_period = resync_period
+        self.sync_timeout = sync_timeout
+        self.informers: Dict[Tuple[str, object], Informer] = {}
+        self.lock = threading.Lock()
+
+    def get_informer(self, kind, namespace) -> Informer:
+        key = (kind.endpoint, namespace)
+        with self.lock:
+            informer = self.informers.get(key)
+            if informer is None:
+                informer = Informer(
+                    self.api_provider, kind, namespace, self.resync_period
+                )
+                informer.start()
+                self.informers[key] = informer
+        return informer
+
+    def list(self, kind, namespaces: FrozenSet[str]) -> Optional[List[dict]]:
+        """Return cached objects of the given kind or None if the cache cannot be used (e.g. RBAC forbids watch)."""
+        if self.namespaces:
+            informers = [
+                self.get_informer(kind, namespace)
+                for namespace in namespaces or self.namespaces
+            ]
+        else:
+            informers = [self.get_informer(kind, pykube.all)]
+
+        objects = []
+        for informer in informers:
+            if not informer.synced.wait(self.sync_timeout):
+                logger.warning(
+                    f"Informer cache for {informer.description} not synced yet, listing from the API server"
+                )
+                return None
+            if informer.forbidden:
+                return None
+            objects += informer.list()
+        if namespaces and not self.namespaces:
+            objects = [obj for obj in objects if object_key(obj)[0] in namespaces]
+        return objects
+
+    def stop(self):
+        with self.lock:
+            for informer in self.informers.values():
+                informer.stop()
+
+
+def object_key(obj: dict) -> Tuple[str, str]:
+    metadata = obj.get("metadata", {})
+    return metadata.get("namespace", ""), metadata.get("name", "")
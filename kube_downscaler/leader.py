@@ -0,0 +1,259 @@
+import datetime
+import logging
+import math
+import os
+import socket
+import threading
+import time
+import uuid
+from typing import NamedTuple
+from typing import Optional
+from typing import Tuple
+
+import requests
+from pykube.exceptions import HTTPError
+from pykube.exceptions import PyKubeError
+
+from kube_downscaler.events import micro_time
+from kube_downscaler.resources.lease import Lease
+
+logger = logging.getLogger(__name__)
+
+SERVICE_ACCOUNT_NAMESPACE_PATH = (
+    "/var/run/secrets/kubernetes.io/serviceaccount/namespace"
+)
+
+
+class LeaderElectionConfig(NamedTuple):
+    lease_name: str
+    namespace: str
+    identity: str
+    lease_duration: float = 15.0
+    renew_deadline: float = 10.0
+    retry_period: float = 2.0
+
+
+def default_identity() -> str:
+    """Name of this replica in the lease: the pod name, made unique in case a pod is restarted with the same name."""
+    return f"{os.getenv('POD_NAME') or socket.gethostname()}_{uuid.uuid4().hex[:8]}"
+
+
+def default_lease_namespace() -> str:
+    namespace = os.getenv("POD_NAMESPACE")
+    if namespace:
+        return namespace
+    try:
+        with open(SERVICE_ACCOUNT_NAMESPACE_PATH) as f:
+            return f.read().strip() or "default"
+    except OSError:
+        return "default"
+
+
+class LeaderElector:
+    """
+    Lease based leader election (coordination.k8s.io/v1), run in a background thread.
+
+    The leader renews the Lease every retry_period seconds and steps down when it could not renew it for
+    renew_deadline seconds. Standby replicas take the Lease over as soon as it expires: the expiry is measured on
+    their own clock from the last time they saw the Lease change, like client-go does, so clock skew between nodes
+    does not matter, and they wake up right at that instant instead of at their next retry.
+    """
+
+    def __init__(self, api_provider, config: LeaderElectionConfig):
+        # the client is fetched on every renewal, so rotated credentials are picked up
+        self.api_provider = api_provider
+        self.config = config
+        self.leading = threading.Event()
+        self.leader: Optional[str] = None
+        self.renew_latency: Optional[float] = None
+        self.last_renew = 0.0
+        self.observed_record: Optional[Tuple] = None
+        self.observed_at = 0.0
+        self.observed_duration = config.lease_duration
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    @property
+    def is_leader(self) -> bool:
+        return self.leading.is_set()
+
+    def start(self):
+        self._thread = threading.Thread(
+            target=self.run, name="leader-election", daemon=True
+        )
+        self._thread.start()
+
+    def stop(self, release: bool = True):
+        """Stop the election, releasing the Lease if held so a standby replica can take over right away."""
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+        if release and self.is_leader:
+            self.release()
+        self.leading.clear()
+
+    def wait_for_leadership(self, timeout: float) -> bool:
+        return self.leading.wait(timeout)
+
+    def run(self):
+        while not self._stop.is_set():
+            self._stop.wait(self.step())
+
+    def step(self) -> float:
+        """Try to acquire or renew the Lease once, return the seconds to wait before the next attempt."""
+        started = time.monotonic()
+        try:
+            acquired = self.try_acquire_or_renew(started)
+        except (PyKubeError, requests.RequestException) as e:
+            if not (isinstance(e, HTTPError) and e.code == 409):
+                logger.warning(
+                    f"Failed to acquire or renew Lease {self.config.namespace}/{self.config.lease_name}: {e}"
+                )
+            acquired = False
+        now = time.monotonic()
+
+        if acquired:
+            self.last_renew = now
+            self.renew_latency = now - started
+            if not self.is_leader:
+                logger.info(
+                    f"Became leader as {self.config.identity}, Lease {self.config.namespace}/{self.config.lease_name} acquired"
+                )
+                self.leading.set()
+            return self.config.retry_period
+
+        if self.is_leader:
+            if self.leader not in (None, self.config.identity):
+                logger.warning(
+                    f"Lost leadership, Lease {self.config.namespace}/{self.config.lease_name} is held by {self.leader}"
+                )
+                self.leading.clear()
+            elif now - self.last_renew >= self.config.renew_deadline:
+                logger.warning(
+                    f"Lost leadership, Lease {self.config.namespace}/{self.config.lease_name} could not be renewed for {now - self.last_renew:.1f}s"
+                )
+                self.leading.clear()
+            else:
+                return self.config.retry_period
+
+        expires_in = self.observed_at + self.observed_duration - now
+        if self.observed_record is None or expires_in <= 0:
+            return self.config.retry_period
+        return min(self.config.retry_period, expires_in)
+
+    def observe(self, lease: Lease, now: float):
+        spec = lease.obj.get("spec") or {}
+        record = (
+            spec.get("holderIdentity"),
+            spec.get("renewTime"),
+            spec.get("leaseDurationSeconds"),
+        )
+        if record != self.observed_record:
+            self.observed_record = record
+            self.observed_at = now
+            self.observed_duration = float(
+                spec.get("leaseDurationSeconds") or self.config.lease_duration
+            )
+        self.leader = spec.get("holderIdentity") or None
+
+    def try_acquire_or_renew(self, now: float) -> bool:
+        config = self.config
+        timestamp = micro_time(datetime.datetime.now(datetime.timezone.utc))
+        lease_duration_seconds = int(math.ceil(config.lease_duration))
+        api = self.api_provider.get()
+        lease = Lease.objects(api, namespace=config.namespace).get_or_none(
+            name=config.lease_name
+        )
+        if lease is None:
+            lease = Lease(
+                api,
+                {
+                    "apiVersion": Lease.version,
+                    "kind": Lease.kind,
+                    "metadata": {
+                        "name": config.lease_name,
+                        "namespace": config.namespace,
+                    },
+                    "spec": {
+                        "holderIdentity": config.identity,
+                        "leaseDurationSeconds": lease_duration_seconds,
+                        "acquireTime": timestamp,
+                        "renewTime": timestamp,
+                        "leaseTransitions": 0,
+                    },
+                },
+            )
+            lease.create()
+            self.observe(lease, now)
+            return True
+
+        self.observe(lease, now)
+        spec = lease.obj.get("spec") or {}
+        holder = spec.get("holderIdentity")
+        if (
+            holder
+            and holder != config.identity
+            and now < self.observed_at + self.observed_duration
+        ):
+            return False
+
+        patch = {
+            # the API server rejects the patch with a conflict if another replica changed the Lease meanwhile
+            "metadata": {"resourceVersion": lease.metadata.get("resourceVersion")},
+            "spec": {
+                "holderIdentity": config.identity,
+                "leaseDurationSeconds": lease_duration_seconds,
+                "renewTime": timestamp,
+            },
+        }
+        if holder != config.identity:
+            patch["spec"]["acquireTime"] = timestamp
+            patch["spec"]["leaseTransitions"] = spec.get("leaseTransitions", 0) + 1
+        lease.patch(patch)
+        self.observe(lease, now)
+        return True
+
+    def release(self):
+        try:
+            lease = Lease.objects(
+                self.api_provider.get(), namespace=self.config.namespace
+            ).get_or_none(name=self.config.lease_name)
+            if lease is None:
+                return
+            if (lease.obj.get("spec") or {}).get(
+                "holderIdentity"
+            ) != self.config.identity:
+                return
+            lease.patch(
+                {
+                    "metadata": {
+                        "resourceVersion": lease.metadata.get("resourceVersion")
+                    },
+                    "spec": {
+                        "holderIdentity": None,
+                        "leaseDurationSeconds": 1,
+                        "renewTime": micro_time(
+                            datetime.datetime.now(datetime.timezone.utc)
+                        ),
+                    },
+                }
+            )
+            logger.info(
+                f"Released Lease {self.config.namespace}/{self.config.lease_name}"
+            )
+        except (PyKubeError, requests.RequestException) as e:
+            logger.warning(
+                f"Failed to release Lease {self.config.namespace}/{self.config.lease_name}: {e}"
+            )
+
+    def status(self) -> str:
+        leader = self.leader or "none"
+        if self.is_leader:
+            leader += " (this replica)"
+        latency = (
+            f"{self.renew_latency * 1000:.0f}ms"
+            if self.renew_latency is not None
+            else "n/a"
+        )
+        return f"leader {leader}, lease renewal latency {latency}"
@@ -1,16 +1,42 @@
 #!/usr/bin/env python3
+import atexit
+import datetime
 import logging
 import re
+import sys
 import time
+from typing import FrozenSet
+from typing import Optional
 
 from kube_downscaler import __version__
 from kube_downscaler import cmd
 from kube_downscaler import helper
 from kube_downscaler import shutdown
+from kube_downscaler.clusters import Cluster
+from kube_downscaler.clusters import ClusterProcesses
+from kube_downscaler.clusters import get_clusters
+from kube_downscaler.events import EventRecorder
+from kube_downscaler.informer import InformerCache
+from kube_downscaler.leader import default_identity
+from kube_downscaler.leader import default_lease_namespace
+from kube_downscaler.leader import LeaderElectionConfig
+from kube_downscaler.leader import LeaderElector
+from kube_downscaler.processes import ProcessShards
+from kube_downscaler.processes import WorkerSettings
+from kube_downscaler.reconcile import ReconcileState
 from kube_downscaler.scaler import scale
+from kube_downscaler.sharding import default_shard_identity
+from kube_downscaler.sharding import PeerShards
+from kube_downscaler.sharding import ShardingConfig
+from kube_downscaler.sharding import StaticShards
+from kube_downscaler.timespec import track_transitions
+from kube_downscaler.tokenbucket import parse_request_costs
 
 logger = logging.getLogger("downscaler")
 
+# lower bound of the sleep between two cycles when waking up at schedule transitions
+MIN_SLEEP_SECONDS = 1.0
+
 
 def parse_downtime_replicas(downtime_replicas):
     value, is_percentage = helper.parse_int_or_percent(
@@ -19,26 +45,160 @@ def parse_downtime_replicas(downtime_replicas):
     return value, is_percentage
 
 
-def main(args=None):
+def main(args=None, cluster: Optional[Cluster] = None):
+    argv = sys.argv[1:] if args is None else list(args)
     parser = cmd.get_parser()
-    args = parser.parse_args(args)
+    args = parser.parse_args(argv)
 
-    helper.setup_logging(args.debug, args.json_logs)
+    helper.setup_logging(
+        args.debug, args.json_logs, cluster.name if cluster is not None else None
+    )
+    if cluster is not None:
+        helper.initialize_kube_config(cluster.kubeconfig, cluster.context)
 
     try:
-        helper.initialize_token_bucket(args.qps, args.burst)
+        helper.initialize_token_bucket(
+            args.qps,
+            args.burst,
+            parse_request_costs(args.request_costs),
+            args.adaptive_rate_limit,
+        )
     except ValueError as e:
         logger.error("Invalid token bucket config: %s", e)
         return None
 
     helper.initialize_max_retries(args.max_retries_on_throttling)
 
+    try:
+        helper.initialize_overload_protection(
+            args.retry_budget, args.circuit_breaker_threshold
+        )
+    except ValueError as e:
+        logger.error("Invalid overload protection config: %s", e)
+        return None
+
+    if args.max_resync_interval < 0:
+        logger.error(
+            "Invalid max resync interval config: must be zero (disabled) or a positive integer"
+        )
+        return None
+
+    if args.full_resync_interval < 0:
+        logger.error(
+            "Invalid full resync interval config: must be zero (every cycle) or a positive integer"
+        )
+        return None
+
+    if args.workers < 1:
+        logger.error("Invalid workers config: must be a positive integer")
+        return None
+
+    if args.processes < 1:
+        logger.error("Invalid processes config: must be a positive integer")
+        return None
+
+    if args.processes > 1 and (
+        args.informer_cache or args.incremental or args.leader_election
+    ):
+        logger.error(
+            "Invalid processes config: worker processes cannot be combined with --informer-cache, --incremental or --leader-election"
+        )
+        return None
+
+    if args.leader_election:
+        if args.once:
+            logger.error(
+                "Invalid leader election config: cannot be combined with --once"
+            )
+            return None
+        if not (
+            0
+            < args.leader_election_retry_period
+            < args.leader_election_renew_deadline
+            < args.leader_election_lease_duration
+        ):
+            logger.error(
+                "Invalid leader election config: retry period, renew deadline and lease duration must be positive and increasing"
+            )
+            return None
+        leader_election = LeaderElectionConfig(
+            args.leader_election_lease_name,
+            args.leader_election_namespace or default_lease_namespace(),
+            default_identity(),
+            args.leader_election_lease_duration,
+            args.leader_election_renew_deadline,
+            args.leader_election_retry_period,
+        )
+    else:
+        leader_election = None
+
+    if args.shard_count < 1 or not 0 <= args.shard_index < args.shard_count:
+        logger.error(
+            "Invalid sharding config: shard count must be a positive integer and shard index between 0 and shard count - 1"
+        )
+        return None
+
+    if args.dynamic_sharding or args.shard_count > 1:
+        if args.dynamic_sharding and args.shard_count > 1:
+            logger.error(
+                "Invalid sharding config: --dynamic-sharding cannot be combined with --shard-count"
+            )
+            return None
+        if args.leader_election:
+            logger.error(
+                "Invalid sharding config: sharding cannot be combined with --leader-election, all shards are active"
+            )
+            return None
+        if args.dynamic_sharding and args.once:
+            logger.error(
+                "Invalid sharding config: --dynamic-sharding cannot be combined with --once"
+            )
+            return None
+        if args.dynamic_sharding and args.shard_lease_duration <= 0:
+            logger.error(
+                "Invalid sharding config: shard lease duration must be positive"
+            )
+            return None
+        sharding = ShardingConfig(
+            args.shard_index,
+            args.shard_count,
+            args.dynamic_sharding,
+            args.shard_group,
+            args.shard_lease_namespace or default_lease_namespace(),
+            default_shard_identity(),
+            args.shard_lease_duration,
+        )
+    else:
+        sharding = None
+
+    try:
+        helper.initialize_list_page_size(args.list_page_size)
+        helper.initialize_list_concurrency(args.list_concurrency)
+    except ValueError as e:
+        logger.error("Invalid list config: %s", e)
+        return None
+
     config_str = ", ".join(f"{k}={v}" for k, v in sorted(vars(args).items()))
     logger.info(f"Downscaler v{__version__} started with {config_str}")
 
     if args.dry_run:
         logger.info("**DRY-RUN**: no downscaling will be performed!")
 
+    if cluster is None and (args.kubeconfig_contexts or args.kubeconfig_dir):
+        try:
+            clusters = get_clusters(args.kubeconfig_contexts, args.kubeconfig_dir)
+        except ValueError as e:
+            logger.error("Invalid multi-cluster config: %s", e)
+            return None
+        if not clusters:
+            logger.error(
+                "Invalid multi-cluster config: no kubeconfig found in %s",
+                args.kubeconfig_dir,
+            )
+            return None
+        # every process runs main again with the same arguments, for its own cluster
+        return ClusterProcesses(clusters, argv).run(shutdown.GracefulShutdown())
+
     return run_loop(
         args.once,
         args.namespace,
@@ -60,6 +220,18 @@ def main(args=None):
         args.downtime_replicas,
         args.deployment_time_annotation,
         args.enable_events,
+        args.informer_cache,
+        args.informer_resync_period,
+        max(args.connection_pool_size, args.workers, args.list_concurrency),
+        args.workers,
+        args.minimal_patches,
+        args.max_resync_interval,
+        args.events_api,
+        args.incremental,
+        args.full_resync_interval,
+        args.processes,
+        leader_election,
+        sharding,
     )
 
 
@@ -84,11 +256,62 @@ def run_loop(
     downtime_replicas,
     deployment_time_annotation=None,
     enable_events=False,
+    informer_cache=False,
+    informer_resync_period=600,
+    connection_pool_size=10,
+    workers=1,
+    minimal_patches=False,
+    max_resync_interval=0,
+    events_api="core",
+    incremental=False,
+    full_resync_interval=3600,
+    processes=1,
+    leader_election: Optional[LeaderElectionConfig] = None,
+    sharding: Optional[ShardingConfig] = None,
 ):
     handler = shutdown.GracefulShutdown()
+    api_provider = helper.KubeApiProvider(api_server_timeout, connection_pool_size)
+
+    if informer_cache:
+        cache = InformerCache(
+            api_provider,
+            frozenset(namespace.split(",")) if namespace else frozenset(),
+            informer_resync_period,
+        )
+        logger.info("Informer cache enabled, resources will be watched")
+    else:
+        cache = None
+
+    if processes > 1:
+        shard_pool = ProcessShards(
+            processes,
+            WorkerSettings.from_parent(
+                processes, api_server_timeout, connection_pool_size
+            ),
+        )
+        logger.info(f"Namespaces are sharded across {processes} worker processes")
+    else:
+        shard_pool = None
+
+    if enable_events:
+        recorder = EventRecorder(series=events_api == "events.k8s.io")
+        recorder.start()
+        helper.initialize_event_recorder(recorder)
+    else:
+        recorder = None
+    dropped_events = 0
+
+    if incremental:
+        reconcile_state = ReconcileState(full_resync_interval)
+        logger.info(
+            f"Incremental reconciliation enabled, full resync every {full_resync_interval}s"
+        )
+    else:
+        reconcile_state = None
 
+    namespaces: FrozenSet[str]
     if namespace == "":
-        namespaces = []
+        namespaces = frozenset()
     else:
         namespaces = frozenset(namespace.split(","))
 
@@ -104,37 +327,147 @@ def run_loop(
         downtime_replicas
     )
 
+    # compiled once, the scaler builds its matchers from the same patterns in every cycle
+    exclude_namespace_patterns = frozenset(
+        re.compile(pattern) for pattern in exclude_namespaces.split(",")
+    )
+    matching_label_patterns = frozenset(
+        re.compile(pattern) for pattern in matching_labels.split(",")
+    )
+
+    if leader_election is not None:
+        elector = LeaderElector(api_provider, leader_election)
+        elector.start()
+        # also release the Lease when a signal ends the process while sleeping
+        atexit.register(elector.stop)
+        # a leader losing the Lease in the middle of a cycle stops writing right away
+        helper.initialize_leader_check(lambda: elector.is_leader)
+        logger.info(
+            f"Leader election enabled as {leader_election.identity} with Lease {leader_election.namespace}/{leader_election.lease_name}"
+        )
+    else:
+        elector = None
+
+    shards: Optional[StaticShards]
+    if sharding is not None:
+        if sharding.dynamic:
+            shards = PeerShards(api_provider, sharding)
+        else:
+            shards = StaticShards(sharding.shard_index, sharding.shard_count)
+        shards.start()
+        # also leave the group when a signal ends the process while sleeping
+        atexit.register(shards.stop)
+        logger.info(f"Namespaces are sharded across replicas, {shards.status()}")
+    else:
+        shards = None
+
+    def stop():
+        if elector is not None:
+            helper.initialize_leader_check(None)
+            elector.stop()
+        if shards is not None:
+            shards.stop()
+        if cache is not None:
+            cache.stop()
+        if shard_pool is not None:
+            shard_pool.stop()
+        if recorder is not None:
+            recorder.stop()
+            helper.initialize_event_recorder(None)
+
     while True:
-        try:
-            scale(
-                namespaces,
-                upscale_period,
-                downscale_period,
-                default_uptime,
-                default_downtime,
-                upscale_target_only,
-                include_resources=frozenset(include_resources.split(",")),
-                exclude_namespaces=frozenset(
-                    re.compile(pattern) for pattern in exclude_namespaces.split(",")
-                ),
-                exclude_deployments=frozenset(exclude_deployments.split(",")),
-                dry_run=dry_run,
-                grace_period=grace_period,
-                admission_controller=admission_controller,
-                constrained_downscaler=constrained_downscaler,
-                api_server_timeout=api_server_timeout,
-                max_retries_on_conflict=max_retries_on_conflict,
-                downtime_replicas=downtime_replicas,
-                is_downtime_replicas_percentage=is_downtime_replicas_percentage,
-                deployment_time_annotation=deployment_time_annotation,
-                enable_events=enable_events,
-                matching_labels=frozenset(
-                    re.compile(pattern) for pattern in matching_labels.split(",")
-                ),
+        if elector is not None and not elector.is_leader:
+            # hot standby: the informer cache and the API connections stay warm, but nothing is written
+            logger.info(f"Standby replica, {elector.status()}")
+            with handler.safe_exit():
+                elector.wait_for_leadership(interval)
+            if handler.shutdown_now:
+                stop()
+                return
+            continue
+        cycle_start = datetime.datetime.now(datetime.timezone.utc)
+        with track_transitions() as transitions:
+            try:
+                scale(
+                    namespaces,
+                    upscale_period,
+                    downscale_period,
+                    default_uptime,
+                    default_downtime,
+                    upscale_target_only,
+                    include_resources=frozenset(include_resources.split(",")),
+                    exclude_namespaces=exclude_namespace_patterns,
+                    exclude_deployments=frozenset(exclude_deployments.split(",")),
+                    dry_run=dry_run,
+                    grace_period=grace_period,
+                    admission_controller=admission_controller,
+                    constrained_downscaler=constrained_downscaler,
+                    api_server_timeout=api_server_timeout,
+                    max_retries_on_conflict=max_retries_on_conflict,
+                    downtime_replicas=downtime_replicas,
+                    is_downtime_replicas_percentage=is_downtime_replicas_percentage,
+                    deployment_time_annotation=deployment_time_annotation,
+                    enable_events=enable_events,
+                    matching_labels=matching_label_patterns,
+                    informer_cache=cache,
+                    api_provider=api_provider,
+                    workers=workers,
+                    minimal_patches=minimal_patches,
+                    reconcile_state=reconcile_state,
+                    shard_pool=shard_pool,
+                    shards=shards,
+                )
+            except Exception as e:
+                logger.exception(f"Failed to autoscale: {e}")
+        connections_opened, connections_reused = api_provider.connection_stats()
+        logger.debug(
+            f"API connections in this cycle: {connections_opened} opened, {connections_reused} reused"
+        )
+        if helper.RATE_LIMITER is not None:
+            logger.info(
+                f"Effective API rate limit: {helper.RATE_LIMITER.qps:.2f} QPS (configured: {helper.RATE_LIMITER.max_qps:.2f} QPS, throttled requests: {helper.RATE_LIMITER.throttled_requests})"
+            )
+        if recorder is not None and recorder.dropped > dropped_events:
+            logger.warning(
+                f"Event queue was full, dropped {recorder.dropped - dropped_events} events"
             )
-        except Exception as e:
-            logger.exception(f"Failed to autoscale: {e}")
+            dropped_events = recorder.dropped
+        if elector is not None:
+            if not elector.is_leader:
+                logger.warning(
+                    "Lost the leadership during the cycle, stopped scaling resources"
+                )
+            logger.info(f"Leader election: {elector.status()}")
         if run_once or handler.shutdown_now:
+            stop()
             return
+        sleep_seconds = interval
+        if max_resync_interval > 0:
+            sleep_seconds = get_sleep_seconds(
+                cycle_start, transitions.next_transition, max_resync_interval
+            )
+            next_wakeup = datetime.datetime.now(
+                datetime.timezone.utc
+            ) + datetime.timedelta(seconds=sleep_seconds)
+            logger.info(
+                f"Next wake-up at {next_wakeup.isoformat(timespec='seconds')} (in {sleep_seconds:.0f}s)"
+            )
         with handler.safe_exit():
-            time.sleep(interval)
+            if shards is not None:
+                # peers joining or leaving move namespaces, rebalance right away
+                shards.wait_for_change(sleep_seconds)
+            else:
+                time.sleep(sleep_seconds)
+
+
+def get_sleep_seconds(
+    cycle_start: datetime.datetime,
+    next_transition: Optional[datetime.datetime],
+    max_resync_interval: int,
+) -> float:
+    """Seconds to sleep until the next schedule transition, at most max_resync_interval after the cycle started."""
+    wakeup = cycle_start + datetime.timedelta(seconds=max_resync_interval)
+    if next_transition is not None and next_transition < wakeup:
+        wakeup = next_transition
+    remaining = (wakeup - datetime.datetime.now(datetime.timezone.utc)).total_seconds()
+    return max(remaining, MIN_SLEEP_SECONDS)
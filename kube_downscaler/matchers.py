@@ -0,0 +1,155 @@
+import functools
+import re
+from typing import Dict
+from typing import FrozenSet
+from typing import Iterable
+from typing import Mapping
+from typing import Optional
+from typing import Pattern
+from typing import Tuple
+
+# characters which make a pattern more than a literal string
+REGEX_METACHARACTERS = frozenset(".^$*+?{}[]\\|()")
+
+MATCHER_CACHE_SIZE = 64
+# bound of the per-matcher memo of results, cleared once full
+MEMO_SIZE = 16384
+
+
+# https://kubernetes.io/docs/concepts/overview/working-with-objects/names/#dns-label-names
+NAMESPACE_NAME_PATTERN = re.compile(r"[a-z0-9]([-a-z0-9]*[a-z0-9])?")
+
+
+def literal_value(pattern: Pattern) -> Optional[str]:
+    """Return the only string a pattern fully matches ("app\\.kubernetes\\.io" -> "app.kubernetes.io"), None for a regex."""
+    if pattern.flags != re.compile("").flags:
+        return None
+    chars = []
+    escaped = False
+    for char in pattern.pattern:
+        if escaped:
+            # escaped letters and digits are character classes or back references
+            if char.isalnum():
+                return None
+            chars.append(char)
+            escaped = False
+        elif char == "\\":
+            escaped = True
+        elif char in REGEX_METACHARACTERS:
+            return None
+        else:
+            chars.append(char)
+    if escaped:
+        return None
+    return "".join(chars)
+
+
+class Matcher:
+    """
+    Full-match a string against any of a set of patterns.
+
+    Literal patterns are looked up in a set, the other ones are combined into a single alternation regex.
+    Results are memoized per string.
+    """
+
+    def __init__(self, patterns: Iterable[Pattern]):
+        literals = set()
+        regexes = []
+        for pattern in patterns:
+            literal = literal_value(pattern)
+            if literal is not None:
+                literals.add(literal)
+            else:
+                regexes.append(pattern)
+        self.literals: FrozenSet[str] = frozenset(literals)
+        self.regexes: Tuple[Pattern, ...] = tuple(regexes)
+        if len(regexes) > 1:
+            try:
+                self.regexes = (
+                    re.compile("|".join(f"(?:{p.pattern})" for p in regexes)),
+                )
+            except re.error:
+                # e.g. global inline flags, which are only allowed at the start of a pattern
+                pass
+        self.memo: Dict[str, bool] = {}
+
+    def matches(self, value: str) -> bool:
+        result = self.memo.get(value)
+        if result is None:
+            result = value in self.literals or any(
+                regex.fullmatch(value) for regex in self.regexes
+            )
+            if len(self.memo) >= MEMO_SIZE:
+                self.memo.clear()
+            self.memo[value] = result
+        return result
+
+
+class LabelMatcher:
+    """
+    Match the labels of a resource against the --matching-labels patterns.
+
+    A resource matches when any of its "key=value" labels matches any pattern. Results are memoized per label set.
+    """
+
+    def __init__(self, patterns: Iterable[Pattern]):
+        patterns = list(patterns)
+        # for backwards compatibility, without a label filter nothing is ignored
+        self.enabled = any(pattern.pattern for pattern in patterns)
+        self.matcher = Matcher(patterns)
+        self.memo: Dict[FrozenSet[Tuple[str, str]], bool] = {}
+
+    def matches(self, labels: Optional[Mapping[str, str]]) -> bool:
+        if not self.enabled:
+            return True
+        fingerprint = frozenset((labels or {}).items())
+        result = self.memo.get(fingerprint)
+        if result is None:
+            result = any(
+                self.matcher.matches(f"{key}={value}") for key, value in fingerprint
+            )
+            if len(self.memo) >= MEMO_SIZE:
+                self.memo.clear()
+            self.memo[fingerprint] = result
+        return result
+
+
+@functools.lru_cache(maxsize=MATCHER_CACHE_SIZE)
+def _namespace_matcher(patterns: FrozenSet[Pattern]) -> Matcher:
+    return Matcher(patterns)
+
+
+@functools.lru_cache(maxsize=MATCHER_CACHE_SIZE)
+def _label_matcher(patterns: FrozenSet[Pattern]) -> LabelMatcher:
+    return LabelMatcher(patterns)
+
+
+def compile_namespace_matcher(patterns: Iterable[Pattern]) -> Matcher:
+    """Return the matcher of the --exclude-namespaces patterns, compiled once per distinct set of patterns."""
+    return _namespace_matcher(frozenset(patterns))
+
+
+def compile_label_matcher(patterns: Iterable[Pattern]) -> LabelMatcher:
+    """Return the matcher of the --matching-labels patterns, compiled once per distinct set of patterns."""
+    return _label_matcher(frozenset(patterns))
+
+
+@functools.lru_cache(maxsize=MATCHER_CACHE_SIZE)
+def _namespace_field_selector(patterns: FrozenSet[Pattern]) -> Optional[str]:
+    names = sorted(
+        name
+        for name in map(literal_value, patterns)
+        if name is not None and NAMESPACE_NAME_PATTERN.fullmatch(name)
+    )
+    if not names:
+        return None
+    return ",".join(f"metadata.namespace!={name}" for name in names)
+
+
+def namespace_field_selector(patterns: Iterable[Pattern]) -> Optional[str]:
+    """
+    Translate the literal --exclude-namespaces patterns into a "metadata.namespace!=" fieldSelector, None if there are none.
+
+    Regex patterns are left out, they are still matched client-side.
+    """
+    return _namespace_field_selector(frozenset(patterns))
@@ -0,0 +1,82 @@
+import collections
+from typing import Dict
+from typing import FrozenSet
+from typing import List
+from typing import NamedTuple
+from typing import Optional
+from typing import Pattern
+from typing import Tuple
+
+# operations of a Decision, only the ones in ACTIONS change the resource
+SCALE_UP = "scale_up"
+SCALE_DOWN = "scale_down"
+CLEAR_ORIGINAL_REPLICAS = "clear_original_replicas"
+EXCLUDED = "excluded"
+WITHIN_GRACE_PERIOD = "within_grace_period"
+NO_CHANGE = "no_change"
+FAILED = "failed"
+ACTIONS = frozenset([SCALE_UP, SCALE_DOWN, CLEAR_ORIGINAL_REPLICAS])
+
+
+class ScalingConfig(NamedTuple):
+    """Inputs of the scaling decision of a resource, with the namespace overrides already applied."""
+
+    upscale_period: str
+    downscale_period: str
+    default_uptime: str
+    default_downtime: str
+    forced_uptime: bool = False
+    forced_downtime: bool = False
+    upscale_target_only: bool = False
+    grace_period: int = 0
+    downtime_replicas: int = 0
+    is_downtime_replicas_percentage: bool = False
+    namespace_excluded: bool = False
+    deployment_time_annotation: Optional[str] = None
+    matching_labels: FrozenSet[Pattern] = frozenset()
+
+
+class Decision(NamedTuple):
+    """What to do with one resource, identified by kind, namespace and name only so it can be serialized."""
+
+    kind: str
+    namespace: str
+    name: str
+    operation: str
+    replicas: Optional[int] = None
+    replicas_is_percentage: bool = False
+    target_replicas: Optional[int] = None
+    target_replicas_is_percentage: bool = False
+    uptime: Optional[str] = None
+    downtime: Optional[str] = None
+
+    @property
+    def key(self) -> Tuple[str, str, str]:
+        return self.kind, self.namespace, self.name
+
+    def to_dict(self) -> dict:
+        return self._asdict()
+
+
+class Plan(NamedTuple):
+    """Decisions for a snapshot of resources, computed without any API call."""
+
+    decisions: Tuple[Decision, ...]
+
+    @property
+    def actions(self) -> List[Decision]:
+        return [
+            decision for decision in self.decisions if decision.operation in ACTIONS
+        ]
+
+    def counts(self) -> Dict[str, int]:
+        return dict(
+            collections.Counter(decision.operation for decision in self.decisions)
+        )
+
+    def to_dict(self) -> dict:
+        return {"decisions": [decision.to_dict() for decision in self.decisions]}
+
+    @classmethod
+    def from_dict(cls, data: dict) -> "Plan":
+        return cls(tuple(Decision(**decision) for decision in data["decisions"]))
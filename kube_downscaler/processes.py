@@ -0,0 +1,362 @@
+import collections
+import datetime
+import functools
+import logging
+import multiprocessing
+import os
+import re
+import time
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from logging.handlers import QueueHandler
+from logging.handlers import QueueListener
+from typing import Dict
+from typing import FrozenSet
+from typing import List
+from typing import NamedTuple
+from typing import Optional
+from typing import Pattern
+from typing import Tuple
+
+from kube_downscaler import helper
+from kube_downscaler.plan import Decision
+from kube_downscaler.scaler import decide
+from kube_downscaler.scaler import execute_plan
+from kube_downscaler.scaler import get_namespace_batches
+from kube_downscaler.scaler import NamespaceContext
+from kube_downscaler.scaler import plan
+from kube_downscaler.scaler import RESOURCE_CLASSES
+from kube_downscaler.schedule import ScheduleTable
+from kube_downscaler.timespec import record_transition
+from kube_downscaler.timespec import track_transitions
+
+logger = logging.getLogger(__name__)
+
+# API client of a worker process, created by initialize_worker
+API_PROVIDER: Optional[helper.KubeApiProvider] = None
+
+
+class WorkerSettings(NamedTuple):
+    """Settings of the parent process a worker process is initialized with."""
+
+    api_server_timeout: int
+    connection_pool_size: int
+    qps: float
+    burst: float
+    request_costs: Dict[str, float]
+    adaptive_rate_limit: bool
+    max_retries: int
+    retry_budget: float
+    circuit_breaker_threshold: int
+    list_page_size: int
+    list_concurrency: int
+    log_level: int
+    kube_config: Optional[Tuple[str, Optional[str]]] = None
+
+    @classmethod
+    def from_parent(
+        cls, processes: int, api_server_timeout: int, connection_pool_size: int
+    ) -> "WorkerSettings":
+        """Capture the settings of this process, with the rate limit split evenly between the worker processes."""
+        token_bucket = getattr(helper, "TOKEN_BUCKET", None)
+        return cls(
+            api_server_timeout,
+            connection_pool_size,
+            token_bucket.qps / processes if token_bucket is not None else 0,
+            token_bucket.burst / processes if token_bucket is not None else 0,
+            dict(token_bucket.costs) if token_bucket is not None else {},
+            helper.RATE_LIMITER is not None,
+            getattr(helper, "MAX_RETRIES", 0),
+            helper.RETRY_BUDGET.ratio if helper.RETRY_BUDGET is not None else 0,
+            (
+                helper.CIRCUIT_BREAKER.threshold
+                if helper.CIRCUIT_BREAKER is not None
+                else 0
+            ),
+            helper.LIST_PAGE_SIZE,
+            helper.LIST_CONCURRENCY,
+            logging.getLogger().getEffectiveLevel(),
+            helper.KUBE_CONFIG,
+        )
+
+
+class ShardTask(NamedTuple):
+    """Namespaces (with their context) and kinds a worker process evaluates in one cycle."""
+
+    now: datetime.datetime
+    kinds: Tuple[str, ...]
+    contexts: Dict[str, NamespaceContext]
+    exclude_names: FrozenSet[str]
+    matching_labels: FrozenSet[Pattern]
+    upscale_target_only: bool
+    grace_period: int
+    deployment_time_annotation: Optional[str]
+    dry_run: bool
+    enable_events: bool
+    minimal_patches: bool
+    workers: int
+    max_retries_on_conflict: int = 0
+    # list each kind once cluster-wide instead of namespace by namespace, off when --namespace restricts the scope
+    cluster_wide: bool = False
+
+
+class ShardResult(NamedTuple):
+    """Compact outcome of a ShardTask: the actions taken and counters, never the resources themselves."""
+
+    pid: int
+    namespaces: int
+    actions: Tuple[Decision, ...]
+    counts: Dict[str, int]
+    written: int
+    deferred: int
+    circuit_breaker_reason: Optional[str]
+    next_transition: Optional[datetime.datetime]
+    seconds: float
+    cpu_seconds: float
+
+
+def initialize_worker(settings: WorkerSettings, log_queue):
+    """Set up a worker process: logs go to the parent through log_queue, the API client and rate limit are its own."""
+    global API_PROVIDER
+    root_logger = logging.getLogger()
+    root_logger.handlers.clear()
+    root_logger.addHandler(QueueHandler(log_queue))
+    root_logger.setLevel(settings.log_level)
+
+    helper.initialize_token_bucket(
+        settings.qps,
+        settings.burst,
+        settings.request_costs,
+        settings.adaptive_rate_limit,
+    )
+    helper.initialize_max_retries(settings.max_retries)
+    helper.initialize_overload_protection(
+        settings.retry_budget, settings.circuit_breaker_threshold
+    )
+    helper.initialize_list_page_size(settings.list_page_size)
+    helper.initialize_list_concurrency(settings.list_concurrency)
+    # events are sent by the worker itself, the recorder thread of the parent does not exist here
+    helper.initialize_event_recorder(None)
+    if settings.kube_config is not None:
+        helper.initialize_kube_config(*settings.kube_config)
+    API_PROVIDER = helper.KubeApiProvider(
+        settings.api_server_timeout, settings.connection_pool_size
+    )
+
+
+def evaluate_shard(task: ShardTask) -> ShardResult:
+    """List, plan and scale the resources of the namespaces of a task, runs in a worker process."""
+    started = time.monotonic()
+    cpu_started = time.process_time()
+    helper.reset_overload_protection()
+    logger.debug(
+        f"Evaluating {len(task.contexts)} namespaces for {', '.join(task.kinds) or 'no kinds'}"
+    )
+    counts: collections.Counter = collections.Counter()
+    actions: List[Decision] = []
+    written = 0
+
+    with track_transitions() as transitions:
+        if task.kinds and task.contexts:
+            assert API_PROVIDER is not None
+            api = API_PROVIDER.get()
+            schedule_table = ScheduleTable(task.now)
+            namespaces = frozenset(task.contexts)
+            if task.cluster_wide:
+                list_namespaces: FrozenSet[str] = frozenset()
+                other_shards = other_namespaces_patterns(namespaces)
+            else:
+                list_namespaces, other_shards = namespaces, frozenset()
+            for clazz in RESOURCE_CLASSES:
+                if clazz.endpoint not in task.kinds or helper.circuit_open():
+                    continue
+                namespace_batches = get_namespace_batches(
+                    api,
+                    clazz,
+                    list_namespaces,
+                    dict.fromkeys(namespaces),
+                    other_shards,
+                    task.exclude_names,
+                    task.matching_labels,
+                    task.contexts,
+                )
+                for resources, context in namespace_batches:
+                    config = context.scaling_config(
+                        task.upscale_target_only,
+                        task.grace_period,
+                        task.deployment_time_annotation,
+                        task.matching_labels,
+                    )
+                    scaling_plan = plan(resources, task.now, config, schedule_table)
+                    counts.update(scaling_plan.counts())
+                    actions += scaling_plan.actions
+                    written += execute_plan(
+                        scaling_plan,
+                        resources,
+                        clazz,
+                        task.dry_run,
+                        enable_events=task.enable_events,
+                        minimal_patches=task.minimal_patches,
+                        workers=task.workers,
+                        max_retries_on_conflict=task.max_retries_on_conflict,
+                        decide_again=functools.partial(
+                            decide,
+                            now=task.now,
+                            config=config,
+                            schedule_table=schedule_table,
+                        ),
+                    )
+
+    circuit_breaker = helper.CIRCUIT_BREAKER
+    return ShardResult(
+        os.getpid(),
+        len(task.contexts),
+        tuple(actions),
+        dict(counts),
+        written,
+        circuit_breaker.deferred if circuit_breaker is not None else 0,
+        (
+            circuit_breaker.reason
+            if circuit_breaker is not None and circuit_breaker.is_open
+            else None
+        ),
+        transitions.next_transition,
+        time.monotonic() - started,
+        time.process_time() - cpu_started,
+    )
+
+
+def other_namespaces_patterns(namespaces: FrozenSet[str]) -> FrozenSet[Pattern]:
+    """
+    Return the exclusion pattern of every namespace but the given ones.
+
+    The API server cannot select a set of namespaces, so a worker process lists cluster-wide and drops the namespaces
+    of the other shards client-side.
+    """
+    alternation = "|".join(re.escape(namespace) for namespace in sorted(namespaces))
+    return frozenset([re.compile(f"(?!(?:{alternation})$).+")])
+
+
+def shard_namespaces(namespaces: List[str], shards: int) -> List[List[str]]:
+    """Spread the namespaces round-robin over at most shards lists, in name order."""
+    sharded: List[List[str]] = [[] for _ in range(min(shards, len(namespaces)))]
+    for index, namespace in enumerate(sorted(namespaces)):
+        sharded[index % len(sharded)].append(namespace)
+    return sharded
+
+
+class ProcessShards:
+    """
+    Pool of worker processes, kept across cycles, evaluating disjoint shards of namespaces.
+
+    Every worker holds its own API client and an even share of the --qps/--burst rate limit. It lists the resources
+    of its namespaces, decides and writes them, and only ships back a ShardResult. Workers log through a queue to
+    the handlers of this process, so their records end up in the same stream and format.
+    """
+
+    def __init__(self, processes: int, settings: WorkerSettings):
+        self.processes = processes
+        self.settings = settings
+        # spawn: the parent runs threads (events, informers) which must not be forked
+        self.context = multiprocessing.get_context("spawn")
+        self.log_queue = self.context.Queue()
+        self.listener = QueueListener(
+            self.log_queue, *logging.getLogger().handlers, respect_handler_level=True
+        )
+        self.listener.start()
+        self.executor = self.create_executor()
+
+    def create_executor(self) -> ProcessPoolExecutor:
+        return ProcessPoolExecutor(
+            max_workers=self.processes,
+            mp_context=self.context,
+            initializer=initialize_worker,
+            initargs=(self.settings, self.log_queue),
+        )
+
+    def run(self, tasks: List[ShardTask]) -> List[ShardResult]:
+        """
+        Evaluate the tasks across the worker processes.
+
+        A worker process which dies (e.g. OOM killed) breaks the whole pool: it is replaced by a fresh one and the
+        tasks are evaluated again, which is safe as every decision is taken again from the current state.
+        """
+        try:
+            return list(self.executor.map(evaluate_shard, tasks))
+        except BrokenProcessPool as e:
+            logger.warning(
+                f"Pool of worker processes is broken ({e}), starting {self.processes} new worker processes"
+            )
+            self.executor.shutdown(wait=False, cancel_futures=True)
+            self.executor = self.create_executor()
+            return list(self.executor.map(evaluate_shard, tasks))
+
+    def autoscale(
+        self,
+        now: datetime.datetime,
+        kinds: List[str],
+        contexts: Dict[str, NamespaceContext],
+        exclude_names: FrozenSet[str],
+        matching_labels: FrozenSet[Pattern],
+        upscale_target_only: bool,
+        grace_period: int,
+        deployment_time_annotation: Optional[str],
+        dry_run: bool,
+        enable_events: bool,
+        minimal_patches: bool,
+        workers: int,
+        max_retries_on_conflict: int = 0,
+        cluster_wide: bool = False,
+    ) -> List[ShardResult]:
+        """Evaluate the kinds in the namespaces of contexts across the worker processes and log the merged stats."""
+        tasks = [
+            ShardTask(
+                now,
+                tuple(kinds),
+                {namespace: contexts[namespace] for namespace in shard},
+                exclude_names,
+                matching_labels,
+                upscale_target_only,
+                grace_period,
+                deployment_time_annotation,
+                dry_run,
+                enable_events,
+                minimal_patches,
+                workers,
+                max_retries_on_conflict,
+                cluster_wide,
+            )
+            for shard in shard_namespaces(list(contexts), self.processes)
+        ]
+        results = self.run(tasks)
+
+        counts: collections.Counter = collections.Counter()
+        for result in results:
+            counts.update(result.counts)
+            if result.next_transition is not None:
+                record_transition(result.next_transition)
+            if result.circuit_breaker_reason is not None:
+                logger.warning(
+                    f"Circuit breaker of worker process {result.pid} opened after {result.circuit_breaker_reason}, deferred {result.deferred} resources to the next cycle"
+                )
+            for decision in result.actions:
+                logger.debug(
+                    f"Worker process {result.pid}: {decision.operation} {decision.kind} {decision.namespace}/{decision.name}"
+                )
+        if results:
+            logger.info(
+                "Worker processes in this cycle: "
+                + ", ".join(
+                    f"{result.pid}: {sum(result.counts.values())} resources in {result.namespaces} namespaces, "
+                    f"{result.written} written in {result.seconds:.2f}s ({result.cpu_seconds:.2f}s CPU)"
+                    for result in results
+                )
+            )
+            logger.info(
+                f"Decisions in this cycle: {', '.join(f'{operation}: {count}' for operation, count in sorted(counts.items()))}"
+            )
+        return results
+
+    def stop(self):
+        self.executor.shutdown(wait=True)
+        self.listener.stop()
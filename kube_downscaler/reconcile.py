@@ -0,0 +1,109 @@
+import datetime
+import threading
+from typing import Dict
+from typing import Hashable
+from typing import NamedTuple
+from typing import Optional
+from typing import Set
+from typing import Tuple
+
+from kube_downscaler.timespec import record_transition
+
+
+class Evaluation(NamedTuple):
+    """Inputs a resource was last evaluated against."""
+
+    resource_version: str
+    config: Hashable
+    # the decision may change from this instant on (schedule boundary, exclude-until), None if never
+    valid_until: Optional[datetime.datetime]
+
+
+class ReconcileState:
+    """
+    Remember which resources need no re-evaluation, kept across cycles.
+
+    A resource is skipped while its resourceVersion and the config it was evaluated with (schedules, namespace
+    context, forced uptime/downtime) are unchanged and no schedule boundary has passed since. Every
+    full_resync_interval seconds all resources are evaluated again, as a safety net.
+    """
+
+    def __init__(self, full_resync_interval: float):
+        self.full_resync_interval = full_resync_interval
+        self.lock = threading.Lock()
+        self.evaluations: Dict[Tuple[str, str, str], Evaluation] = {}
+        self.last_full_resync: Optional[datetime.datetime] = None
+        self.full_resync = True
+        self.seen: Set[Tuple[str, str, str]] = set()
+        self.evaluated = 0
+        self.skipped = 0
+
+    def start_cycle(self, now: datetime.datetime):
+        with self.lock:
+            self.full_resync = (
+                self.last_full_resync is None
+                or (now - self.last_full_resync).total_seconds()
+                >= self.full_resync_interval
+            )
+            if self.full_resync:
+                self.last_full_resync = now
+            self.seen = set()
+            self.evaluated = 0
+            self.skipped = 0
+
+    def end_cycle(self):
+        """Forget the resources which were not listed in this cycle, e.g. deleted ones."""
+        with self.lock:
+            for key in list(self.evaluations):
+                if key not in self.seen:
+                    del self.evaluations[key]
+
+    def should_skip(self, resource, config: Hashable, now: datetime.datetime) -> bool:
+        key = (resource.kind, resource.namespace, resource.name)
+        resource_version = resource.metadata.get("resourceVersion")
+        with self.lock:
+            self.seen.add(key)
+            evaluation = self.evaluations.get(key)
+            if (
+                self.full_resync
+                or evaluation is None
+                or resource_version is None
+                or evaluation.resource_version != resource_version
+                or evaluation.config != config
+                or (
+                    evaluation.valid_until is not None and now >= evaluation.valid_until
+                )
+            ):
+                self.evaluated += 1
+                return False
+            self.skipped += 1
+        if evaluation.valid_until is not None:
+            # the skipped resource still wakes up the main loop at its next boundary
+            record_transition(evaluation.valid_until)
+        return True
+
+    def record(
+        self,
+        resource,
+        config: Hashable,
+        valid_until: Optional[datetime.datetime],
+    ):
+        """Remember a resource whose evaluation left it unchanged."""
+        resource_version = resource.metadata.get("resourceVersion")
+        if resource_version is None:
+            return
+        with self.lock:
+            self.evaluations[(resource.kind, resource.namespace, resource.name)] = (
+                Evaluation(resource_version, config, valid_until)
+            )
+
+    def forget(self, resource):
+        with self.lock:
+            self.evaluations.pop(
+                (resource.kind, resource.namespace, resource.name), None
+            )
+
+    def summary(self) -> str:
+        with self.lock:
+            mode = "full resync" if self.full_resync else "incremental"
+            return f"{self.evaluated} evaluated, {self.skipped} skipped ({mode})"
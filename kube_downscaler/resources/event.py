@@ -0,0 +1,9 @@
+from pykube.objects import NamespacedAPIObject
+
+
+class EventsV1Event(NamespacedAPIObject):
+    """Support the Event resource of the events.k8s.io API group (https://kubernetes.io/docs/reference/kubernetes-api/cluster-resources/event-v1/)."""
+
+    version = "events.k8s.io/v1"
+    endpoint = "events"
+    kind = "Event"
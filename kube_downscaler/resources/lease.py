@@ -0,0 +1,9 @@
+from pykube.objects import NamespacedAPIObject
+
+
+class Lease(NamespacedAPIObject):
+    """Support the Lease resource of the coordination.k8s.io API group (https://kubernetes.io/docs/concepts/architecture/leases/)."""
+
+    version = "coordination.k8s.io/v1"
+    endpoint = "leases"
+    kind = "Lease"
@@ -1,14 +1,22 @@
 import collections
+import copy
 import datetime
 import logging
 import re
+import threading
 import time
 from typing import Any
+from typing import Callable
+from typing import Dict
 from typing import FrozenSet
+from typing import Iterator
 from typing import List
+from typing import NamedTuple
 from typing import Optional
 from typing import Pattern
 from typing import Tuple
+from typing import TYPE_CHECKING
+from typing import Union
 
 import pykube
 import requests
@@ -27,7 +35,24 @@ from pykube.objects import NamespacedAPIObject
 from pykube.objects import PodDisruptionBudget
 
 from kube_downscaler import helper
+from kube_downscaler.concurrency import map_bounded
+from kube_downscaler.concurrency import WorkerStats
 from kube_downscaler.helper import matches_time_spec
+from kube_downscaler.matchers import compile_label_matcher
+from kube_downscaler.matchers import compile_namespace_matcher
+from kube_downscaler.matchers import namespace_field_selector
+from kube_downscaler.plan import ACTIONS
+from kube_downscaler.plan import CLEAR_ORIGINAL_REPLICAS
+from kube_downscaler.plan import Decision
+from kube_downscaler.plan import EXCLUDED
+from kube_downscaler.plan import FAILED
+from kube_downscaler.plan import NO_CHANGE
+from kube_downscaler.plan import Plan
+from kube_downscaler.plan import SCALE_DOWN
+from kube_downscaler.plan import SCALE_UP
+from kube_downscaler.plan import ScalingConfig
+from kube_downscaler.plan import WITHIN_GRACE_PERIOD
+from kube_downscaler.reconcile import ReconcileState
 from kube_downscaler.resources.autoscalingrunnerset import AutoscalingRunnerSet
 from kube_downscaler.resources.constraint import KubeDownscalerJobsConstraint
 from kube_downscaler.resources.constrainttemplate import ConstraintTemplate
@@ -35,6 +60,15 @@ from kube_downscaler.resources.keda import ScaledObject
 from kube_downscaler.resources.policy import KubeDownscalerJobsPolicy
 from kube_downscaler.resources.rollout import ArgoRollout
 from kube_downscaler.resources.stack import Stack
+from kube_downscaler.schedule import ScheduleTable
+from kube_downscaler.sharding import StaticShards
+from kube_downscaler.timespec import record_transition
+from kube_downscaler.timespec import track_transitions
+from kube_downscaler.tokenbucket import LANE_BACKGROUND
+from kube_downscaler.tokenbucket import LANE_SCALE
+
+if TYPE_CHECKING:
+    from kube_downscaler.processes import ProcessShards
 
 ORIGINAL_REPLICAS_ANNOTATION = "downscaler/original-replicas"
 FORCE_UPTIME_ANNOTATION = "downscaler/force-uptime"
@@ -117,6 +151,17 @@ def within_grace_period(
     now: datetime.datetime,
     deployment_time_annotation: Optional[str] = None,
 ):
+    return now <= get_grace_period_end(
+        resource, grace_period, deployment_time_annotation
+    )
+
+
+def get_grace_period_end(
+    resource,
+    grace_period: int,
+    deployment_time_annotation: Optional[str] = None,
+) -> datetime.datetime:
+    """Return the instant the grace period of a resource ends, using its grace period annotation when shorter."""
     update_time = parse_time(resource.metadata["creationTimestamp"])
 
     grace_period_annotation = resource.annotations.get(GRACE_PERIOD_ANNOTATION, None)
@@ -155,8 +200,7 @@ def within_grace_period(
                 logger.warning(
                     f"Invalid {deployment_time_annotation} in {resource.namespace}/{resource.name}: {e}"
                 )
-    delta = now - update_time
-    return delta.total_seconds() <= grace_period
+    return update_time + datetime.timedelta(seconds=grace_period)
 
 
 def within_grace_period_namespace(
@@ -207,11 +251,18 @@ def within_grace_period_namespace(
     return delta.total_seconds() <= grace_period
 
 
+# only pods which may still be running can force uptime, let the API server drop the finished ones
+RUNNING_PODS_FIELD_SELECTOR = "status.phase!=Succeeded,status.phase!=Failed"
+# ask for metadata only (annotations are all we need), API servers without support fall back to a full PodList
+PARTIAL_OBJECT_METADATA_ACCEPT = (
+    "application/json;as=PartialObjectMetadataList;g=meta.k8s.io;v=v1,application/json"
+)
+
+
 def pods_force_uptime(api, namespace: FrozenSet[str]):
     """Return True if there are any running pods which require the deployments to be scaled back up."""
-    pods = get_pod_resources(api, namespace)
-
-    for pod in pods:
+    for pod in get_pod_resources(api, namespace):
+        # metadata-only responses carry no status, the phase was already filtered by the field selector
         if pod.obj.get("status", {}).get("phase") in ("Succeeded", "Failed"):
             continue
         if pod.annotations.get(FORCE_UPTIME_ANNOTATION, "").lower() == "true":
@@ -220,16 +271,49 @@ def pods_force_uptime(api, namespace: FrozenSet[str]):
     return False
 
 
+def pods_force_uptime_needed(namespaces: FrozenSet[str], namespace_to_namespace_obj):
+    """
+    Return False if no namespace in scope depends on the pods' force uptime annotation.
+
+    A namespace with its own force uptime annotation overrides the value derived from the pods,
+    so the pod query can be skipped when every namespace in scope carries the annotation.
+    """
+    if not namespace_to_namespace_obj:
+        return True
+    if len(namespaces) >= 1 and not all(
+        namespace in namespace_to_namespace_obj for namespace in namespaces
+    ):
+        return True
+    return any(
+        FORCE_UPTIME_ANNOTATION not in namespace_obj.annotations
+        for namespace_obj in namespace_to_namespace_obj.values()
+    )
+
+
 def get_pod_resources(api, namespaces: FrozenSet[str]):
+    """
+    Yield the pods which are not Succeeded/Failed, as metadata-only objects where the API server supports it.
+
+    Pods are fetched lazily (cluster-wide page by page, or --list-concurrency namespaces at a time in constrained
+    mode), so callers can stop at the first match.
+    """
+    params = {"fieldSelector": RUNNING_PODS_FIELD_SELECTOR}
+    headers = {"Accept": PARTIAL_OBJECT_METADATA_ACCEPT}
     if len(namespaces) >= 1:
-        pods = []
-        for namespace in namespaces:
+
+        def get_pods_in_namespace(namespace):
             try:
-                pods_query_result = helper.call_with_exponential_backoff(
-                    lambda: pykube.Pod.objects(api).filter(namespace=namespace),
-                    context_msg=f"fetching pods for namespace {namespace}",
+                return list(
+                    helper.list_objects(
+                        pykube.Pod,
+                        api,
+                        namespace,
+                        page_size=helper.LIST_PAGE_SIZE,
+                        params=params,
+                        headers=headers,
+                        context_msg=f"fetching pods for namespace {namespace}",
+                    )
                 )
-                pods += pods_query_result
             except requests.HTTPError as e:
                 if e.response.status_code == 404:
                     logger.debug(f"No pods found in namespace {namespace} (404)")
@@ -245,10 +329,26 @@ def get_pod_resources(api, namespaces: FrozenSet[str]):
                     )
                 else:
                     raise e
+            return []
+
+        # the namespaces of a chunk are listed concurrently, the next chunk only if no pod forced uptime yet
+        namespace_list = sorted(namespaces)
+        chunk_size = max(helper.LIST_CONCURRENCY, 1)
+        for start in range(0, len(namespace_list), chunk_size):
+            for pods_in_namespace in map_bounded(
+                get_pods_in_namespace,
+                namespace_list[start : start + chunk_size],
+                helper.LIST_CONCURRENCY,
+            ):
+                yield from pods_in_namespace
     else:
         try:
-            pods = helper.call_with_exponential_backoff(
-                lambda: pykube.Pod.objects(api).filter(namespace=pykube.all),
+            yield from helper.list_objects(
+                pykube.Pod,
+                api,
+                page_size=helper.LIST_PAGE_SIZE,
+                params=params,
+                headers=headers,
                 context_msg="fetching pods clusterwide",
             )
         except requests.HTTPError as e:
@@ -263,8 +363,6 @@ def get_pod_resources(api, namespaces: FrozenSet[str]):
             else:
                 raise e
 
-    return pods
-
 
 def create_excluded_namespaces_regex(namespaces: FrozenSet[str]):
     # Ensure the input is a FrozenSet of strings
@@ -294,13 +392,14 @@ def create_excluded_namespaces_regex(namespaces: FrozenSet[str]):
 def get_namespace_to_namespace_obj(api, namespaces):
     namespace_to_namespace_objects = {}
     if len(namespaces) >= 1:
-        for namespace in namespaces:
+
+        def get_namespace_obj(namespace):
             try:
-                namespace_object = helper.call_with_exponential_backoff(
+                return helper.call_with_exponential_backoff(
                     lambda: Namespace.objects(api).get(name=namespace),
                     context_msg=f"fetching namespace {namespace}",
+                    verb="get",
                 )
-                namespace_to_namespace_objects[namespace] = namespace_object
             except requests.HTTPError as e:
                 if e.response.status_code == 403:
                     logger.error(
@@ -314,10 +413,20 @@ def get_namespace_to_namespace_obj(api, namespaces):
                     )
                 else:
                     raise e
+            return None
+
+        namespace_objects = map_bounded(
+            get_namespace_obj, namespaces, helper.LIST_CONCURRENCY
+        )
+        for namespace, namespace_object in zip(namespaces, namespace_objects):
+            if namespace_object is not None:
+                namespace_to_namespace_objects[namespace] = namespace_object
     else:
         try:
             namespace_objects = helper.call_with_exponential_backoff(
-                lambda: Namespace.objects(api), context_msg="fetching all namespaces"
+                lambda: Namespace.objects(api),
+                context_msg="fetching all namespaces",
+                verb="list",
             )
             for obj in namespace_objects:
                 namespace_to_namespace_objects[obj.name] = obj
@@ -338,17 +447,86 @@ def get_namespace_to_namespace_obj(api, namespaces):
     return namespace_to_namespace_objects
 
 
-def get_resources(kind, api, namespaces: FrozenSet[str], excluded_namespaces):
+def filter_query(query, selectors: dict):
+    """Apply the labelSelector/fieldSelector of selectors to a pykube query."""
+    if not selectors:
+        return query
+    return query.filter(
+        selector=selectors.get("labelSelector"),
+        field_selector=selectors.get("fieldSelector"),
+    )
+
+
+def get_resources(
+    kind,
+    api,
+    namespaces: FrozenSet[str],
+    excluded_namespaces,
+    informer_cache=None,
+):
+    pages, excluded_namespaces = get_resource_pages(
+        kind, api, namespaces, excluded_namespaces, informer_cache
+    )
+    resources = []
+    for page in pages:
+        resources += page
+    return resources, excluded_namespaces
+
+
+def get_resource_pages(
+    kind,
+    api,
+    namespaces: FrozenSet[str],
+    excluded_namespaces,
+    informer_cache=None,
+):
+    """
+    Return the resources of a kind as an iterable of pages, together with the namespaces to exclude.
+
+    Cluster-wide lists with --list-page-size are fetched lazily one page at a time while the caller processes the
+    previous pages, so only one page is held in memory; everything else is a single page.
+    """
+    if informer_cache is not None:
+        cached_objects = informer_cache.list(kind, namespaces)
+        if cached_objects is not None:
+            if len(namespaces) >= 1:
+                excluded_namespaces = create_excluded_namespaces_regex(namespaces)
+            return [[kind(api, obj) for obj in cached_objects]], excluded_namespaces
+
+    # let the API server drop the excluded namespaces it can, the remaining patterns are still matched client-side.
+    # --matching-labels are only matched client-side: a resource whose labels stopped matching must still be listed,
+    # to scale it back up if it was downscaled before.
+    selectors = {}
+    if len(namespaces) == 0:
+        field_selector = namespace_field_selector(excluded_namespaces)
+        if field_selector:
+            selectors["fieldSelector"] = field_selector
+    if selectors:
+        logger.debug(f"Listing {kind.endpoint} with selectors {selectors}")
+
     if len(namespaces) >= 1:
-        resources = []
         excluded_namespaces = create_excluded_namespaces_regex(namespaces)
-        for namespace in namespaces:
+
+        def get_resources_in_namespace(namespace):
             try:
-                resources_inside_namespace = helper.call_with_exponential_backoff(
-                    lambda: kind.objects(api, namespace=namespace),
-                    context_msg=f"{kind.endpoint} in namespace {namespace}",
-                )
-                resources += resources_inside_namespace
+                if helper.LIST_PAGE_SIZE:
+                    resources_inside_namespace = helper.list_objects(
+                        kind,
+                        api,
+                        namespace,
+                        page_size=helper.LIST_PAGE_SIZE,
+                        params=selectors,
+                        context_msg=f"{kind.endpoint} in namespace {namespace}",
+                    )
+                else:
+                    resources_inside_namespace = helper.call_with_exponential_backoff(
+                        lambda: filter_query(
+                            kind.objects(api, namespace=namespace), selectors
+                        ),
+                        context_msg=f"{kind.endpoint} in namespace {namespace}",
+                        verb="list",
+                    )
+                return list(resources_inside_namespace)
             except requests.HTTPError as e:
                 if e.response.status_code == 404:
                     logger.debug(
@@ -366,25 +544,58 @@ def get_resources(kind, api, namespaces: FrozenSet[str], excluded_namespaces):
                     )
                 else:
                     raise e
+            return []
+
+        resources = []
+        for resources_in_namespace in map_bounded(
+            get_resources_in_namespace, namespaces, helper.LIST_CONCURRENCY
+        ):
+            resources += resources_in_namespace
+        pages = [resources]
+    elif helper.LIST_PAGE_SIZE:
+        pages = get_resource_pages_cluster_wide(kind, api, selectors)
     else:
         try:
             resources = helper.call_with_exponential_backoff(
-                lambda: kind.objects(api, namespace=pykube.all),
+                lambda: filter_query(
+                    kind.objects(api, namespace=pykube.all), selectors
+                ),
                 context_msg=f"retrieving {kind.endpoint}s cluster-wide",
+                verb="list",
             )
         except requests.HTTPError as e:
-            if e.response.status_code == 403:
-                logger.warning(
-                    f"KubeDownscaler is not authorized to perform a cluster wide query to retrieve {kind.endpoint} (403)"
-                )
-            if e.response.status_code == 429:
-                logger.warning(
-                    f"KubeDownscaler is being rate-limited by the Kubernetes API while querying {kind.endpoint} (429 Too Many Requests). Retrying at next cycle"
-                )
-            else:
-                raise e
+            handle_cluster_wide_list_error(kind, e)
+            resources = []
+        pages = [resources]
+
+    return pages, excluded_namespaces
 
-    return resources, excluded_namespaces
+
+def get_resource_pages_cluster_wide(kind, api, selectors: dict):
+    # a generator: pages after the first are fetched while iterating, their errors are handled here as well
+    try:
+        yield from helper.list_pages(
+            kind,
+            api,
+            page_size=helper.LIST_PAGE_SIZE,
+            params=selectors,
+            context_msg=f"retrieving {kind.endpoint}s cluster-wide",
+        )
+    except requests.HTTPError as e:
+        handle_cluster_wide_list_error(kind, e)
+
+
+def handle_cluster_wide_list_error(kind, e: requests.HTTPError):
+    if e.response.status_code == 403:
+        logger.warning(
+            f"KubeDownscaler is not authorized to perform a cluster wide query to retrieve {kind.endpoint} (403)"
+        )
+    if e.response.status_code == 429:
+        logger.warning(
+            f"KubeDownscaler is being rate-limited by the Kubernetes API while querying {kind.endpoint} (429 Too Many Requests). Retrying at next cycle"
+        )
+    else:
+        raise e
 
 
 def get_resource(kind, api, namespace, resource_name: str):
@@ -394,6 +605,7 @@ def get_resource(kind, api, namespace, resource_name: str):
             .filter(namespace=namespace)
             .get_or_none(name=resource_name),
             context_msg=f"retrieving {kind.endpoint} in namespace {namespace}",
+            verb="get",
         )
         if resource is None:
             logger.debug(f"{kind.endpoint} {namespace}/{resource_name} not found")
@@ -437,23 +649,13 @@ def is_stack_deployment(resource: NamespacedAPIObject) -> bool:
 def ignore_if_labels_dont_match(
     resource: NamespacedAPIObject, labels: FrozenSet[Pattern]
 ) -> bool:
+    matcher = compile_label_matcher(labels)
     # For backwards compatibility, if there is no label filter, we don't ignore anything
-    if not any(label.pattern for label in labels):
+    if not matcher.enabled:
         return False
 
     # Ignore resources whose labels do not match the set of input labels
-    resource_labels = [f"{key}={value}" for key, value in resource.labels.items()]
-    ignore = True
-    for label_pattern in labels:
-        if not ignore:
-            break
-        ignore = not any(
-            [
-                label_pattern.fullmatch(resource_label)
-                for resource_label in resource_labels
-            ]
-        )
-    return ignore
+    return not matcher.matches(resource.labels)
 
 
 def ignore_resource(resource: NamespacedAPIObject, now: datetime.datetime) -> bool:
@@ -476,6 +678,7 @@ def ignore_resource(resource: NamespacedAPIObject, now: datetime.datetime) -> bo
             # we will ignore the invalid timestamp and treat the resource as not excluded
             return False
         if now < until_ts:
+            record_transition(until_ts)
             return True
 
     return False
@@ -978,6 +1181,208 @@ def get_annotation_value_as_int(resource: NamespacedAPIObject, annotation_name:
     )
 
 
+class NamespacePolicy(NamedTuple):
+    """Annotations of a Namespace overriding the defaults, parsed once per resourceVersion."""
+
+    uptime: Optional[str]
+    downtime: Optional[str]
+    upscale_period: Optional[str]
+    downscale_period: Optional[str]
+    forced_uptime: Optional[str]
+    forced_downtime: Optional[str]
+    downtime_replicas: Optional[int]
+    is_downtime_replicas_percentage: Optional[bool]
+
+
+class NamespaceContext(NamedTuple):
+    """Effective policy of a Namespace in one cycle, shared by all kinds and the jobs path."""
+
+    uptime: str
+    downtime: str
+    upscale_period: str
+    downscale_period: str
+    forced_uptime: bool
+    forced_downtime: bool
+    downtime_replicas: int
+    is_downtime_replicas_percentage: bool
+    excluded: bool
+
+    def scaling_config(
+        self,
+        upscale_target_only: bool,
+        grace_period: int,
+        deployment_time_annotation: Optional[str],
+        matching_labels: FrozenSet[Pattern],
+    ) -> ScalingConfig:
+        return ScalingConfig(
+            self.upscale_period,
+            self.downscale_period,
+            self.uptime,
+            self.downtime,
+            self.forced_uptime,
+            self.forced_downtime,
+            upscale_target_only,
+            grace_period,
+            self.downtime_replicas,
+            self.is_downtime_replicas_percentage,
+            self.excluded,
+            deployment_time_annotation,
+            matching_labels,
+        )
+
+
+# namespace name -> ((uid, resourceVersion), policy), kept across cycles
+NAMESPACE_POLICIES: Dict[str, Tuple[Tuple[Any, Any], NamespacePolicy]] = {}
+NAMESPACE_POLICIES_LOCK = threading.Lock()
+
+
+def parse_namespace_policy(namespace_obj: APIObject) -> NamespacePolicy:
+    annotations = namespace_obj.annotations
+    forced_uptime = annotations.get(FORCE_UPTIME_ANNOTATION)
+    forced_downtime = annotations.get(FORCE_DOWNTIME_ANNOTATION)
+    (
+        downtime_replicas,
+        is_downtime_replicas_percentage,
+    ) = get_annotation_value_as_positive_int(
+        namespace_obj, DOWNTIME_REPLICAS_ANNOTATION
+    )
+    return NamespacePolicy(
+        annotations.get(UPTIME_ANNOTATION),
+        annotations.get(DOWNTIME_ANNOTATION),
+        annotations.get(UPSCALE_PERIOD_ANNOTATION),
+        annotations.get(DOWNSCALE_PERIOD_ANNOTATION),
+        None if forced_uptime is None else str(forced_uptime),
+        None if forced_downtime is None else str(forced_downtime),
+        downtime_replicas,
+        is_downtime_replicas_percentage,
+    )
+
+
+def get_namespace_policy(
+    namespace: str, namespace_obj: APIObject
+) -> Tuple[NamespacePolicy, bool]:
+    """Return the parsed policy of a Namespace and whether it was cached, re-parsing it only when the Namespace changed."""
+    resource_version = namespace_obj.metadata.get("resourceVersion")
+    if resource_version is None:
+        return parse_namespace_policy(namespace_obj), False
+    version = (namespace_obj.metadata.get("uid"), resource_version)
+    with NAMESPACE_POLICIES_LOCK:
+        cached = NAMESPACE_POLICIES.get(namespace)
+    if cached is not None and cached[0] == version:
+        return cached[1], True
+    policy = parse_namespace_policy(namespace_obj)
+    with NAMESPACE_POLICIES_LOCK:
+        NAMESPACE_POLICIES[namespace] = (version, policy)
+    return policy, False
+
+
+def prune_namespace_policies(namespaces):
+    """Forget the cached policies of Namespaces which no longer exist."""
+    with NAMESPACE_POLICIES_LOCK:
+        for name in list(NAMESPACE_POLICIES):
+            if name not in namespaces:
+                del NAMESPACE_POLICIES[name]
+
+
+def matches_forced_spec(value: str, now: datetime.datetime) -> bool:
+    if value.lower() == "true":
+        return True
+    elif value.lower() == "false":
+        return False
+    elif value:
+        return matches_time_spec(now, value)
+    return False
+
+
+class NamespaceContextTable:
+    """
+    Per-cycle table of NamespaceContexts, built once per Namespace on first use.
+
+    The annotations of a Namespace are only parsed again when its resourceVersion changed since the last cycle; the
+    time dependent parts (force-uptime/force-downtime specs, exclude-until) are evaluated once per cycle.
+    """
+
+    def __init__(
+        self,
+        now: datetime.datetime,
+        upscale_period: str,
+        downscale_period: str,
+        default_uptime: str,
+        default_downtime: str,
+        forced_uptime: bool,
+        downtime_replicas: int = 0,
+        is_downtime_replicas_percentage: bool = False,
+    ):
+        self.now = now
+        self.upscale_period = upscale_period
+        self.downscale_period = downscale_period
+        self.default_uptime = default_uptime
+        self.default_downtime = default_downtime
+        self.forced_uptime = forced_uptime
+        self.downtime_replicas = downtime_replicas
+        self.is_downtime_replicas_percentage = is_downtime_replicas_percentage
+        self.lock = threading.Lock()
+        self.contexts: Dict[str, NamespaceContext] = {}
+        self.parsed = 0
+
+    def context_for(self, namespace: str, namespace_obj: APIObject) -> NamespaceContext:
+        with self.lock:
+            context = self.contexts.get(namespace)
+        if context is not None:
+            return context
+        policy, cached = get_namespace_policy(namespace, namespace_obj)
+        context = NamespaceContext(
+            policy.uptime if policy.uptime is not None else self.default_uptime,
+            policy.downtime if policy.downtime is not None else self.default_downtime,
+            (
+                policy.upscale_period
+                if policy.upscale_period is not None
+                else self.upscale_period
+            ),
+            (
+                policy.downscale_period
+                if policy.downscale_period is not None
+                else self.downscale_period
+            ),
+            matches_forced_spec(
+                (
+                    policy.forced_uptime
+                    if policy.forced_uptime is not None
+                    else str(self.forced_uptime)
+                ),
+                self.now,
+            ),
+            matches_forced_spec(
+                (
+                    policy.forced_downtime
+                    if policy.forced_downtime is not None
+                    else str(False)
+                ),
+                self.now,
+            ),
+            (
+                policy.downtime_replicas
+                if policy.downtime_replicas is not None
+                else self.downtime_replicas
+            ),
+            (
+                policy.is_downtime_replicas_percentage
+                if policy.is_downtime_replicas_percentage is not None
+                else self.is_downtime_replicas_percentage
+            ),
+            ignore_resource(namespace_obj, self.now),
+        )
+        with self.lock:
+            self.contexts[namespace] = context
+            if not cached:
+                self.parsed += 1
+        return context
+
+    def summary(self) -> str:
+        with self.lock:
+            return f"{len(self.contexts)} namespaces, {self.parsed} parsed, {len(self.contexts) - self.parsed} cached"
+
+
 def autoscale_jobs_for_namespace(
     api,
     resource: NamespacedAPIObject,  # resource here is a namespace object
@@ -996,7 +1401,10 @@ def autoscale_jobs_for_namespace(
     deployment_time_annotation: Optional[str] = None,
     namespace_excluded: bool = False,
     enable_events: bool = False,
+    schedule_table: Optional[ScheduleTable] = None,
 ):
+    if schedule_table is None:
+        schedule_table = ScheduleTable(now)
     try:
         exclude = namespace_excluded
 
@@ -1026,15 +1434,9 @@ def autoscale_jobs_for_namespace(
             elif upscale_period != "never" or downscale_period != "never":
                 uptime = upscale_period
                 downtime = downscale_period
-                if matches_time_spec(now, uptime) and matches_time_spec(now, downtime):
-                    logger.debug("Upscale and downscale periods overlap, do nothing")
-                    ignore = True
-                elif matches_time_spec(now, uptime):
-                    is_uptime = True
-                elif matches_time_spec(now, downtime):
-                    is_uptime = False
-                else:
-                    ignore = True
+                is_uptime, ignore = schedule_table.evaluate(
+                    uptime, downtime, upscale_period, downscale_period
+                )
                 logger.debug(
                     f"Periods checked: upscale={upscale_period}, downscale={downscale_period}, ignore={ignore}, is_uptime={is_uptime}"
                 )
@@ -1043,8 +1445,8 @@ def autoscale_jobs_for_namespace(
                 downtime = resource.annotations.get(
                     DOWNTIME_ANNOTATION, default_downtime
                 )
-                is_uptime = matches_time_spec(now, uptime) and not matches_time_spec(
-                    now, downtime
+                is_uptime, ignore = schedule_table.evaluate(
+                    uptime, downtime, upscale_period, downscale_period
                 )
 
             update_needed = False
@@ -1094,6 +1496,8 @@ def autoscale_jobs_for_namespace(
                         helper.call_with_exponential_backoff(
                             lambda: KubeDownscalerJobsConstraint(api, policy).create(),
                             context_msg="creating KubeDownscalerJobsConstraint",
+                            verb="create",
+                            lane=LANE_SCALE,
                         )
                         logger.debug("KubeDownscalerJobsConstraint Created")
                     elif (
@@ -1103,18 +1507,24 @@ def autoscale_jobs_for_namespace(
                         helper.call_with_exponential_backoff(
                             lambda: KubeDownscalerJobsPolicy(api, policy).create(),
                             context_msg="creating KubeDownscalerJobsPolicy",
+                            verb="create",
+                            lane=LANE_SCALE,
                         )
                         logger.debug("Kyverno KubeDownscalerJobsPolicy Created")
                     elif operation == "scale_up":
                         helper.call_with_exponential_backoff(
                             lambda: policy.delete(),
                             context_msg="deleting Kyverno Policy",
+                            verb="delete",
+                            lane=LANE_SCALE,
                         )
                         logger.debug("Kyverno Policy Correctly Deleted")
                     elif operation == "kyverno_update":
                         helper.call_with_exponential_backoff(
                             lambda: KubeDownscalerJobsPolicy(api, policy).update(),
                             context_msg="updating Kyverno Policy",
+                            verb="update",
+                            lane=LANE_SCALE,
                         )
                         logger.debug("Kyverno Policy Correctly Updated")
                     elif operation == "no_scale":
@@ -1128,6 +1538,375 @@ def autoscale_jobs_for_namespace(
         logger.exception(f"Failed to process {resource.kind} {resource.name}: {e}")
 
 
+def decide(
+    resource: NamespacedAPIObject,
+    now: datetime.datetime,
+    config: ScalingConfig,
+    schedule_table: Optional[ScheduleTable] = None,
+) -> Decision:
+    """Decide what to do with a resource, without changing it or calling the API server."""
+    if schedule_table is None:
+        schedule_table = ScheduleTable(now)
+
+    def decision(operation: str, **kwargs) -> Decision:
+        return Decision(
+            resource.kind, resource.namespace, resource.name, operation, **kwargs
+        )
+
+    exclude = (
+        config.namespace_excluded
+        or ignore_if_labels_dont_match(resource, config.matching_labels)
+        or ignore_resource(resource, now)
+    )
+    original_replicas, is_original_replicas_percentage = get_annotation_value_as_int(
+        resource, ORIGINAL_REPLICAS_ANNOTATION
+    )
+
+    downtime_replicas = config.downtime_replicas
+    is_downtime_replicas_percentage = config.is_downtime_replicas_percentage
+    (
+        downtime_replicas_from_annotation,
+        is_downtime_replicas_from_annotation_percentage,
+    ) = get_annotation_value_as_positive_int(resource, DOWNTIME_REPLICAS_ANNOTATION)
+
+    if downtime_replicas_from_annotation is not None:
+        downtime_replicas = downtime_replicas_from_annotation
+
+    if is_downtime_replicas_from_annotation_percentage is not None:
+        is_downtime_replicas_percentage = (
+            is_downtime_replicas_from_annotation_percentage
+        )
+
+    if define_scope(exclude, original_replicas, config.upscale_target_only):
+        logger.debug(
+            f"{resource.kind} {resource.namespace}/{resource.name} was excluded"
+        )
+        return decision(EXCLUDED)
+
+    ignore = False
+    is_uptime = True
+
+    upscale_period = resource.annotations.get(
+        UPSCALE_PERIOD_ANNOTATION, config.upscale_period
+    )
+    downscale_period = resource.annotations.get(
+        DOWNSCALE_PERIOD_ANNOTATION, config.downscale_period
+    )
+    if config.forced_uptime or (exclude and original_replicas):
+        uptime = "forced"
+        downtime = "ignored"
+        is_uptime = True
+    elif config.forced_downtime and not (exclude and original_replicas):
+        uptime = "ignored"
+        downtime = "forced"
+        is_uptime = False
+    elif upscale_period != "never" or downscale_period != "never":
+        uptime = upscale_period
+        downtime = downscale_period
+        is_uptime, ignore = schedule_table.evaluate(
+            uptime, downtime, upscale_period, downscale_period
+        )
+        logger.debug(
+            f"Periods checked: upscale={upscale_period}, downscale={downscale_period}, ignore={ignore}, is_uptime={is_uptime}"
+        )
+    else:
+        uptime = resource.annotations.get(UPTIME_ANNOTATION, config.default_uptime)
+        downtime = resource.annotations.get(
+            DOWNTIME_ANNOTATION, config.default_downtime
+        )
+        is_uptime, ignore = schedule_table.evaluate(
+            uptime, downtime, upscale_period, downscale_period
+        )
+
+    replicas, replicas_is_percentage = get_replicas(resource, original_replicas, uptime)
+
+    if (
+        not ignore
+        and is_uptime
+        and replicas == downtime_replicas
+        and original_replicas
+        and (original_replicas > 0 or original_replicas == -1)
+    ):
+        return decision(
+            SCALE_UP,
+            replicas=replicas,
+            replicas_is_percentage=replicas_is_percentage,
+            target_replicas=original_replicas,
+            target_replicas_is_percentage=bool(is_original_replicas_percentage),
+            uptime=uptime,
+            downtime=downtime,
+        )
+    elif (
+        not ignore
+        and is_uptime
+        and original_replicas
+        and (original_replicas > 0 or original_replicas == -1)
+        and replicas == original_replicas
+        and replicas != downtime_replicas
+    ):
+        # Resource is already at its original replica count (e.g., restored
+        # externally while the annotation was still present). The stale
+        # annotation is cleared so the downscaler does not get confused on the next cycle.
+        return decision(
+            CLEAR_ORIGINAL_REPLICAS,
+            replicas=replicas,
+            replicas_is_percentage=replicas_is_percentage,
+            target_replicas=original_replicas,
+            target_replicas_is_percentage=bool(is_original_replicas_percentage),
+            uptime=uptime,
+            downtime=downtime,
+        )
+    elif (
+        not ignore
+        and not is_uptime
+        and (replicas > 0 and replicas > downtime_replicas or replicas == -1)
+    ):
+        grace_period_end = get_grace_period_end(
+            resource, config.grace_period, config.deployment_time_annotation
+        )
+        if now <= grace_period_end:
+            # wake up to scale it down right when the grace period ends
+            record_transition(grace_period_end)
+            logger.info(
+                f"{resource.kind} {resource.namespace}/{resource.name} within grace period ({config.grace_period}s), not scaling down (yet)"
+            )
+            return decision(WITHIN_GRACE_PERIOD, uptime=uptime, downtime=downtime)
+        return decision(
+            SCALE_DOWN,
+            replicas=replicas,
+            replicas_is_percentage=replicas_is_percentage,
+            target_replicas=downtime_replicas,
+            target_replicas_is_percentage=bool(is_downtime_replicas_percentage),
+            uptime=uptime,
+            downtime=downtime,
+        )
+    return decision(NO_CHANGE, uptime=uptime, downtime=downtime)
+
+
+def apply_decision(
+    decision: Decision,
+    resource: NamespacedAPIObject,
+    kind: NamespacedAPIObject,
+    dry_run: bool,
+    enable_events: bool = False,
+    minimal_patches: bool = False,
+) -> bool:
+    """Change the resource as decided and write it to the API server, return whether it was written."""
+    if decision.operation not in ACTIONS:
+        return False
+    original_obj = copy.deepcopy(resource.obj) if minimal_patches else None
+    if decision.operation == SCALE_UP:
+        # set by plan() for every scale operation
+        assert decision.replicas is not None
+        assert decision.target_replicas is not None
+        try:
+            scale_up(
+                resource,
+                decision.replicas,
+                decision.replicas_is_percentage,
+                decision.target_replicas,
+                decision.target_replicas_is_percentage,
+                decision.uptime,
+                decision.downtime,
+                dry_run=dry_run,
+                enable_events=enable_events,
+            )
+        except ValueError:
+            return False
+    elif decision.operation == SCALE_DOWN:
+        assert decision.replicas is not None
+        assert decision.target_replicas is not None
+        try:
+            scale_down(
+                resource,
+                decision.replicas,
+                decision.replicas_is_percentage,
+                decision.target_replicas,
+                decision.target_replicas_is_percentage,
+                decision.uptime,
+                decision.downtime,
+                dry_run=dry_run,
+                enable_events=enable_events,
+            )
+        except ValueError:
+            return False
+    elif decision.operation == CLEAR_ORIGINAL_REPLICAS:
+        logger.info(
+            f"{resource.kind} {resource.namespace}/{resource.name} already at original replicas "
+            f"({decision.target_replicas}), clearing stale {ORIGINAL_REPLICAS_ANNOTATION} annotation"
+        )
+        resource.annotations[ORIGINAL_REPLICAS_ANNOTATION] = None
+
+    if original_obj is not None:
+        patch = helper.compute_json_patch(original_obj, resource.obj)
+        if not patch:
+            logger.debug(
+                f"{resource.kind} {resource.namespace}/{resource.name} is already up to date, skipping write"
+            )
+            return False
+        elif dry_run:
+            logger.info(
+                f"**DRY-RUN**: would patch {resource.kind} {resource.namespace}/{resource.name} with {patch}"
+            )
+        else:
+            helper.call_with_exponential_backoff(
+                lambda: helper.json_patch(resource, patch),
+                context_msg=f"patching {kind.endpoint} {resource.namespace}/{resource.name}",
+                verb="patch",
+                lane=LANE_SCALE,
+            )
+    elif dry_run:
+        logger.info(
+            f"**DRY-RUN**: would update {resource.kind} {resource.namespace}/{resource.name}"
+        )
+    else:
+        helper.call_with_exponential_backoff(
+            lambda: resource.update(),
+            context_msg=f"patching {kind.endpoint} {resource.namespace}/{resource.name}",
+            verb="update",
+            lane=LANE_SCALE,
+        )
+    return True
+
+
+def plan(
+    snapshot: List[NamespacedAPIObject],
+    now: datetime.datetime,
+    config: ScalingConfig,
+    schedule_table: Optional[ScheduleTable] = None,
+) -> Plan:
+    """
+    Decide what to do with every resource of a snapshot sharing the same config, e.g. the resources of a namespace.
+
+    Resources whose decision fails (e.g. invalid annotations) are logged and planned as FAILED.
+    """
+    if schedule_table is None:
+        schedule_table = ScheduleTable(now)
+    decisions = []
+    for resource in snapshot:
+        try:
+            decisions.append(decide(resource, now, config, schedule_table))
+        except Exception as e:
+            logger.exception(
+                f"Failed to process {resource.kind} {resource.namespace}/{resource.name}: {e}"
+            )
+            decisions.append(
+                Decision(resource.kind, resource.namespace, resource.name, FAILED)
+            )
+    return Plan(tuple(decisions))
+
+
+def execute_plan(
+    scaling_plan: Plan,
+    snapshot: List[NamespacedAPIObject],
+    kind: NamespacedAPIObject,
+    dry_run: bool,
+    enable_events: bool = False,
+    minimal_patches: bool = False,
+    workers: int = 1,
+    map_func: Callable = map_bounded,
+    max_retries_on_conflict: int = 0,
+    decide_again: Optional[Callable[[NamespacedAPIObject], Decision]] = None,
+) -> int:
+    """
+    Apply the actions of a plan to the resources of its snapshot, return the number of resources written.
+
+    Actions of the same namespace are applied in order by one worker, namespaces are spread over the workers by
+    map_func (map_bounded by default), which takes the function, the items and the number of workers.
+    A write failing with a conflict is retried up to max_retries_on_conflict times with the resource fetched
+    again and decided again by decide_again, like autoscale_resource does.
+    """
+    resources = {(r.kind, r.namespace, r.name): r for r in snapshot}
+    actions_by_namespace: Dict[str, List[Decision]] = collections.defaultdict(list)
+    for decision in scaling_plan.actions:
+        actions_by_namespace[decision.namespace].append(decision)
+
+    def execute_namespace(actions: List[Decision]) -> int:
+        written = 0
+        for index, decision in enumerate(actions):
+            circuit_breaker = helper.CIRCUIT_BREAKER
+            if circuit_breaker is not None and circuit_breaker.is_open:
+                circuit_breaker.defer(len(actions) - index)
+                break
+            if helper.leadership_lost():
+                break
+            resource: Optional[NamespacedAPIObject] = resources[decision.key]
+            retries = max_retries_on_conflict if decide_again is not None else 0
+            while resource is not None:
+                try:
+                    if apply_decision(
+                        decision,
+                        resource,
+                        kind,
+                        dry_run,
+                        enable_events=enable_events,
+                        minimal_patches=minimal_patches,
+                    ):
+                        written += 1
+                    break
+                except Exception as e:
+                    if not should_retry_on_conflict(e, resource, retries):
+                        break
+                    retries -= 1
+                    refreshed_resource = get_resource(
+                        kind, resource.api, resource.namespace, resource.name
+                    )
+                    if refreshed_resource is None:
+                        logger.warning(
+                            f"Retry process failed for {resource.kind} {resource.namespace}/{resource.name} because the resource cannot be found, it may have been deleted from the cluster"
+                        )
+                    elif decide_again is not None:
+                        decision = decide_again(refreshed_resource)
+                    resource = refreshed_resource
+        return written
+
+    return sum(
+        map_func(execute_namespace, list(actions_by_namespace.values()), workers)
+    )
+
+
+def is_conflict(e: Exception) -> bool:
+    """Whether a write failed because the resource was changed since it was read."""
+    if not isinstance(e, HTTPError):
+        return False
+    message = str(e).lower()
+    # 409 for an update with a stale resourceVersion, 422 for a failed test operation of a minimal patch
+    return "the object has been modified" in message or (
+        e.code == 422 and "testing value" in message
+    )
+
+
+def should_retry_on_conflict(
+    e: Exception, resource: NamespacedAPIObject, max_retries_on_conflict: int
+) -> bool:
+    """Log why processing the resource failed, return whether it should be fetched again and processed once more."""
+    if is_conflict(e):
+        logger.warning(
+            f"Unable to process {resource.kind} {resource.namespace}/{resource.name} because it was recently modified"
+        )
+        if max_retries_on_conflict > 0:
+            logger.info(
+                f"Retrying processing {resource.kind} {resource.namespace}/{resource.name} (Remaining Retries: {max_retries_on_conflict})"
+            )
+            return True
+        logger.warning(
+            f"Will retry processing {resource.kind} {resource.namespace}/{resource.name} in the next iteration, unless the --once argument is specified"
+        )
+    elif isinstance(e, HTTPError) and "not found" in str(e).lower():
+        logger.info(
+            f"While waiting to process {resource.kind} {resource.namespace}/{resource.name}, the resource was removed from the cluster"
+        )
+    elif isinstance(e, helper.NotLeaderError):
+        logger.warning(
+            f"Not processing {resource.kind} {resource.namespace}/{resource.name}: this replica is no longer the leader"
+        )
+    else:
+        logger.exception(
+            f"Failed to process {resource.kind} {resource.namespace}/{resource.name}: {e}"
+        )
+    return False
+
+
 def autoscale_resource(
     resource: NamespacedAPIObject,
     upscale_period: str,
@@ -1149,224 +1928,200 @@ def autoscale_resource(
     deployment_time_annotation: Optional[str] = None,
     enable_events: bool = False,
     matching_labels: FrozenSet[Pattern] = frozenset(),
+    minimal_patches: bool = False,
+    schedule_table: Optional[ScheduleTable] = None,
+    reconcile_state: Optional[ReconcileState] = None,
 ):
+    if schedule_table is None:
+        schedule_table = ScheduleTable(now)
     try:
-        exclude = (
-            namespace_excluded
-            or ignore_if_labels_dont_match(resource, matching_labels)
-            or ignore_resource(resource, now)
+        config = ScalingConfig(
+            upscale_period,
+            downscale_period,
+            default_uptime,
+            default_downtime,
+            forced_uptime,
+            forced_downtime,
+            upscale_target_only,
+            grace_period,
+            downtime_replicas,
+            is_downtime_replicas_percentage,
+            namespace_excluded,
+            deployment_time_annotation,
+            matching_labels,
         )
-        original_replicas, is_original_replicas_percentage = (
-            get_annotation_value_as_int(resource, ORIGINAL_REPLICAS_ANNOTATION)
+        if reconcile_state is not None and reconcile_state.should_skip(
+            resource, config, now
+        ):
+            return
+        with track_transitions() as transitions:
+            decision = decide(resource, now, config, schedule_table)
+        if transitions.next_transition is not None:
+            record_transition(transitions.next_transition)
+        apply_decision(
+            decision,
+            resource,
+            kind,
+            dry_run,
+            enable_events=enable_events,
+            minimal_patches=minimal_patches,
         )
+        if reconcile_state is not None:
+            if decision.operation in (EXCLUDED, NO_CHANGE):
+                reconcile_state.record(resource, config, transitions.next_transition)
+            else:
+                reconcile_state.forget(resource)
+    except Exception as e:
+        if reconcile_state is not None:
+            reconcile_state.forget(resource)
+        if should_retry_on_conflict(e, resource, max_retries_on_conflict):
+            max_retries_on_conflict = max_retries_on_conflict - 1
+            refreshed_resource = get_resource(
+                kind, api, resource.namespace, resource.name
+            )
+            if refreshed_resource is not None:
+                autoscale_resource(
+                    refreshed_resource,
+                    upscale_period,
+                    downscale_period,
+                    default_uptime,
+                    default_downtime,
+                    forced_uptime,
+                    forced_downtime,
+                    upscale_target_only,
+                    max_retries_on_conflict,
+                    api,
+                    kind,
+                    dry_run,
+                    now,
+                    grace_period,
+                    downtime_replicas,
+                    is_downtime_replicas_percentage,
+                    namespace_excluded=namespace_excluded,
+                    deployment_time_annotation=deployment_time_annotation,
+                    enable_events=enable_events,
+                    matching_labels=matching_labels,
+                    minimal_patches=minimal_patches,
+                    schedule_table=schedule_table,
+                    reconcile_state=reconcile_state,
+                )
+            else:
+                logger.warning(
+                    f"Retry process failed for {resource.kind} {resource.namespace}/{resource.name} because the resource cannot be found, it may have been deleted from the cluster"
+                )
 
-        (
-            downtime_replicas_from_annotation,
-            is_downtime_replicas_from_annotation_percentage,
-        ) = get_annotation_value_as_positive_int(resource, DOWNTIME_REPLICAS_ANNOTATION)
-
-        if downtime_replicas_from_annotation is not None:
-            downtime_replicas = downtime_replicas_from_annotation
 
-        if is_downtime_replicas_from_annotation_percentage is not None:
-            is_downtime_replicas_percentage = (
-                is_downtime_replicas_from_annotation_percentage
-            )
+def get_namespace_batches(
+    api: HTTPClient,
+    kind: NamespacedAPIObject,
+    namespace: FrozenSet[str],
+    namespace_to_namespace_obj,
+    exclude_namespaces: FrozenSet[Pattern],
+    exclude_names: FrozenSet[str],
+    matching_labels: FrozenSet[Pattern],
+    namespace_contexts: Union[NamespaceContextTable, Dict[str, NamespaceContext]],
+    informer_cache=None,
+) -> List[Tuple[List[NamespacedAPIObject], NamespaceContext]]:
+    """
+    List the resources of a kind and group the ones to process by namespace, together with the namespace context.
+
+    namespace_contexts can also be a dict of the contexts computed beforehand, e.g. by the parent of a worker process.
+    """
+    namespace_batches = []
+    for page_batches in iter_namespace_batches(
+        api,
+        kind,
+        namespace,
+        namespace_to_namespace_obj,
+        exclude_namespaces,
+        exclude_names,
+        matching_labels,
+        namespace_contexts,
+        informer_cache,
+    ):
+        namespace_batches += page_batches
+    return namespace_batches
 
-        exclude_condition = define_scope(
-            exclude, original_replicas, upscale_target_only
-        )
 
-        if exclude_condition:
-            logger.debug(
-                f"{resource.kind} {resource.namespace}/{resource.name} was excluded"
-            )
-        else:
-            ignore = False
-            is_uptime = True
+def iter_namespace_batches(
+    api: HTTPClient,
+    kind: NamespacedAPIObject,
+    namespace: FrozenSet[str],
+    namespace_to_namespace_obj,
+    exclude_namespaces: FrozenSet[Pattern],
+    exclude_names: FrozenSet[str],
+    matching_labels: FrozenSet[Pattern],
+    namespace_contexts: Union[NamespaceContextTable, Dict[str, NamespaceContext]],
+    informer_cache=None,
+) -> Iterator[List[Tuple[List[NamespacedAPIObject], NamespaceContext]]]:
+    """
+    Yield the namespace batches of get_namespace_batches page by page, the next page is listed once one is processed.
+
+    A namespace spanning two pages comes in two batches, one per page.
+    """
+    pages, exclude_namespaces = get_resource_pages(
+        kind, api, namespace, exclude_namespaces, informer_cache
+    )
+    namespace_matcher = compile_namespace_matcher(exclude_namespaces)
 
-            upscale_period = resource.annotations.get(
-                UPSCALE_PERIOD_ANNOTATION, upscale_period
-            )
-            downscale_period = resource.annotations.get(
-                DOWNSCALE_PERIOD_ANNOTATION, downscale_period
-            )
-            if forced_uptime or (exclude and original_replicas):
-                uptime = "forced"
-                downtime = "ignored"
-                is_uptime = True
-            elif forced_downtime and not (exclude and original_replicas):
-                uptime = "ignored"
-                downtime = "forced"
-                is_uptime = False
-            elif upscale_period != "never" or downscale_period != "never":
-                uptime = upscale_period
-                downtime = downscale_period
-                if matches_time_spec(now, uptime) and matches_time_spec(now, downtime):
-                    logger.debug("Upscale and downscale periods overlap, do nothing")
-                    ignore = True
-                elif matches_time_spec(now, uptime):
-                    is_uptime = True
-                elif matches_time_spec(now, downtime):
-                    is_uptime = False
-                else:
-                    ignore = True
-                logger.debug(
-                    f"Periods checked: upscale={upscale_period}, downscale={downscale_period}, ignore={ignore}, is_uptime={is_uptime}"
+    page_iterator = iter(pages)
+    while True:
+        resources_by_namespace = collections.defaultdict(list)
+        try:
+            page = next(page_iterator, None)
+            if page is None:
+                return
+            for resource in page:
+                if resource.name in exclude_names:
+                    logger.debug(
+                        f"{resource.kind} {resource.namespace}/{resource.name} was excluded (name matches exclusion list)"
+                    )
+                    continue
+                if resource.kind == "Job" and "ownerReferences" in resource.metadata:
+                    logger.debug(
+                        f"{resource.kind} {resource.namespace}/{resource.name} was excluded (Job with ownerReferences)"
+                    )
+                    continue
+                resources_by_namespace[resource.namespace].append(resource)
+        except requests.HTTPError as e:
+            if e.response.status_code == 404:
+                logger.debug(f"No {kind.endpoint} found (404)")
+            elif e.response.status_code == 403:
+                logger.error(
+                    f"Not authorized to perform a cluster wide query to retrieve {kind.endpoint} check your RBAC settings (403)"
                 )
             else:
-                uptime = resource.annotations.get(UPTIME_ANNOTATION, default_uptime)
-                downtime = resource.annotations.get(
-                    DOWNTIME_ANNOTATION, default_downtime
-                )
-                is_uptime = matches_time_spec(now, uptime) and not matches_time_spec(
-                    now, downtime
-                )
-
-            replicas, replicas_is_percentage = get_replicas(
-                resource, original_replicas, uptime
-            )
-            update_needed = False
+                raise e
+            return
 
-            if (
-                not ignore
-                and is_uptime
-                and replicas == downtime_replicas
-                and original_replicas
-                and (original_replicas > 0 or original_replicas == -1)
-            ):
-                try:
-                    scale_up(
-                        resource,
-                        replicas,
-                        replicas_is_percentage,
-                        original_replicas,
-                        is_original_replicas_percentage,
-                        uptime,
-                        downtime,
-                        dry_run=dry_run,
-                        enable_events=enable_events,
-                    )
-                    update_needed = True
-                except ValueError:
-                    update_needed = False
-            elif (
-                not ignore
-                and is_uptime
-                and original_replicas
-                and (original_replicas > 0 or original_replicas == -1)
-                and replicas == original_replicas
-                and replicas != downtime_replicas
-            ):
-                # Resource is already at its original replica count (e.g., restored
-                # externally while the annotation was still present). Clear the stale
-                # annotation so the downscaler does not get confused on the next cycle.
-                logger.info(
-                    f"{resource.kind} {resource.namespace}/{resource.name} already at original replicas "
-                    f"({original_replicas}), clearing stale {ORIGINAL_REPLICAS_ANNOTATION} annotation"
+        namespace_batches = []
+        for current_namespace, resources in sorted(resources_by_namespace.items()):
+            if namespace_matcher.matches(current_namespace):
+                logger.debug(
+                    f"Namespace {current_namespace} was excluded (exclusion list regex matches)"
                 )
-                resource.annotations[ORIGINAL_REPLICAS_ANNOTATION] = None
-                update_needed = True
-            elif (
-                not ignore
-                and not is_uptime
-                and (replicas > 0 and replicas > downtime_replicas or replicas == -1)
-            ):
-                if within_grace_period(
-                    resource, grace_period, now, deployment_time_annotation
-                ):
-                    logger.info(
-                        f"{resource.kind} {resource.namespace}/{resource.name} within grace period ({grace_period}s), not scaling down (yet)"
-                    )
-                else:
-                    try:
-                        scale_down(
-                            resource,
-                            replicas,
-                            replicas_is_percentage,
-                            downtime_replicas,
-                            is_downtime_replicas_percentage,
-                            uptime,
-                            downtime,
-                            dry_run=dry_run,
-                            enable_events=enable_events,
-                        )
-                        update_needed = True
-                    except ValueError:
-                        update_needed = False
+                continue
 
-            if update_needed:
-                if dry_run:
-                    logger.info(
-                        f"**DRY-RUN**: would update {resource.kind} {resource.namespace}/{resource.name}"
-                    )
-                else:
-                    helper.call_with_exponential_backoff(
-                        lambda: resource.update(),
-                        context_msg=f"patching {kind.endpoint} {resource.namespace}/{resource.name}",
-                    )
-    except Exception as e:
-        if (
-            isinstance(e, HTTPError)
-            and "the object has been modified" in str(e).lower()
-        ):
-            logger.warning(
-                f"Unable to process {resource.kind} {resource.namespace}/{resource.name} because it was recently modified"
+            logger.debug(
+                f"Processing {len(resources)} {kind.endpoint} in namespace {current_namespace}.."
             )
-            if max_retries_on_conflict > 0:
-                logger.info(
-                    f"Retrying processing {resource.kind} {resource.namespace}/{resource.name} (Remaining Retries: {max_retries_on_conflict})"
-                )
-                max_retries_on_conflict = max_retries_on_conflict - 1
-                refreshed_resource = get_resource(
-                    kind, api, resource.namespace, resource.name
+
+            # Override defaults with (optional) annotations from Namespace
+            if isinstance(namespace_contexts, NamespaceContextTable):
+                context = namespace_contexts.context_for(
+                    current_namespace, namespace_to_namespace_obj[current_namespace]
                 )
-                if refreshed_resource is not None:
-                    autoscale_resource(
-                        refreshed_resource,
-                        upscale_period,
-                        downscale_period,
-                        default_uptime,
-                        default_downtime,
-                        forced_uptime,
-                        forced_downtime,
-                        upscale_target_only,
-                        max_retries_on_conflict,
-                        api,
-                        kind,
-                        dry_run,
-                        now,
-                        grace_period,
-                        downtime_replicas,
-                        is_downtime_replicas_percentage,
-                        namespace_excluded=namespace_excluded,
-                        deployment_time_annotation=deployment_time_annotation,
-                        enable_events=enable_events,
-                        matching_labels=matching_labels,
-                    )
-                else:
-                    logger.warning(
-                        f"Retry process failed for {resource.kind} {resource.namespace}/{resource.name} because the resource cannot be found, it may have been deleted from the cluster"
-                    )
             else:
-                logger.warning(
-                    f"Will retry processing {resource.kind} {resource.namespace}/{resource.name} in the next iteration, unless the --once argument is specified"
-                )
-        elif isinstance(e, HTTPError) and "not found" in str(e).lower():
-            logger.info(
-                f"While waiting to process {resource.kind} {resource.namespace}/{resource.name}, the resource was removed from the cluster"
-            )
-        else:
-            logger.exception(
-                f"Failed to process {resource.kind} {resource.namespace}/{resource.name}: {e}"
-            )
+                context = namespace_contexts[current_namespace]
+            namespace_batches.append((resources, context))
+        yield namespace_batches
 
 
 def autoscale_resources(
     api: HTTPClient,
     kind: NamespacedAPIObject,
     namespace: FrozenSet[str],
-    namespace_to_namespace_obj: dict[str, Any],
+    namespace_to_namespace_obj: Dict[str, Any],
     exclude_namespaces: FrozenSet[Pattern],
     exclude_names: FrozenSet[str],
     matching_labels: FrozenSet[Pattern],
@@ -1385,117 +2140,47 @@ def autoscale_resources(
     is_downtime_replicas_percentage: bool,
     deployment_time_annotation: Optional[str] = None,
     enable_events: bool = False,
+    informer_cache=None,
+    workers: int = 1,
+    worker_stats: Optional[WorkerStats] = None,
+    minimal_patches: bool = False,
+    schedule_table: Optional[ScheduleTable] = None,
+    namespace_contexts: Optional[NamespaceContextTable] = None,
+    reconcile_state: Optional[ReconcileState] = None,
 ):
-    resources_by_namespace = collections.defaultdict(list)
-    resources, exclude_namespaces = get_resources(
-        kind, api, namespace, exclude_namespaces
-    )
-
-    try:
-        for resource in resources:
-            if resource.name in exclude_names:
-                logger.debug(
-                    f"{resource.kind} {resource.namespace}/{resource.name} was excluded (name matches exclusion list)"
-                )
-                continue
-            if resource.kind == "Job" and "ownerReferences" in resource.metadata:
-                logger.debug(
-                    f"{resource.kind} {resource.namespace}/{resource.name} was excluded (Job with ownerReferences)"
-                )
-                continue
-            resources_by_namespace[resource.namespace].append(resource)
-    except requests.HTTPError as e:
-        if e.response.status_code == 404:
-            logger.debug(f"No {kind.endpoint} found (404)")
-        elif e.response.status_code == 403:
-            logger.error(
-                f"Not authorized to perform a cluster wide query to retrieve {kind.endpoint} check your RBAC settings (403)"
-            )
-        else:
-            raise e
-
-    for current_namespace, resources in sorted(resources_by_namespace.items()):
-        if any(
-            [pattern.fullmatch(current_namespace) for pattern in exclude_namespaces]
-        ):
-            logger.debug(
-                f"Namespace {current_namespace} was excluded (exclusion list regex matches)"
-            )
-            continue
-
-        logger.debug(
-            f"Processing {len(resources)} {kind.endpoint} in namespace {current_namespace}.."
+    if schedule_table is None:
+        schedule_table = ScheduleTable(now)
+    if namespace_contexts is None:
+        namespace_contexts = NamespaceContextTable(
+            now,
+            upscale_period,
+            downscale_period,
+            default_uptime,
+            default_downtime,
+            forced_uptime,
+            downtime_replicas,
+            is_downtime_replicas_percentage,
         )
 
-        # Override defaults with (optional) annotations from Namespace
-        namespace_obj = namespace_to_namespace_obj[current_namespace]
-
-        excluded = ignore_resource(namespace_obj, now)
-
-        default_uptime_for_namespace = namespace_obj.annotations.get(
-            UPTIME_ANNOTATION, default_uptime
-        )
-        default_downtime_for_namespace = namespace_obj.annotations.get(
-            DOWNTIME_ANNOTATION, default_downtime
-        )
-        (
-            default_downtime_replicas_for_namespace,
-            is_default_downtime_replicas_for_namespace_percentage,
-        ) = get_annotation_value_as_positive_int(
-            namespace_obj, DOWNTIME_REPLICAS_ANNOTATION
-        )
-
-        if default_downtime_replicas_for_namespace is None:
-            default_downtime_replicas_for_namespace = downtime_replicas
-
-        if is_default_downtime_replicas_for_namespace_percentage is None:
-            is_default_downtime_replicas_for_namespace_percentage = (
-                is_downtime_replicas_percentage
-            )
-
-        upscale_period_for_namespace = namespace_obj.annotations.get(
-            UPSCALE_PERIOD_ANNOTATION, upscale_period
-        )
-        downscale_period_for_namespace = namespace_obj.annotations.get(
-            DOWNSCALE_PERIOD_ANNOTATION, downscale_period
-        )
-        forced_uptime_value_for_namespace = str(
-            namespace_obj.annotations.get(FORCE_UPTIME_ANNOTATION, forced_uptime)
-        )
-        forced_downtime_value_for_namespace = str(
-            namespace_obj.annotations.get(FORCE_DOWNTIME_ANNOTATION, False)
-        )
-        if forced_uptime_value_for_namespace.lower() == "true":
-            forced_uptime_for_namespace = True
-        elif forced_uptime_value_for_namespace.lower() == "false":
-            forced_uptime_for_namespace = False
-        elif forced_uptime_value_for_namespace:
-            forced_uptime_for_namespace = matches_time_spec(
-                now, forced_uptime_value_for_namespace
-            )
-        else:
-            forced_uptime_for_namespace = False
-
-        if forced_downtime_value_for_namespace.lower() == "true":
-            forced_downtime_for_namespace = True
-        elif forced_downtime_value_for_namespace.lower() == "false":
-            forced_downtime_for_namespace = False
-        elif forced_downtime_value_for_namespace:
-            forced_downtime_for_namespace = matches_time_spec(
-                now, forced_downtime_value_for_namespace
-            )
-        else:
-            forced_downtime_for_namespace = False
-
-        for resource in resources:
+    def autoscale_namespace(batch):
+        resources, context = batch
+        started = time.monotonic()
+        # resources of the same namespace are always processed in order by a single worker
+        for index, resource in enumerate(resources):
+            circuit_breaker = helper.CIRCUIT_BREAKER
+            if circuit_breaker is not None and circuit_breaker.is_open:
+                circuit_breaker.defer(len(resources) - index)
+                break
+            if helper.leadership_lost():
+                break
             autoscale_resource(
                 resource,
-                upscale_period_for_namespace,
-                downscale_period_for_namespace,
-                default_uptime_for_namespace,
-                default_downtime_for_namespace,
-                forced_uptime_for_namespace,
-                forced_downtime_for_namespace,
+                context.upscale_period,
+                context.downscale_period,
+                context.uptime,
+                context.downtime,
+                context.forced_uptime,
+                context.forced_downtime,
                 upscale_target_only,
                 max_retries_on_conflict,
                 api,
@@ -1503,13 +2188,37 @@ def autoscale_resources(
                 dry_run,
                 now,
                 grace_period,
-                default_downtime_replicas_for_namespace,
-                is_default_downtime_replicas_for_namespace_percentage,
-                namespace_excluded=excluded,
+                context.downtime_replicas,
+                context.is_downtime_replicas_percentage,
+                namespace_excluded=context.excluded,
                 deployment_time_annotation=deployment_time_annotation,
                 enable_events=enable_events,
                 matching_labels=matching_labels,
-            )
+                minimal_patches=minimal_patches,
+                schedule_table=schedule_table,
+                reconcile_state=reconcile_state,
+            )
+        if worker_stats is not None:
+            worker_stats.record(len(resources), time.monotonic() - started)
+
+    # with --list-page-size the batches come page by page, a page is processed before the next one is listed
+    for namespace_batches in iter_namespace_batches(
+        api,
+        kind,
+        namespace,
+        namespace_to_namespace_obj,
+        exclude_namespaces,
+        exclude_names,
+        matching_labels,
+        namespace_contexts,
+        informer_cache,
+    ):
+        map_bounded(
+            autoscale_namespace,
+            namespace_batches,
+            workers,
+            thread_name_prefix="worker",
+        )
 
 
 def apply_kubedownscalerjobsconstraint_crd(excluded_names, matching_labels, api):
@@ -1529,6 +2238,8 @@ def apply_kubedownscalerjobsconstraint_crd(excluded_names, matching_labels, api)
             helper.call_with_exponential_backoff(
                 lambda: ConstraintTemplate(api, obj).update(obj),
                 context_msg="patching kubedownscalerjobsconstraint.constraints.gatekeeper.sh CRD",
+                verb="update",
+                lane=LANE_SCALE,
             )
             logger.debug(
                 "kubedownscalerjobsconstraint.constraints.gatekeeper.sh CRD updated"
@@ -1537,6 +2248,8 @@ def apply_kubedownscalerjobsconstraint_crd(excluded_names, matching_labels, api)
         helper.call_with_exponential_backoff(
             lambda: ConstraintTemplate(api, obj).create(),
             context_msg="creating kubedownscalerjobsconstraint.constraints.gatekeeper.sh CRD",
+            verb="create",
+            lane=LANE_SCALE,
         )
         logger.debug(
             "kubedownscalerjobsconstraint.constraints.gatekeeper.sh CRD created"
@@ -1562,19 +2275,30 @@ def gatekeeper_constraint_template_crd_exist(api) -> bool:
 
 
 def gatekeeper_healthy(api) -> bool:
-    gatekeeper_audit = (
-        Deployment.objects(api)
+    gatekeeper_audit = helper.call_with_exponential_backoff(
+        lambda: Deployment.objects(api)
         .filter(namespace="gatekeeper-system")
-        .get_or_none(name="gatekeeper-audit")
+        .get_or_none(name="gatekeeper-audit"),
+        context_msg="health check of gatekeeper-system/gatekeeper-audit",
+        verb="get",
+        lane=LANE_BACKGROUND,
     )
-    gatekeeper_controller_manager = (
-        Deployment.objects(api)
+    gatekeeper_controller_manager = helper.call_with_exponential_backoff(
+        lambda: Deployment.objects(api)
         .filter(namespace="gatekeeper-system")
-        .get_or_none(name="gatekeeper-controller-manager")
+        .get_or_none(name="gatekeeper-controller-manager"),
+        context_msg="health check of gatekeeper-system/gatekeeper-controller-manager",
+        verb="get",
+        lane=LANE_BACKGROUND,
     )
 
-    kubedownscalerjobsconstraint = CustomResourceDefinition.objects(api).get_or_none(
-        name="kubedownscalerjobsconstraint.constraints.gatekeeper.sh"
+    kubedownscalerjobsconstraint = helper.call_with_exponential_backoff(
+        lambda: CustomResourceDefinition.objects(api).get_or_none(
+            name="kubedownscalerjobsconstraint.constraints.gatekeeper.sh"
+        ),
+        context_msg="health check of kubedownscalerjobsconstraint.constraints.gatekeeper.sh CRD",
+        verb="get",
+        lane=LANE_BACKGROUND,
     )
 
     if gatekeeper_audit is None or gatekeeper_controller_manager is None:
@@ -1607,20 +2331,31 @@ def gatekeeper_healthy(api) -> bool:
 
 
 def kyverno_healthy(api):
-    kyverno_admission_controller = (
-        Deployment.objects(api)
+    kyverno_admission_controller = helper.call_with_exponential_backoff(
+        lambda: Deployment.objects(api)
         .filter(namespace="kyverno")
         .get_or_none(name="kyverno-admission-controller")
-        .obj
+        .obj,
+        context_msg="health check of kyverno/kyverno-admission-controller",
+        verb="get",
+        lane=LANE_BACKGROUND,
     )
-    kyverno_background_controller = (
-        Deployment.objects(api)
+    kyverno_background_controller = helper.call_with_exponential_backoff(
+        lambda: Deployment.objects(api)
         .filter(namespace="kyverno")
         .get_or_none(name="kyverno-background-controller")
-        .obj
+        .obj,
+        context_msg="health check of kyverno/kyverno-background-controller",
+        verb="get",
+        lane=LANE_BACKGROUND,
     )
-    kyverno_policy_crd = CustomResourceDefinition.objects(api).get_or_none(
-        name="policies.kyverno.io"
+    kyverno_policy_crd = helper.call_with_exponential_backoff(
+        lambda: CustomResourceDefinition.objects(api).get_or_none(
+            name="policies.kyverno.io"
+        ),
+        context_msg="health check of policies.kyverno.io CRD",
+        verb="get",
+        lane=LANE_BACKGROUND,
     )
 
     if kyverno_admission_controller is None or kyverno_background_controller is None:
@@ -1653,7 +2388,7 @@ def kyverno_healthy(api):
 def autoscale_jobs(
     api,
     namespaces: FrozenSet[str],
-    namespace_to_namespace_obj: dict[str, Any],
+    namespace_to_namespace_obj: Dict[str, Any],
     exclude_namespaces: FrozenSet[Pattern],
     upscale_period: str,
     downscale_period: str,
@@ -1668,7 +2403,20 @@ def autoscale_jobs(
     exclude_names: FrozenSet[str],
     deployment_time_annotation: Optional[str] = None,
     enable_events: bool = False,
+    schedule_table: Optional[ScheduleTable] = None,
+    namespace_contexts: Optional[NamespaceContextTable] = None,
 ):
+    if schedule_table is None:
+        schedule_table = ScheduleTable(now)
+    if namespace_contexts is None:
+        namespace_contexts = NamespaceContextTable(
+            now,
+            upscale_period,
+            downscale_period,
+            default_uptime,
+            default_downtime,
+            forced_uptime,
+        )
     if admission_controller != "" and admission_controller in ADMISSION_CONTROLLERS:
         if (
             admission_controller == "gatekeeper"
@@ -1695,20 +2443,17 @@ def autoscale_jobs(
             logger.error("unable to scale jobs")
             return
 
-        if len(namespaces) >= 1:
-            namespaces = namespaces
-        else:
-            namespaces = frozenset(Namespace.objects(api).iterator())
+        if len(namespaces) == 0:
+            namespaces = frozenset(namespace_to_namespace_obj)
 
+        namespace_matcher = compile_namespace_matcher(exclude_namespaces)
         excluded_jobs = []
 
         for name in exclude_names:
             excluded_jobs.append(name)
 
         for current_namespace in namespaces:
-            if any(
-                [pattern.fullmatch(current_namespace) for pattern in exclude_namespaces]
-            ):
+            if namespace_matcher.matches(current_namespace):
                 logger.debug(
                     f"Namespace {current_namespace} was excluded from job scaling (exclusion list regex matches)"
                 )
@@ -1718,59 +2463,17 @@ def autoscale_jobs(
 
             # Override defaults with (optional) annotations from Namespace
             namespace_obj = namespace_to_namespace_obj[current_namespace]
-
-            excluded = ignore_resource(current_namespace, now)
-
-            default_uptime_for_namespace = namespace_obj.annotations.get(
-                UPTIME_ANNOTATION, default_uptime
-            )
-            default_downtime_for_namespace = namespace_obj.annotations.get(
-                DOWNTIME_ANNOTATION, default_downtime
-            )
-
-            upscale_period_for_namespace = namespace_obj.annotations.get(
-                UPSCALE_PERIOD_ANNOTATION, upscale_period
-            )
-            downscale_period_for_namespace = namespace_obj.annotations.get(
-                DOWNSCALE_PERIOD_ANNOTATION, downscale_period
-            )
-            forced_uptime_value_for_namespace = str(
-                namespace_obj.annotations.get(FORCE_UPTIME_ANNOTATION, forced_uptime)
-            )
-            forced_downtime_value_for_namespace = str(
-                namespace_obj.annotations.get(FORCE_DOWNTIME_ANNOTATION, False)
-            )
-            if forced_uptime_value_for_namespace.lower() == "true":
-                forced_uptime_for_namespace = True
-            elif forced_uptime_value_for_namespace.lower() == "false":
-                forced_uptime_for_namespace = False
-            elif forced_uptime_value_for_namespace:
-                forced_uptime_for_namespace = matches_time_spec(
-                    now, forced_uptime_value_for_namespace
-                )
-            else:
-                forced_uptime_for_namespace = False
-
-            if forced_downtime_value_for_namespace.lower() == "true":
-                forced_downtime_for_namespace = True
-            elif forced_downtime_value_for_namespace.lower() == "false":
-                forced_downtime_for_namespace = False
-            elif forced_downtime_value_for_namespace:
-                forced_downtime_for_namespace = matches_time_spec(
-                    now, forced_downtime_value_for_namespace
-                )
-            else:
-                forced_downtime_for_namespace = False
+            context = namespace_contexts.context_for(current_namespace, namespace_obj)
 
             autoscale_jobs_for_namespace(
                 api,
-                current_namespace,
-                upscale_period_for_namespace,
-                downscale_period_for_namespace,
-                default_uptime_for_namespace,
-                default_downtime_for_namespace,
-                forced_uptime_for_namespace,
-                forced_downtime_for_namespace,
+                namespace_obj,
+                context.upscale_period,
+                context.downscale_period,
+                context.uptime,
+                context.downtime,
+                context.forced_uptime,
+                context.forced_downtime,
                 matching_labels,
                 dry_run,
                 now,
@@ -1778,8 +2481,9 @@ def autoscale_jobs(
                 excluded_jobs,
                 admission_controller=admission_controller,
                 deployment_time_annotation=deployment_time_annotation,
-                namespace_excluded=excluded,
+                namespace_excluded=context.excluded,
                 enable_events=enable_events,
+                schedule_table=schedule_table,
             )
     else:
         if admission_controller == "":
@@ -1792,6 +2496,36 @@ def autoscale_jobs(
             )
 
 
+def get_shard_namespaces(
+    shards: StaticShards,
+    namespaces: FrozenSet[str],
+    namespace_to_namespace_obj: Dict[str, Any],
+    exclude_namespaces: FrozenSet[Pattern],
+) -> Tuple[FrozenSet[str], Dict[str, Any]]:
+    """
+    Restrict the namespaces in scope to the shard of this replica.
+
+    The shard is returned as a constrained set of namespaces, so resources and pods are only listed in the
+    namespaces of this replica. In cluster-wide mode the excluded namespaces are left out first, as constrained
+    listing does not apply --exclude-namespaces.
+    """
+    candidates = list(namespace_to_namespace_obj)
+    if not namespaces:
+        namespace_matcher = compile_namespace_matcher(exclude_namespaces)
+        candidates = [
+            namespace
+            for namespace in candidates
+            if not namespace_matcher.matches(namespace)
+        ]
+    owned = shards.owned(candidates)
+    logger.info(
+        f"Sharding: {shards.status()}, this replica owns {len(owned)} of {len(candidates)} namespaces"
+    )
+    return frozenset(owned), {
+        namespace: namespace_to_namespace_obj[namespace] for namespace in owned
+    }
+
+
 def scale(
     namespaces: FrozenSet[str],
     upscale_period: str,
@@ -1813,22 +2547,71 @@ def scale(
     deployment_time_annotation: Optional[str] = None,
     enable_events: bool = False,
     matching_labels: FrozenSet[Pattern] = frozenset(),
+    informer_cache=None,
+    api_provider: Optional[helper.KubeApiProvider] = None,
+    workers: int = 1,
+    minimal_patches: bool = False,
+    reconcile_state: Optional[ReconcileState] = None,
+    shard_pool: Optional["ProcessShards"] = None,
+    shards: Optional[StaticShards] = None,
 ):
-    api = helper.get_kube_api(api_server_timeout)
+    if api_provider is not None:
+        api = api_provider.get()
+    else:
+        api = helper.get_kube_api(api_server_timeout)
+    worker_stats = WorkerStats() if workers > 1 else None
+    helper.reset_overload_protection()
 
     now = datetime.datetime.now(datetime.timezone.utc)
+    schedule_table = ScheduleTable(now)
     namespace_to_namespace_obj = get_namespace_to_namespace_obj(api, namespaces)
-    forced_uptime = pods_force_uptime(api, namespaces)
+    if not namespaces:
+        prune_namespace_policies(namespace_to_namespace_obj)
+    if shards is not None:
+        namespaces, namespace_to_namespace_obj = get_shard_namespaces(
+            shards, namespaces, namespace_to_namespace_obj, exclude_namespaces
+        )
+        if not namespaces:
+            return
+    if reconcile_state is not None:
+        reconcile_state.start_cycle(now)
+    if pods_force_uptime_needed(namespaces, namespace_to_namespace_obj):
+        forced_uptime = pods_force_uptime(api, namespaces)
+    else:
+        logger.debug(
+            "All namespaces in scope have a force uptime annotation, skipping the pods query"
+        )
+        forced_uptime = False
+    namespace_contexts = NamespaceContextTable(
+        now,
+        upscale_period,
+        downscale_period,
+        default_uptime,
+        default_downtime,
+        forced_uptime,
+        downtime_replicas,
+        is_downtime_replicas_percentage,
+    )
 
+    process_kinds = []
     for clazz in RESOURCE_CLASSES:
         plural = clazz.endpoint
-        if plural in include_resources:
+        if plural in include_resources and helper.circuit_open():
+            logger.warning(
+                f"Deferring {plural} to the next cycle, circuit breaker is open"
+            )
+        elif plural in include_resources and helper.leadership_lost():
+            logger.warning(f"Skipping {plural}, this replica is no longer the leader")
+        elif plural in include_resources:
             if (
                 scale_jobs_without_admission_controller(
                     plural, admission_controller, constrained_downscaler
                 )
                 or plural != "jobs"
             ):
+                if shard_pool is not None:
+                    process_kinds.append(plural)
+                    continue
                 autoscale_resources(
                     api,
                     clazz,
@@ -1852,6 +2635,13 @@ def scale(
                     is_downtime_replicas_percentage,
                     deployment_time_annotation,
                     enable_events,
+                    informer_cache=informer_cache,
+                    workers=workers,
+                    worker_stats=worker_stats,
+                    minimal_patches=minimal_patches,
+                    schedule_table=schedule_table,
+                    namespace_contexts=namespace_contexts,
+                    reconcile_state=reconcile_state,
                 )
             else:
                 autoscale_jobs(
@@ -1872,4 +2662,48 @@ def scale(
                     exclude_deployments,
                     deployment_time_annotation,
                     enable_events,
+                    schedule_table=schedule_table,
+                    namespace_contexts=namespace_contexts,
                 )
+
+    if process_kinds:
+        assert shard_pool is not None
+        namespace_matcher = compile_namespace_matcher(exclude_namespaces)
+        shard_pool.autoscale(
+            now,
+            process_kinds,
+            {
+                namespace: namespace_contexts.context_for(namespace, namespace_obj)
+                for namespace, namespace_obj in namespace_to_namespace_obj.items()
+                if not namespace_matcher.matches(namespace)
+            },
+            exclude_deployments,
+            matching_labels,
+            upscale_target_only,
+            grace_period,
+            deployment_time_annotation,
+            dry_run,
+            enable_events,
+            minimal_patches,
+            workers,
+            max_retries_on_conflict,
+            cluster_wide=not namespaces,
+        )
+
+    logger.debug(f"Schedule table in this cycle: {schedule_table.summary()}")
+    logger.debug(f"Namespace contexts in this cycle: {namespace_contexts.summary()}")
+    if reconcile_state is not None:
+        if not helper.circuit_open():
+            reconcile_state.end_cycle()
+        logger.info(f"Resources in this cycle: {reconcile_state.summary()}")
+    circuit_breaker = helper.CIRCUIT_BREAKER
+    if circuit_breaker is not None and circuit_breaker.is_open:
+        logger.warning(
+            f"Circuit breaker opened after {circuit_breaker.reason}, stopped sending events and health checks and deferred {circuit_breaker.deferred} resources to the next cycle"
+        )
+    if helper.RETRY_BUDGET is not None and helper.RETRY_BUDGET.denied:
+        logger.warning(
+            f"Retry budget exhausted in this cycle: {helper.RETRY_BUDGET.retries} retries after {helper.RETRY_BUDGET.successes} successful calls, {helper.RETRY_BUDGET.denied} retries denied"
+        )
+    if worker_stats is not None:
+        logger.info(f"Worker throughput in this cycle: {worker_stats.summary()}")
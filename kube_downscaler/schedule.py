@@ -0,0 +1,80 @@
+import datetime
+import logging
+import threading
+from typing import Dict
+from typing import Optional
+from typing import Tuple
+
+from kube_downscaler.helper import matches_time_spec
+from kube_downscaler.timespec import record_transition
+from kube_downscaler.timespec import track_transitions
+
+logger = logging.getLogger(__name__)
+
+
+def evaluate_schedule(
+    now: datetime.datetime,
+    uptime: str,
+    downtime: str,
+    upscale_period: str,
+    downscale_period: str,
+) -> Tuple[bool, bool]:
+    """Return (is_uptime, ignore) for a resource with the given effective schedules."""
+    if upscale_period != "never" or downscale_period != "never":
+        upscale_matches = matches_time_spec(now, upscale_period)
+        downscale_matches = matches_time_spec(now, downscale_period)
+        if upscale_matches and downscale_matches:
+            logger.debug("Upscale and downscale periods overlap, do nothing")
+            return True, True
+        elif upscale_matches:
+            return True, False
+        elif downscale_matches:
+            return False, False
+        return True, True
+    is_uptime = matches_time_spec(now, uptime) and not matches_time_spec(now, downtime)
+    return is_uptime, False
+
+
+class ScheduleTable:
+    """
+    Per-cycle table of schedule decisions, shared by all kinds and namespaces.
+
+    Each distinct (uptime, downtime, upscale_period, downscale_period) combination is evaluated once per cycle.
+    Invalid time specs are not cached, so every resource using them still reports the error. The next transition of
+    a combination is reported on every lookup, so the caller can tell when its decision may change.
+    """
+
+    def __init__(self, now: datetime.datetime):
+        self.now = now
+        self.lock = threading.Lock()
+        self.decisions: Dict[
+            Tuple[str, str, str, str],
+            Tuple[Tuple[bool, bool], Optional[datetime.datetime]],
+        ] = {}
+        self.hits = 0
+        self.misses = 0
+
+    def evaluate(
+        self, uptime: str, downtime: str, upscale_period: str, downscale_period: str
+    ) -> Tuple[bool, bool]:
+        key = (uptime, downtime, upscale_period, downscale_period)
+        with self.lock:
+            cached = self.decisions.get(key)
+            if cached is not None:
+                self.hits += 1
+            else:
+                self.misses += 1
+        if cached is None:
+            with track_transitions() as transitions:
+                decision = evaluate_schedule(self.now, *key)
+            cached = (decision, transitions.next_transition)
+            with self.lock:
+                self.decisions[key] = cached
+        decision, next_transition = cached
+        if next_transition is not None:
+            record_transition(next_transition)
+        return decision
+
+    def summary(self) -> str:
+        with self.lock:
+            return f"{len(self.decisions)} unique schedules, {self.hits} hits, {self.misses} misses"
@@ -0,0 +1,241 @@
+import datetime
+import hashlib
+import logging
+import math
+import os
+import socket
+import threading
+import time
+from typing import Iterable
+from typing import List
+from typing import NamedTuple
+from typing import Optional
+
+import requests
+from pykube.exceptions import HTTPError
+from pykube.exceptions import PyKubeError
+
+from kube_downscaler.events import micro_time
+from kube_downscaler.resources.lease import Lease
+
+logger = logging.getLogger(__name__)
+
+SHARD_GROUP_LABEL = "downscaler/shard-group"
+
+
+class ShardingConfig(NamedTuple):
+    """Static shards (shard_index out of shard_count) or, when dynamic, shards over the live replicas of a group."""
+
+    shard_index: int = 0
+    shard_count: int = 1
+    dynamic: bool = False
+    group: str = "py-kube-downscaler"
+    namespace: str = "default"
+    identity: str = ""
+    lease_duration: float = 15.0
+
+
+def shard_weight(member: str, namespace: str) -> int:
+    digest = hashlib.blake2b(f"{member}/{namespace}".encode(), digest_size=8).digest()
+    return int.from_bytes(digest, "big")
+
+
+def shard_owner(namespace: str, members: Iterable[str]) -> str:
+    """
+    Return the member owning namespace, by rendezvous (highest random weight) hashing.
+
+    When a member leaves only its own namespaces move, spread over the remaining members, and a new member takes
+    an even share from all the others, so replicas joining or leaving cause the minimal movement.
+    """
+    return max(members, key=lambda member: shard_weight(member, namespace))
+
+
+def default_shard_identity() -> str:
+    """Pod name of this replica, a pod restarted with the same name (e.g. of a StatefulSet) keeps its shard."""
+    return os.getenv("POD_NAME") or socket.gethostname()
+
+
+class StaticShards:
+    """Namespaces of shard index out of count, for replicas configured with --shard-index and --shard-count."""
+
+    def __init__(self, index: int, count: int):
+        self.identity = str(index)
+        self.count = count
+
+    def start(self):
+        pass
+
+    def stop(self):
+        pass
+
+    def members(self) -> List[str]:
+        return [str(index) for index in range(self.count)]
+
+    def wait_for_change(self, timeout: float) -> bool:
+        """Sleep for timeout seconds, return True if the members changed meanwhile (never for static shards)."""
+        time.sleep(timeout)
+        return False
+
+    def owned(self, namespaces: Iterable[str]) -> List[str]:
+        members = self.members()
+        return [
+            namespace
+            for namespace in namespaces
+            if shard_owner(namespace, members) == self.identity
+        ]
+
+    def status(self) -> str:
+        return f"shard {self.identity} of {', '.join(self.members())}"
+
+
+class PeerShards(StaticShards):
+    """
+    Shards over the replicas alive in a group, discovered through one Lease per replica.
+
+    Every replica renews its own Lease, labeled with the group, three times per lease_duration and lists the Leases
+    of the group to find its peers. A peer is alive until its renewTime is older than its leaseDurationSeconds.
+    The Lease of a replica shutting down is deleted, so its namespaces move to the others in the next cycle.
+    """
+
+    def __init__(self, api_provider, config: ShardingConfig):
+        super().__init__(0, 1)
+        # shared with the main loop: a client rebuilt after a credentials change is used from the next step on
+        self.api_provider = api_provider
+        self.config = config
+        self.identity = config.identity
+        self.lease_name = f"{config.group}-{config.identity}".lower()
+        self.renew_period = config.lease_duration / 3
+        self.lock = threading.Lock()
+        self.peers = [config.identity]
+        self.changed = threading.Event()
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def start(self):
+        # discover the peers before the first cycle
+        self.step()
+        self._thread = threading.Thread(
+            target=self.run, name="shard-peers", daemon=True
+        )
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+            try:
+                Lease(
+                    self.api_provider.get(),
+                    {
+                        "metadata": {
+                            "name": self.lease_name,
+                            "namespace": self.config.namespace,
+                        }
+                    },
+                ).delete()
+                logger.info(
+                    f"Deleted shard Lease {self.config.namespace}/{self.lease_name}"
+                )
+            except (PyKubeError, requests.RequestException) as e:
+                logger.warning(
+                    f"Failed to delete shard Lease {self.config.namespace}/{self.lease_name}: {e}"
+                )
+
+    def run(self):
+        while not self._stop.wait(self.renew_period):
+            self.step()
+
+    def members(self) -> List[str]:
+        with self.lock:
+            self.changed.clear()
+            return list(self.peers)
+
+    def wait_for_change(self, timeout: float) -> bool:
+        return self.changed.wait(timeout)
+
+    def step(self):
+        try:
+            api = self.api_provider.get()
+            self.renew(api)
+            peers = self.list_peers(api, datetime.datetime.now(datetime.timezone.utc))
+        except (PyKubeError, requests.RequestException) as e:
+            logger.warning(
+                f"Failed to renew the shard Lease or discover the peers of group {self.config.group}, keeping the last known peers: {e}"
+            )
+            return
+        with self.lock:
+            if peers == self.peers:
+                return
+            joined = sorted(set(peers) - set(self.peers))
+            left = sorted(set(self.peers) - set(peers))
+            self.peers = peers
+        logger.info(
+            f"Shard peers of group {self.config.group} changed to {len(peers)} replicas"
+            + (f", joined: {', '.join(joined)}" if joined else "")
+            + (f", left: {', '.join(left)}" if left else "")
+        )
+        self.changed.set()
+
+    def renew(self, api):
+        config = self.config
+        spec = {
+            "holderIdentity": config.identity,
+            "leaseDurationSeconds": int(math.ceil(config.lease_duration)),
+            "renewTime": micro_time(datetime.datetime.now(datetime.timezone.utc)),
+        }
+        lease = Lease(
+            api,
+            {
+                "apiVersion": Lease.version,
+                "kind": Lease.kind,
+                "metadata": {
+                    "name": self.lease_name,
+                    "namespace": config.namespace,
+                    "labels": {SHARD_GROUP_LABEL: config.group},
+                },
+                "spec": spec,
+            },
+        )
+        try:
+            lease.patch({"spec": spec})
+        except HTTPError as e:
+            if e.code != 404:
+                raise
+            lease.create()
+
+    def list_peers(self, api, now: datetime.datetime) -> List[str]:
+        peers = {self.identity}
+        for lease in Lease.objects(api, namespace=self.config.namespace).filter(
+            selector={SHARD_GROUP_LABEL: self.config.group}
+        ):
+            spec = lease.obj.get("spec") or {}
+            holder = spec.get("holderIdentity")
+            renew_time = parse_micro_time(spec.get("renewTime"))
+            if not holder or renew_time is None:
+                continue
+            if now - renew_time < datetime.timedelta(
+                seconds=spec.get("leaseDurationSeconds") or self.config.lease_duration
+            ):
+                peers.add(holder)
+        return sorted(peers)
+
+    def status(self) -> str:
+        with self.lock:
+            replicas = len(self.peers)
+        return (
+            f"shard {self.identity} of {replicas} replicas in group {self.config.group}"
+        )
+
+
+def parse_micro_time(value: Optional[str]) -> Optional[datetime.datetime]:
+    if not value:
+        return None
+    for time_format in ("%Y-%m-%dT%H:%M:%S.%fZ", "%Y-%m-%dT%H:%M:%SZ"):
+        try:
+            return datetime.datetime.strptime(value, time_format).replace(
+                tzinfo=datetime.timezone.utc
+            )
+        except ValueError:
+            continue
+    return None
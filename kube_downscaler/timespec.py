@@ -0,0 +1,268 @@
+import bisect
+import contextlib
+import contextvars
+import datetime
+import functools
+import re
+import threading
+from typing import Dict
+from typing import List
+from typing import NamedTuple
+from typing import Optional
+from typing import Tuple
+
+import pytz
+
+WEEKDAYS = ["MON", "TUE", "WED", "THU", "FRI", "SAT", "SUN"]
+
+TIME_SPEC_PATTERN = re.compile(
+    r"^([a-zA-Z]{3})-([a-zA-Z]{3}) (\d\d):(\d\d)-(\d\d):(\d\d) (?P<tz>[a-zA-Z/_]+)$"
+)
+TIME_SPEC_PATTERN_WO_TZ = re.compile(r".*(\d\d)$")
+TIME_SPEC_PATTERN_WO_WF = re.compile(
+    r"^(\d\d):(\d\d)-(\d\d):(\d\d) (?P<tz>[a-zA-Z/_]+)$"
+)
+_ISO_8601_TIME_SPEC_PATTERN = r"(\d{4}-\d{2}-\d{2}T\d{2}:\d{2}:\d{2}[-+]\d{2}:\d{2})"
+ABSOLUTE_TIME_SPEC_PATTERN = re.compile(
+    r"^{0}-{0}$".format(_ISO_8601_TIME_SPEC_PATTERN)
+)
+
+TIME_SPEC_CACHE_SIZE = 1024
+MINUTES_PER_DAY = 24 * 60
+MINUTES_PER_WEEK = 7 * MINUTES_PER_DAY
+
+
+class AbsoluteTimeRange(NamedTuple):
+    """A "2019-01-01T00:00:00+00:00-2019-01-02T12:34:56+00:00" range with both timestamps parsed."""
+
+    time_from: datetime.datetime
+    time_to: datetime.datetime
+
+
+class TimeSpec(NamedTuple):
+    """
+    Immutable, pre-parsed form of a time spec string, only doing arithmetic when matched.
+
+    Recurring ranges are compiled into one minute-of-week bitmap per time zone (bit weekday * 1440 + minute),
+    so a spec with many clauses is matched with a single bit lookup per zone.
+    """
+
+    spec: str
+    constant: Optional[bool]
+    bitmaps: Tuple[Tuple[pytz.BaseTzInfo, bytes], ...]
+    absolute_ranges: Tuple[AbsoluteTimeRange, ...]
+    # sorted minutes of the week at which each bitmap flips, in the same order as bitmaps
+    flips: Tuple[Tuple[int, ...], ...] = ()
+
+    def matches(self, time: datetime.datetime) -> bool:
+        if self.constant is not None:
+            return self.constant
+        for tz, bitmap in self.bitmaps:
+            # evaluated in the zone's local time, so DST shifts move the range with the wall clock
+            local_time = _local_time(time, tz)
+            minute_of_week = (
+                local_time.weekday() * MINUTES_PER_DAY
+                + local_time.hour * 60
+                + local_time.minute
+            )
+            if bitmap[minute_of_week >> 3] >> (minute_of_week & 7) & 1:
+                return True
+        for time_range in self.absolute_ranges:
+            if time_range.time_from <= time <= time_range.time_to:
+                return True
+        return False
+
+    def next_transition(self, time: datetime.datetime) -> Optional[datetime.datetime]:
+        """Return the earliest instant after time at which matches() may change, None if it never does."""
+        candidates = []
+        for (tz, _), flips in zip(self.bitmaps, self.flips):
+            if not flips:
+                continue
+            local_time = _local_time(time, tz)
+            minute_of_week = (
+                local_time.weekday() * MINUTES_PER_DAY
+                + local_time.hour * 60
+                + local_time.minute
+            )
+            index = bisect.bisect_right(flips, minute_of_week)
+            if index < len(flips):
+                minutes = flips[index] - minute_of_week
+            else:
+                minutes = flips[0] + MINUTES_PER_WEEK - minute_of_week
+            wall_clock = local_time.replace(
+                tzinfo=None, second=0, microsecond=0
+            ) + datetime.timedelta(minutes=minutes)
+            instant = tz.localize(wall_clock).astimezone(
+                time.tzinfo or datetime.timezone.utc
+            )
+            if time.tzinfo is None:
+                instant = instant.replace(tzinfo=None)
+            if instant <= time:
+                # the wall clock jumped (DST), check again a minute later
+                instant = time + datetime.timedelta(minutes=1)
+            candidates.append(instant)
+        for time_range in self.absolute_ranges:
+            if time < time_range.time_from:
+                candidates.append(time_range.time_from)
+            elif time <= time_range.time_to:
+                candidates.append(time_range.time_to + datetime.timedelta(seconds=1))
+        return min(candidates, default=None)
+
+
+def _local_time(time: datetime.datetime, tz: pytz.BaseTzInfo) -> datetime.datetime:
+    """Return the wall clock time of tz at time, a naive time being UTC."""
+    if time.tzinfo is None:
+        return tz.fromutc(time.replace(tzinfo=tz))
+    return time.astimezone(tz)
+
+
+class TransitionTracker:
+    """Collect the earliest upcoming schedule transition of the time specs evaluated during one cycle."""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.seen: set = set()
+        self.next_transition: Optional[datetime.datetime] = None
+
+    def add_time_spec(self, time_spec: TimeSpec, time: datetime.datetime):
+        with self.lock:
+            if (time_spec, time) in self.seen:
+                return
+            self.seen.add((time_spec, time))
+        instant = time_spec.next_transition(time)
+        if instant is not None:
+            self.add_instant(instant)
+
+    def add_instant(self, instant: datetime.datetime):
+        with self.lock:
+            if self.next_transition is None or instant < self.next_transition:
+                self.next_transition = instant
+
+
+_TRANSITION_TRACKER: contextvars.ContextVar[Optional[TransitionTracker]] = (
+    contextvars.ContextVar("transition_tracker", default=None)
+)
+
+
+@contextlib.contextmanager
+def track_transitions():
+    """Record the schedule transitions seen while the block runs, including in worker threads started from it."""
+    tracker = TransitionTracker()
+    token = _TRANSITION_TRACKER.set(tracker)
+    try:
+        yield tracker
+    finally:
+        _TRANSITION_TRACKER.reset(token)
+
+
+def record_time_spec(time_spec: TimeSpec, time: datetime.datetime):
+    tracker = _TRANSITION_TRACKER.get()
+    if tracker is not None and time_spec.constant is None:
+        tracker.add_time_spec(time_spec, time)
+
+
+def record_transition(instant: datetime.datetime):
+    tracker = _TRANSITION_TRACKER.get()
+    if tracker is not None:
+        tracker.add_instant(instant)
+
+
+def _compile_recurring_time_range(match: re.Match) -> Tuple[pytz.BaseTzInfo, int]:
+    """Return the time zone of a recurring range and its minute-of-week bitmap as an integer."""
+    tz = pytz.timezone(match.group("tz"))
+    day_from = WEEKDAYS.index(match.group(1).upper())
+    day_to = WEEKDAYS.index(match.group(2).upper())
+    minute_from = int(match.group(3)) * 60 + int(match.group(4))
+    minute_to = min(int(match.group(5)) * 60 + int(match.group(6)), MINUTES_PER_DAY)
+    bitmap = 0
+    if minute_from < minute_to:
+        day_mask = ((1 << (minute_to - minute_from)) - 1) << minute_from
+        for day in range(7):
+            if day_from > day_to:
+                # wrap around, e.g. Sun-Fri (makes sense for countries with work week starting on Sunday)
+                day_matches = day >= day_from or day <= day_to
+            else:
+                # e.g. Mon-Fri
+                day_matches = day_from <= day <= day_to
+            if day_matches:
+                bitmap |= day_mask << (day * MINUTES_PER_DAY)
+    return tz, bitmap
+
+
+def _bitmap_flips(bitmap: int) -> Tuple[int, ...]:
+    """Return the minutes of the week at which the bit differs from the previous minute (wrapping around Sunday)."""
+    previous = ((bitmap << 1) | (bitmap >> (MINUTES_PER_WEEK - 1))) & (
+        (1 << MINUTES_PER_WEEK) - 1
+    )
+    changes = bitmap ^ previous
+    flips = []
+    while changes:
+        lowest = changes & -changes
+        flips.append(lowest.bit_length() - 1)
+        changes ^= lowest
+    return tuple(flips)
+
+
+def _compile_absolute_time_range(match: re.Match) -> AbsoluteTimeRange:
+    time_from = datetime.datetime.fromisoformat(match.group(1))
+    time_to = datetime.datetime.fromisoformat(match.group(2))
+    return AbsoluteTimeRange(time_from, time_to)
+
+
+@functools.lru_cache(maxsize=TIME_SPEC_CACHE_SIZE)
+def compile_time_spec(
+    spec: str,
+    default_timezone: Optional[str] = None,
+    default_weekframe: Optional[str] = None,
+) -> TimeSpec:
+    """
+    Parse a time spec string once, applying the default time zone and week frame to the ranges which omit them.
+
+    Compiled specs are kept in a bounded LRU cache keyed by the spec and the defaults. Invalid specs raise ValueError.
+    """
+    if spec.lower() == "always":
+        return TimeSpec(spec, True, (), ())
+    elif spec.lower() == "never":
+        return TimeSpec(spec, False, (), ())
+    bitmaps: Dict[pytz.BaseTzInfo, int] = {}
+    absolute_ranges: List[AbsoluteTimeRange] = []
+    for spec_ in spec.split(","):
+        spec_ = spec_.strip()
+        match = TIME_SPEC_PATTERN_WO_TZ.match(spec_)
+        if match and not ABSOLUTE_TIME_SPEC_PATTERN.match(spec_):
+            if default_timezone:
+                spec_ = spec_ + " " + default_timezone
+            else:
+                raise ValueError(
+                    "No default timezone defined in environment variable 'DEFAULT_TIMEZONE'"
+                )
+        if TIME_SPEC_PATTERN_WO_WF.match(spec_):
+            if default_weekframe:
+                spec_ = default_weekframe + " " + spec_
+            else:
+                raise ValueError(
+                    "No default week frame defined in environment variable 'DEFAULT_WEEKFRAME'"
+                )
+        recurring_match = TIME_SPEC_PATTERN.match(spec_)
+        if recurring_match is not None:
+            tz, bitmap = _compile_recurring_time_range(recurring_match)
+            # a union of clauses in the same zone is a bitwise OR
+            bitmaps[tz] = bitmaps.get(tz, 0) | bitmap
+            continue
+        absolute_match = ABSOLUTE_TIME_SPEC_PATTERN.match(spec_)
+        if absolute_match is not None:
+            absolute_ranges.append(_compile_absolute_time_range(absolute_match))
+            continue
+        raise ValueError(
+            f'Time spec value "{spec_}" does not match format ("Mon-Fri 06:30-20:30 Europe/Berlin" or "2019-01-01T00:00:00+00:00-2019-01-02T12:34:56+00:00")'
+        )
+    return TimeSpec(
+        spec,
+        None,
+        tuple(
+            (tz, bitmap.to_bytes(MINUTES_PER_WEEK // 8, "little"))
+            for tz, bitmap in bitmaps.items()
+        ),
+        tuple(absolute_ranges),
+        tuple(_bitmap_flips(bitmap) for bitmap in bitmaps.values()),
+    )
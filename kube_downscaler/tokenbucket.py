@@ -1,30 +1,192 @@
+import itertools
+import logging
+import math
 import time
 from threading import Lock
+from typing import Dict
+from typing import List
+from typing import Optional
+
+logger = logging.getLogger(__name__)
+
+# lanes are served in priority order, requests of the same lane in FIFO order
+LANE_SCALE = 0
+LANE_DEFAULT = 1
+LANE_BACKGROUND = 2
+LANES = {"scale": LANE_SCALE, "default": LANE_DEFAULT, "background": LANE_BACKGROUND}
+
+MIN_WAIT_SECONDS = 0.001
+
+VERBS = frozenset(["get", "list", "watch", "create", "update", "patch", "delete"])
+
+
+def parse_request_costs(value: str) -> Dict[str, float]:
+    """Parse a "list=5,watch=2" string into a verb to token cost mapping."""
+    costs: Dict[str, float] = {}
+    for item in value.split(","):
+        item = item.strip()
+        if not item:
+            continue
+        verb, sep, cost = item.partition("=")
+        verb = verb.strip().lower()
+        if not sep or verb not in VERBS:
+            raise ValueError(
+                f"invalid request cost '{item}', expected <verb>=<tokens> with verb in [{', '.join(sorted(VERBS))}]"
+            )
+        try:
+            costs[verb] = float(cost)
+        except ValueError:
+            raise ValueError(f"invalid request cost '{item}', tokens must be a number")
+        if costs[verb] <= 0:
+            raise ValueError(f"invalid request cost '{item}', tokens must be positive")
+    return costs
 
 
 class TokenBucket:
-    def __init__(self, qps, burst):
+    """
+    Token bucket shared by all threads, sleeping outside of its lock.
+
+    Waiting requests are queued per lane: a request is only granted tokens once no request of a higher priority lane
+    and no earlier request of its own lane is waiting. Requests can be weighted per verb with the costs mapping.
+    """
+
+    def __init__(self, qps, burst, costs: Optional[Dict[str, float]] = None):
         self.qps = qps
         self.burst = burst
+        self.costs = costs or {}
         self.tokens = burst
-        self.last_update = time.time()
+        self.last_update = time.monotonic()
         self.lock = Lock()
+        self.waiting: List[List[tuple]] = [[] for _ in LANES]
+        self.tickets = itertools.count()
+
+    def cost(self, verb: Optional[str], tokens: float = 1) -> float:
+        if verb is None:
+            return tokens
+        return self.costs.get(verb, tokens)
+
+    def acquire(self, tokens=1, lane: int = LANE_DEFAULT, verb: Optional[str] = None):
+        if self.qps <= 0 or self.burst <= 0:
+            return
+        ticket = self._enqueue(self.cost(verb, tokens), lane)
+        try:
+            while True:
+                delay = self._try_take(ticket)
+                if delay is None:
+                    return
+                time.sleep(delay)
+        finally:
+            self._dequeue(ticket)
+
+    def set_qps(self, qps: float):
+        with self.lock:
+            # tokens accumulated so far are credited at the previous rate
+            self._refill()
+            self.qps = qps
+
+    def _refill(self):
+        now = time.monotonic()
+        elapsed = now - self.last_update
+        self.tokens = min(float(self.burst), self.tokens + elapsed * self.qps)
+        self.last_update = now
+
+    def _enqueue(self, tokens: float, lane: int) -> tuple:
+        # a request can never cost more than a full bucket, otherwise it would wait forever
+        ticket = (lane, next(self.tickets), min(float(tokens), float(self.burst)))
+        with self.lock:
+            self.waiting[lane].append(ticket)
+        return ticket
+
+    def _dequeue(self, ticket: tuple):
+        with self.lock:
+            lane = self.waiting[ticket[0]]
+            if ticket in lane:
+                lane.remove(ticket)
+
+    def _try_take(self, ticket: tuple) -> Optional[float]:
+        """Take the tokens of ticket if it is first in line, otherwise return the estimated seconds to wait."""
+        with self.lock:
+            self._refill()
+
+            ahead = 0.0
+            for lane in self.waiting[: ticket[0] + 1]:
+                for waiting in lane:
+                    if waiting == ticket:
+                        break
+                    ahead += waiting[2]
+            needed = ticket[2]
+            if ahead == 0 and self.tokens >= needed:
+                self.tokens -= needed
+                self.waiting[ticket[0]].remove(ticket)
+                return None
+            # the requests ahead may not have woken up yet to take their tokens, check again shortly
+            return max((ahead + needed - self.tokens) / self.qps, MIN_WAIT_SECONDS)
+
+
+class AdaptiveRateLimiter:
+    """
+    AIMD controller of the rate of a TokenBucket.
+
+    The rate is halved when the API server throttles a request (HTTP 429, e.g. rejected by API Priority and Fairness)
+    and is increased step by step back to the configured rate while requests succeed. A Retry-After delay holds the
+    rate down for at least that long.
+    """
+
+    DECREASE_FACTOR = 0.5
+    # concurrent requests rejected by the same overload only lower the rate once
+    DECREASE_COOLDOWN_SECONDS = 1.0
+    INCREASE_INTERVAL_SECONDS = 1.0
+    INCREASE_STEPS = 20
+    MIN_QPS_FRACTION = 0.1
+
+    def __init__(self, bucket: TokenBucket):
+        self.bucket = bucket
+        self.max_qps = float(bucket.qps)
+        self.min_qps = self.max_qps * self.MIN_QPS_FRACTION
+        self.increase_step = self.max_qps / self.INCREASE_STEPS
+        self.lock = Lock()
+        self.last_decrease = -math.inf
+        self.hold_until = time.monotonic()
+        self.throttled_requests = 0
+
+    @property
+    def qps(self) -> float:
+        return self.bucket.qps
+
+    def throttled(
+        self, retry_after: Optional[float] = None, priority_level: Optional[str] = None
+    ):
+        with self.lock:
+            self.throttled_requests += 1
+            now = time.monotonic()
+            self.hold_until = max(
+                self.hold_until,
+                now + max(retry_after or 0, self.INCREASE_INTERVAL_SECONDS),
+            )
+            if now - self.last_decrease < self.DECREASE_COOLDOWN_SECONDS:
+                return
+            self.last_decrease = now
+            previous_qps = self.bucket.qps
+            qps = max(self.min_qps, previous_qps * self.DECREASE_FACTOR)
+            if qps == previous_qps:
+                return
+            self.bucket.set_qps(qps)
+        reason = "throttled by the API server"
+        if priority_level:
+            reason += f" (API Priority and Fairness priority level {priority_level})"
+        logger.warning(
+            f"KubeDownscaler is being {reason}, lowering the effective rate limit from {previous_qps:.2f} to {qps:.2f} QPS"
+        )
 
-    def acquire(self, tokens=1):
+    def succeeded(self):
         with self.lock:
-            if self.qps > 0 and self.burst > 0:
-                while True:
-                    now = time.time()
-                    elapsed = now - self.last_update
-
-                    self.tokens = min(
-                        float(self.burst), self.tokens + elapsed * self.qps
-                    )
-                    self.last_update = now
-
-                    if self.tokens >= tokens:
-                        self.tokens -= tokens
-                        return
-
-                    sleep_time = (tokens - self.tokens) / self.qps
-                    time.sleep(sleep_time)
+            now = time.monotonic()
+            previous_qps = self.bucket.qps
+            if previous_qps >= self.max_qps or now < self.hold_until:
+                return
+            qps = min(self.max_qps, previous_qps + self.increase_step)
+            self.hold_until = now + self.INCREASE_INTERVAL_SECONDS
+            self.bucket.set_qps(qps)
+        logger.debug(
+            f"Raising the effective rate limit from {previous_qps:.2f} to {qps:.2f} QPS"
+        )
@@ -0,0 +1,46 @@
+import time
+
+import pytest
+
+
+@pytest.fixture
+def no_retries(monkeypatch):
+    """Fail API calls right away, unthrottled and without a circuit breaker; used by the modules of mocked clusters."""
+    monkeypatch.setattr("kube_downscaler.helper.MAX_RETRIES", 0, raising=False)
+    monkeypatch.setattr("kube_downscaler.helper.TOKEN_BUCKET", None, raising=False)
+    monkeypatch.setattr("kube_downscaler.helper.CIRCUIT_BREAKER", None)
+
+
+@pytest.fixture
+def benchmark(record_property):
+    """
+    Time a callable and return its best time per call in seconds.
+
+    The time is recorded as "<name>_seconds" and listed in the benchmarks section at the end of the run. Nothing is
+    asserted on it: wall-clock timings are flaky on loaded machines, the tests compare results only.
+    """
+
+    def run(name, func, number=1, repeat=3):
+        best = None
+        for _ in range(repeat):
+            started = time.perf_counter()
+            for _ in range(number):
+                func()
+            seconds = (time.perf_counter() - started) / number
+            best = seconds if best is None else min(best, seconds)
+        record_property(f"{name}_seconds", best)
+        return best
+
+    return run
+
+
+def pytest_terminal_summary(terminalreporter):
+    lines = [
+        f"{report.nodeid}: {name} {value:.3g}"
+        for report in terminalreporter.stats.get("passed", [])
+        for name, value in report.user_properties
+    ]
+    if lines:
+        terminalreporter.section("benchmarks")
+        for line in lines:
+            terminalreporter.write_line(line)
@@ -1,11 +1,21 @@
+import threading
+import time
+from unittest.mock import MagicMock
 from unittest.mock import patch
 
 import pytest
 import requests
+from pykube import Deployment
+from pykube.exceptions import HTTPError
 from requests.models import Response
 
 from kube_downscaler import helper
 from kube_downscaler.helper import call_with_exponential_backoff
+from kube_downscaler.tokenbucket import AdaptiveRateLimiter
+from kube_downscaler.tokenbucket import LANE_BACKGROUND
+from kube_downscaler.tokenbucket import LANE_DEFAULT
+from kube_downscaler.tokenbucket import LANE_SCALE
+from kube_downscaler.tokenbucket import parse_request_costs
 from kube_downscaler.tokenbucket import TokenBucket
 
 
@@ -108,6 +118,158 @@ def test_acquire_with_zero_qps_or_burst_does_not_block(monkeypatch):
         # should return immediately and not hang
         tb.acquire(1)
 
+def test_acquire_charges_verb_cost():
+    tb = TokenBucket(qps=5, burst=10, costs={"list": 4})
+    tb.acquire(verb="list")
+    assert tb.tokens == pytest.approx(6, abs=0.1)
+    tb.acquire(verb="get")
+    assert tb.tokens == pytest.approx(5, abs=0.1)
+
+
+def test_acquire_caps_cost_at_burst():
+    tb = TokenBucket(qps=100, burst=2, costs={"list": 50})
+    tb.acquire(verb="list")
+    assert tb.tokens < 1
+
+
+def test_acquire_sleeps_outside_the_lock(monkeypatch):
+    tb = TokenBucket(qps=5, burst=1)
+    tb.tokens = 0
+
+    def sleep(seconds):
+        assert not tb.lock.locked()
+        tb.last_update -= seconds
+
+    monkeypatch.setattr("kube_downscaler.tokenbucket.time.sleep", sleep)
+    tb.acquire()
+    assert tb.waiting == [[], [], []]
+
+
+def test_acquire_serves_scale_lane_first():
+    tb = TokenBucket(qps=5, burst=1)
+    tb.tokens = 0
+    background = tb._enqueue(1, LANE_BACKGROUND)
+    scale = tb._enqueue(1, LANE_SCALE)
+    tb.tokens = 1
+    tb.last_update = time.monotonic()
+    # the background request was queued first, but scale writes take priority
+    assert tb._try_take(background) == pytest.approx(0.2, abs=0.05)
+    assert tb._try_take(scale) is None
+    assert tb.waiting[LANE_BACKGROUND] == [background]
+
+
+def test_acquire_from_concurrent_threads():
+    tb = TokenBucket(qps=200, burst=1)
+    tb.tokens = 0
+    threads = [threading.Thread(target=tb.acquire) for _ in range(5)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join(timeout=5)
+    assert not any(thread.is_alive() for thread in threads)
+    assert tb.waiting == [[], [], []]
+
+
+def test_acquire_is_fifo_within_a_lane():
+    tb = TokenBucket(qps=5, burst=1)
+    tb.tokens = 0
+    first = tb._enqueue(1, LANE_DEFAULT)
+    second = tb._enqueue(1, LANE_DEFAULT)
+    tb.tokens = 1
+    tb.last_update = time.monotonic()
+    # the second request has to wait for the first one, even if a token is available
+    assert tb._try_take(second) == pytest.approx(0.2, abs=0.05)
+    assert tb._try_take(first) is None
+    assert tb.waiting[LANE_DEFAULT] == [second]
+
+
+def test_parse_request_costs():
+    assert parse_request_costs("") == {}
+    assert parse_request_costs("list=5, WATCH=2.5") == {"list": 5.0, "watch": 2.5}
+    for value in ["list", "lists=5", "list=abc", "list=0"]:
+        with pytest.raises(ValueError):
+            parse_request_costs(value)
+
+
+def test_adaptive_rate_limiter_decreases_on_throttling():
+    tb = TokenBucket(qps=20, burst=20)
+    limiter = AdaptiveRateLimiter(tb)
+    limiter.throttled()
+    assert tb.qps == 10
+    # a second rejection caused by the same overload does not lower the rate again
+    limiter.throttled()
+    assert tb.qps == 10
+    assert limiter.throttled_requests == 2
+    for _ in range(10):
+        limiter.last_decrease -= limiter.DECREASE_COOLDOWN_SECONDS
+        limiter.throttled()
+    assert tb.qps == 2  # never below 10% of the configured rate
+
+
+def test_adaptive_rate_limiter_increases_gradually():
+    tb = TokenBucket(qps=20, burst=20)
+    limiter = AdaptiveRateLimiter(tb)
+    limiter.throttled(retry_after=5)
+    assert tb.qps == 10
+    limiter.succeeded()
+    assert tb.qps == 10  # held down until Retry-After has passed
+    limiter.hold_until -= 5
+    limiter.succeeded()
+    assert tb.qps == 11
+    limiter.succeeded()
+    assert tb.qps == 11  # at most one step per interval
+    for _ in range(20):
+        limiter.hold_until -= limiter.INCREASE_INTERVAL_SECONDS
+        limiter.succeeded()
+    assert tb.qps == 20
+
+
+def test_call_with_exponential_backoff_reports_throttling(monkeypatch, caplog):
+    monkeypatch.setattr("kube_downscaler.helper.MAX_RETRIES", 0, raising=False)
+    monkeypatch.setattr(helper, "TOKEN_BUCKET", None, raising=False)
+    monkeypatch.setattr(helper, "RATE_LIMITER", None)
+    helper.initialize_token_bucket(20, 20, adaptive=True)
+
+    def rejected():
+        error = make_http_error(429)
+        error.response.headers["X-Kubernetes-PF-PriorityLevel-UID"] = "workload-low"
+        raise error
+
+    with pytest.raises(requests.HTTPError):
+        call_with_exponential_backoff(rejected)
+    assert helper.TOKEN_BUCKET.qps == 10
+    assert "priority level workload-low" in caplog.text
+
+    def failed():
+        raise make_http_error(500)
+
+    with pytest.raises(requests.HTTPError):
+        call_with_exponential_backoff(failed)
+    assert helper.RATE_LIMITER.throttled_requests == 1
+
+
+def test_report_throttling_of_pykube_errors(monkeypatch):
+    monkeypatch.setattr(helper, "TOKEN_BUCKET", None, raising=False)
+    monkeypatch.setattr(helper, "RATE_LIMITER", None)
+    helper.initialize_token_bucket(20, 20, adaptive=True)
+
+    # raised by pykube objects, e.g. by update() or patch()
+    helper.report_throttling(HTTPError(500, "internal error"))
+    assert helper.RATE_LIMITER.throttled_requests == 0
+    helper.report_throttling(HTTPError(429, "too many requests"))
+    assert helper.RATE_LIMITER.throttled_requests == 1
+    assert helper.TOKEN_BUCKET.qps == 10
+
+
+def test_initialize_adaptive_rate_limit_requires_qps(monkeypatch):
+    monkeypatch.setattr(helper, "TOKEN_BUCKET", None, raising=False)
+    monkeypatch.setattr(helper, "RATE_LIMITER", None)
+    with pytest.raises(ValueError):
+        helper.initialize_token_bucket(0, 0, adaptive=True)
+    helper.initialize_token_bucket(0, 0)
+    assert helper.RATE_LIMITER is None
+
+
 def test_call_with_exponential_backoff_with_token_bucket_none(monkeypatch):
     # ensure that when TOKEN_BUCKET is None, call_with_exponential_backoff does not try to call acquire
 
@@ -116,7 +278,7 @@ def test_call_with_exponential_backoff_with_token_bucket_none(monkeypatch):
     monkeypatch.setattr("kube_downscaler.helper.MAX_RETRIES", 3, raising=False)
 
     # if TokenBucket.acquire were called somewhere unexpectedly, fail the test
-    def _fail_acquire(self, tokens=1):
+    def _fail_acquire(self, tokens=1, lane=None, verb=None):
         pytest.fail("TokenBucket.acquire should not be called when TOKEN_BUCKET is None")
 
     monkeypatch.setattr(TokenBucket, "acquire", _fail_acquire, raising=False)
@@ -137,7 +299,7 @@ def test_call_with_exponential_backoff_calls_acquire_when_present(monkeypatch):
     called = {"count": 0}
 
     class DummyTB:
-        def acquire(self, tokens=1):
+        def acquire(self, tokens=1, lane=None, verb=None):
             called["count"] += 1
 
     monkeypatch.setattr(helper, "TOKEN_BUCKET", DummyTB(), raising=False)
@@ -147,4 +309,85 @@ def test_call_with_exponential_backoff_calls_acquire_when_present(monkeypatch):
 
     result = helper.call_with_exponential_backoff(simple, use_token_bucket=True)
     assert result == "ok"
-    assert called["count"] == 1
\ No newline at end of file
+    assert called["count"] == 1
+
+def make_list_response(items, continue_token=None):
+    response = MagicMock()
+    metadata = {"continue": continue_token} if continue_token else {}
+    response.json.return_value = {"metadata": metadata, "items": items}
+    return response
+
+
+def test_list_objects_follows_continue_token(monkeypatch):
+    monkeypatch.setattr("kube_downscaler.helper.MAX_RETRIES", 0, raising=False)
+    monkeypatch.setattr("kube_downscaler.helper.TOKEN_BUCKET", None, raising=False)
+    api = MagicMock()
+    api.get.side_effect = [
+        make_list_response([{"metadata": {"name": "deploy-1", "uid": "1"}}], "token-1"),
+        make_list_response([{"metadata": {"name": "deploy-2", "uid": "2"}}]),
+    ]
+
+    names = [d.name for d in helper.list_objects(Deployment, api, page_size=1)]
+
+    assert names == ["deploy-1", "deploy-2"]
+    assert api.get.call_args_list[0].kwargs["params"] == {"limit": 1}
+    assert api.get.call_args_list[1].kwargs["params"] == {
+        "limit": 1,
+        "continue": "token-1",
+    }
+    assert api.get.call_args_list[0].kwargs["url"] == "deployments"
+    assert "namespace" not in api.get.call_args_list[0].kwargs
+
+
+def test_list_objects_expired_continue_token(monkeypatch):
+    monkeypatch.setattr("kube_downscaler.helper.MAX_RETRIES", 0, raising=False)
+    monkeypatch.setattr("kube_downscaler.helper.TOKEN_BUCKET", None, raising=False)
+    expired = make_http_error(410)
+    expired.response.json = lambda: {"kind": "Status", "metadata": {}}
+    expired_response = MagicMock()
+    expired_response.raise_for_status.side_effect = expired
+    api = MagicMock()
+    api.get.side_effect = [
+        make_list_response([{"metadata": {"name": "deploy-1", "uid": "1"}}], "token-1"),
+        expired_response,
+        # restarted list: deploy-1 was already yielded and must be skipped
+        make_list_response(
+            [
+                {"metadata": {"name": "deploy-1", "uid": "1"}},
+                {"metadata": {"name": "deploy-2", "uid": "2"}},
+            ]
+        ),
+    ]
+
+    names = [
+        d.name for d in helper.list_objects(Deployment, api, "default", page_size=1)
+    ]
+
+    assert names == ["deploy-1", "deploy-2"]
+    assert "continue" not in api.get.call_args_list[2].kwargs["params"]
+    assert api.get.call_args_list[0].kwargs["namespace"] == "default"
+
+
+def test_list_objects_resumes_with_fresh_continue_token(monkeypatch):
+    monkeypatch.setattr("kube_downscaler.helper.MAX_RETRIES", 0, raising=False)
+    monkeypatch.setattr("kube_downscaler.helper.TOKEN_BUCKET", None, raising=False)
+    expired = make_http_error(410)
+    expired.response.json = lambda: {"metadata": {"continue": "token-2"}}
+    expired_response = MagicMock()
+    expired_response.raise_for_status.side_effect = expired
+    api = MagicMock()
+    api.get.side_effect = [
+        make_list_response([{"metadata": {"name": "deploy-1", "uid": "1"}}], "token-1"),
+        expired_response,
+        make_list_response([{"metadata": {"name": "deploy-2", "uid": "2"}}]),
+    ]
+
+    names = [d.name for d in helper.list_objects(Deployment, api, page_size=1)]
+
+    assert names == ["deploy-1", "deploy-2"]
+    assert api.get.call_args_list[2].kwargs["params"]["continue"] == "token-2"
+
+
+def test_initialize_list_page_size_invalid():
+    with pytest.raises(ValueError):
+        helper.initialize_list_page_size(-1)
@@ -1,3 +1,4 @@
+import copy
 import json
 import logging
 import re
@@ -13,6 +14,7 @@ from pykube import HorizontalPodAutoscaler
 from pykube import PodDisruptionBudget
 from pykube.exceptions import HTTPError
 
+from kube_downscaler import helper
 from kube_downscaler.resources.keda import ScaledObject
 from kube_downscaler.resources.stack import Stack
 from kube_downscaler.scaler import autoscale_resource
@@ -22,6 +24,7 @@ from kube_downscaler.scaler import EXCLUDE_ANNOTATION
 from kube_downscaler.scaler import EXCLUDE_UNTIL_ANNOTATION
 from kube_downscaler.scaler import ORIGINAL_REPLICAS_ANNOTATION
 from kube_downscaler.scaler import UPSCALE_PERIOD_ANNOTATION
+from kube_downscaler.timespec import track_transitions
 
 
 @pytest.fixture
@@ -178,6 +181,37 @@ def test_exclude_until_invalid_time(resource, caplog, monkeypatch):
     assert caplog.record_tuples == [("kube_downscaler.scaler", logging.WARNING, msg)]
 
 
+def test_exclude_until_records_transition(resource):
+    api = MagicMock()
+    resource.annotations = {EXCLUDE_UNTIL_ANNOTATION: "2018-10-24T08:00:00Z"}
+    resource.replicas = 1
+    now = datetime.strptime("2018-10-23T21:56:00Z", "%Y-%m-%dT%H:%M:%SZ").replace(
+        tzinfo=timezone.utc
+    )
+    resource.metadata = {"creationTimestamp": "2018-10-23T21:55:00Z"}
+    with track_transitions() as transitions:
+        autoscale_resource(
+            resource,
+            upscale_target_only=False,
+            upscale_period="never",
+            downscale_period="never",
+            default_uptime="never",
+            default_downtime="always",
+            forced_uptime=False,
+            forced_downtime=False,
+            dry_run=True,
+            max_retries_on_conflict=0,
+            api=api,
+            kind=Deployment,
+            now=now,
+            matching_labels=frozenset([re.compile("")]),
+        )
+    assert resource.replicas == 1
+    assert transitions.next_transition == datetime(
+        2018, 10, 24, 8, 0, tzinfo=timezone.utc
+    )
+
+
 def test_dry_run(resource, monkeypatch):
     api = MagicMock()
     monkeypatch.setattr(
@@ -2006,3 +2040,175 @@ def test_hpa_annotation_not_cleared_during_downtime(monkeypatch):
     assert hpa.obj["spec"]["minReplicas"] == 1
     assert hpa.obj["metadata"]["annotations"][ORIGINAL_REPLICAS_ANNOTATION] == "5"
 
+
+def test_compute_json_patch():
+    original = {
+        "metadata": {"name": "deploy-1", "annotations": {"a": "1"}},
+        "spec": {"replicas": 3, "template": {"spec": {}}},
+    }
+    modified = {
+        "metadata": {
+            "name": "deploy-1",
+            "annotations": {"a": None, ORIGINAL_REPLICAS_ANNOTATION: "3"},
+        },
+        "spec": {"replicas": 0, "template": {"spec": {}}},
+    }
+    assert helper.compute_json_patch(original, modified) == [
+        {"op": "test", "path": "/metadata/annotations/a", "value": "1"},
+        {"op": "remove", "path": "/metadata/annotations/a"},
+        {
+            "op": "add",
+            "path": "/metadata/annotations/downscaler~1original-replicas",
+            "value": "3",
+        },
+        {"op": "test", "path": "/spec/replicas", "value": 3},
+        {"op": "replace", "path": "/spec/replicas", "value": 0},
+    ]
+    assert helper.compute_json_patch(original, original) == []
+    # removing an annotation that never existed is not a change
+    assert (
+        helper.compute_json_patch(
+            {"metadata": {}}, {"metadata": {"annotations": {"a": None}}}
+        )
+        == []
+    )
+    # a missing parent is added as a whole
+    assert helper.compute_json_patch(
+        {"metadata": {}}, {"metadata": {"annotations": {"a": "1", "b": None}}}
+    ) == [{"op": "add", "path": "/metadata/annotations", "value": {"a": "1"}}]
+
+
+def test_minimal_patch_scale_down(monkeypatch):
+    api = MagicMock()
+    monkeypatch.setattr("kube_downscaler.helper.MAX_RETRIES", 0, raising=False)
+    monkeypatch.setattr("kube_downscaler.helper.TOKEN_BUCKET", None, raising=False)
+    response = MagicMock()
+    response.json.return_value = {}
+    api.patch.return_value = response
+    resource = Deployment(
+        api,
+        {
+            "metadata": {
+                "name": "deploy-1",
+                "namespace": "default",
+                "creationTimestamp": "2018-10-23T21:55:00Z",
+                "resourceVersion": "42",
+                "labels": {"app": "foo"},
+            },
+            "spec": {"replicas": 3, "template": {"spec": {"containers": []}}},
+            "status": {"replicas": 3},
+        },
+    )
+    now = datetime.strptime("2018-10-23T21:56:00Z", "%Y-%m-%dT%H:%M:%SZ").replace(
+        tzinfo=timezone.utc
+    )
+    autoscale_resource(
+        resource,
+        upscale_period="never",
+        downscale_period="never",
+        default_uptime="never",
+        default_downtime="always",
+        forced_uptime=False,
+        forced_downtime=False,
+        upscale_target_only=False,
+        max_retries_on_conflict=0,
+        api=api,
+        kind=Deployment,
+        dry_run=False,
+        now=now,
+        minimal_patches=True,
+    )
+
+    api.patch.assert_called_once()
+    assert json.loads(api.patch.call_args[1]["data"]) == [
+        {
+            "op": "add",
+            "path": "/metadata/annotations",
+            "value": {ORIGINAL_REPLICAS_ANNOTATION: "3"},
+        },
+        {"op": "test", "path": "/spec/replicas", "value": 3},
+        {"op": "replace", "path": "/spec/replicas", "value": 0},
+    ]
+    assert (
+        api.patch.call_args[1]["headers"]["Content-Type"]
+        == "application/json-patch+json"
+    )
+
+
+def test_minimal_patch_retries_after_a_concurrent_replica_change(monkeypatch):
+    monkeypatch.setattr("kube_downscaler.helper.MAX_RETRIES", 0, raising=False)
+    monkeypatch.setattr("kube_downscaler.helper.TOKEN_BUCKET", None, raising=False)
+
+    def deployment(replicas):
+        return {
+            "metadata": {
+                "name": "deploy-1",
+                "namespace": "default",
+                "creationTimestamp": "2018-10-23T21:55:00Z",
+                "annotations": {},
+            },
+            "spec": {"replicas": replicas},
+        }
+
+    # an HPA scaled the deployment from 3 to 5 replicas after it was listed
+    server = deployment(5)
+    api = MagicMock()
+    patches = []
+
+    def patch(**kwargs):
+        operations = json.loads(kwargs["data"])
+        patches.append(operations)
+        response = MagicMock()
+        for op in operations:
+            if op["op"] == "test" and op["path"] == "/spec/replicas":
+                if op["value"] != server["spec"]["replicas"]:
+                    response.raise_for = HTTPError(
+                        422, "testing value /spec/replicas failed: test failed"
+                    )
+                    return response
+        response.raise_for = None
+        response.json.return_value = server
+        return response
+
+    def raise_for_status(response):
+        if response.raise_for is not None:
+            raise response.raise_for
+
+    api.patch.side_effect = patch
+    api.raise_for_status.side_effect = raise_for_status
+    monkeypatch.setattr(
+        "kube_downscaler.scaler.get_resource",
+        MagicMock(return_value=Deployment(api, copy.deepcopy(server))),
+    )
+    now = datetime.strptime("2018-10-23T21:56:00Z", "%Y-%m-%dT%H:%M:%SZ").replace(
+        tzinfo=timezone.utc
+    )
+
+    autoscale_resource(
+        Deployment(api, deployment(3)),
+        upscale_period="never",
+        downscale_period="never",
+        default_uptime="never",
+        default_downtime="always",
+        forced_uptime=False,
+        forced_downtime=False,
+        upscale_target_only=False,
+        max_retries_on_conflict=1,
+        api=api,
+        kind=Deployment,
+        dry_run=False,
+        now=now,
+        minimal_patches=True,
+    )
+
+    assert len(patches) == 2
+    # the retry stores the replicas set by the HPA, not the stale ones
+    assert patches[1] == [
+        {
+            "op": "add",
+            "path": "/metadata/annotations",
+            "value": {ORIGINAL_REPLICAS_ANNOTATION: "5"},
+        },
+        {"op": "test", "path": "/spec/replicas", "value": 5},
+        {"op": "replace", "path": "/spec/replicas", "value": 0},
+    ]
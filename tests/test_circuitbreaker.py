@@ -0,0 +1,222 @@
+from unittest.mock import MagicMock
+from unittest.mock import patch
+
+import pytest
+import requests
+from pykube import Deployment
+from pykube.exceptions import HTTPError
+from requests.models import Response
+
+from kube_downscaler import helper
+from kube_downscaler.circuitbreaker import CircuitBreaker
+from kube_downscaler.circuitbreaker import RetryBudget
+from kube_downscaler.scaler import scale
+
+
+def make_http_error(status_code: int) -> requests.HTTPError:
+    response = Response()
+    response.status_code = status_code
+    return requests.HTTPError(response=response)
+
+
+@pytest.fixture
+def overload_protection(monkeypatch):
+    monkeypatch.setattr(helper, "TOKEN_BUCKET", None, raising=False)
+    monkeypatch.setattr(helper, "RATE_LIMITER", None)
+    monkeypatch.setattr(helper, "RETRY_BUDGET", None)
+    monkeypatch.setattr(helper, "CIRCUIT_BREAKER", None)
+    monkeypatch.setattr(helper, "MAX_RETRIES", 5, raising=False)
+
+
+def test_retry_budget():
+    budget = RetryBudget(ratio=0.5, min_retries=2)
+    assert budget.try_spend()
+    assert budget.try_spend()
+    assert not budget.try_spend()
+    for _ in range(4):
+        budget.record_success()
+    assert budget.try_spend()
+    assert budget.try_spend()
+    assert not budget.try_spend()
+    assert budget.denied == 2
+    budget.reset()
+    assert (budget.retries, budget.successes, budget.denied) == (0, 0, 0)
+
+
+def test_circuit_breaker_opens_after_consecutive_failures():
+    breaker = CircuitBreaker(threshold=3)
+    breaker.record_failure(429)
+    breaker.record_failure(503)
+    breaker.record_success()
+    breaker.record_failure(429)
+    breaker.record_failure(429)
+    assert not breaker.is_open
+    breaker.record_failure(503, "patching deployments default/app")
+    assert breaker.is_open
+    assert (
+        breaker.reason
+        == "3 consecutive overload responses from the API server (last: HTTP 503 for patching deployments default/app)"
+    )
+    breaker.reset()
+    assert not breaker.is_open
+    assert breaker.reason is None
+
+
+def test_retries_stop_when_budget_is_exhausted(overload_protection):
+    helper.initialize_overload_protection(0.1, 0)
+    helper.RETRY_BUDGET.min_retries = 1
+    calls = []
+
+    def throttled():
+        calls.append(1)
+        raise make_http_error(429)
+
+    with patch("time.sleep"):
+        with pytest.raises(requests.HTTPError):
+            helper.call_with_exponential_backoff(throttled)
+    # the first call and the single retry allowed by the budget
+    assert len(calls) == 2
+    assert helper.RETRY_BUDGET.denied == 1
+
+
+def test_retries_stop_when_circuit_is_open(overload_protection):
+    helper.initialize_overload_protection(0, 2)
+    calls = []
+
+    def throttled():
+        calls.append(1)
+        raise make_http_error(429)
+
+    with patch("time.sleep"):
+        with pytest.raises(requests.HTTPError):
+            helper.call_with_exponential_backoff(throttled)
+    assert len(calls) == 2
+    assert helper.circuit_open()
+
+    # 4xx other than 429 mean the API server is answering
+    helper.reset_overload_protection()
+    helper.record_api_error(make_http_error(503))
+    helper.record_api_error(make_http_error(404))
+    helper.record_api_error(make_http_error(503))
+    assert not helper.circuit_open()
+
+
+def test_pykube_errors_count_toward_retries_and_circuit(overload_protection):
+    helper.initialize_overload_protection(0, 3)
+    calls = []
+
+    def throttled_patch():
+        # pykube objects raise their own HTTPError, e.g. from patch() or update()
+        calls.append(1)
+        raise HTTPError(429, "too many requests")
+
+    with patch("time.sleep"):
+        with pytest.raises(HTTPError):
+            helper.call_with_exponential_backoff(throttled_patch)
+    # retried until the circuit opened after 3 consecutive 429s
+    assert len(calls) == 3
+    assert helper.circuit_open()
+
+    helper.reset_overload_protection()
+
+    def failed_update():
+        raise HTTPError(503, "unavailable")
+
+    for _ in range(3):
+        with pytest.raises(HTTPError):
+            helper.call_with_exponential_backoff(failed_update)
+    assert helper.circuit_open()
+
+
+def test_lazy_query_is_recorded_after_its_request(overload_protection):
+    helper.initialize_overload_protection(0, 2)
+    helper.CIRCUIT_BREAKER.record_failure(503)
+    api = MagicMock()
+    api.get.return_value.raise_for_status.side_effect = make_http_error(503)
+
+    with pytest.raises(requests.HTTPError):
+        helper.call_with_exponential_backoff(lambda: Deployment.objects(api))
+    # the request of the Query failed, it did not count as a success
+    assert helper.circuit_open()
+
+    helper.reset_overload_protection()
+    api.get.return_value.raise_for_status.side_effect = None
+    api.get.return_value.json.return_value = {
+        "items": [{"metadata": {"name": "app", "namespace": "default"}}]
+    }
+    deployments = helper.call_with_exponential_backoff(lambda: Deployment.objects(api))
+    api.get.assert_called()
+    assert [d.name for d in deployments] == ["app"]
+    # iterating again uses the objects of the request sent by the call
+    assert [d.name for d in deployments] == ["app"]
+    assert api.get.call_count == 2
+
+
+def test_events_are_skipped_when_circuit_is_open(overload_protection):
+    helper.initialize_overload_protection(0, 1)
+    helper.CIRCUIT_BREAKER.record_failure(503)
+    resource = MagicMock()
+    assert helper.add_event(resource, "message", "reason", "Normal", False) is None
+    resource.api.get.assert_not_called()
+
+
+def test_scale_defers_resources_when_circuit_opens(overload_protection, monkeypatch):
+    helper.initialize_overload_protection(0, 1)
+    api = MagicMock()
+    monkeypatch.setattr(
+        "kube_downscaler.scaler.helper.get_kube_api", MagicMock(return_value=api)
+    )
+    namespaces = [f"ns-{i}" for i in range(8)]
+
+    def get(url, version, **kwargs):
+        if url == "pods":
+            data = {"items": []}
+        elif url in ("deployments", "statefulsets"):
+            data = {
+                "items": [
+                    {
+                        "metadata": {"name": f"app-{i}", "namespace": namespace},
+                        "spec": {"replicas": 1},
+                    }
+                    for namespace in namespaces
+                    for i in range(3)
+                ]
+            }
+        elif url == "namespaces":
+            data = {"items": [{"metadata": {"name": ns}} for ns in namespaces]}
+        else:
+            raise Exception(f"unexpected call: {url}, {version}, {kwargs}")
+
+        response = MagicMock()
+        response.json.return_value = data
+        return response
+
+    api.get = get
+    processed = []
+
+    def autoscale_resource(resource, *args, **kwargs):
+        processed.append(resource)
+        helper.record_api_error(make_http_error(503), "patching deployments")
+
+    monkeypatch.setattr("kube_downscaler.scaler.autoscale_resource", autoscale_resource)
+
+    scale(
+        constrained_downscaler=False,
+        namespaces=[],
+        upscale_period="never",
+        downscale_period="never",
+        default_uptime="never",
+        default_downtime="always",
+        upscale_target_only=False,
+        include_resources=frozenset(["deployments", "statefulsets"]),
+        exclude_namespaces=[],
+        exclude_deployments=[],
+        dry_run=False,
+        grace_period=300,
+        admission_controller="",
+        api_server_timeout=10,
+        max_retries_on_conflict=0,
+    )
+
+    assert len(processed) == 1
+    assert helper.CIRCUIT_BREAKER.deferred == 23
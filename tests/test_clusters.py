@@ -0,0 +1,164 @@
+import json
+import logging
+import multiprocessing
+import os
+import sys
+from unittest.mock import MagicMock
+
+import pytest
+
+from kube_downscaler import helper
+from kube_downscaler.clusters import Cluster
+from kube_downscaler.clusters import ClusterProcesses
+from kube_downscaler.clusters import FORKSERVER_PRELOAD
+from kube_downscaler.clusters import get_clusters
+from kube_downscaler.main import main
+
+KUBECONFIG = """
+apiVersion: v1
+clusters:
+- cluster: {server: 'https://a.example.org'}
+  name: a
+- cluster: {server: 'https://b.example.org'}
+  name: b
+contexts:
+- context: {cluster: a}
+  name: a
+- context: {cluster: b}
+  name: b
+current-context: a
+kind: Config
+"""
+
+
+@pytest.fixture
+def kubeconfig(tmp_path, monkeypatch):
+    path = tmp_path / "config"
+    path.write_text(KUBECONFIG)
+    monkeypatch.setenv("KUBECONFIG", str(path))
+    return path
+
+
+@pytest.fixture(autouse=True)
+def reset_kube_config(monkeypatch):
+    monkeypatch.setattr("kube_downscaler.helper.KUBE_CONFIG", None)
+
+
+def test_get_clusters_from_contexts(kubeconfig):
+    assert get_clusters("b,a", "") == [
+        Cluster("b", str(kubeconfig), "b"),
+        Cluster("a", str(kubeconfig), "a"),
+    ]
+    with pytest.raises(ValueError, match="context c not found"):
+        get_clusters("a,c", "")
+
+
+def test_get_clusters_from_directory(tmp_path):
+    directory = tmp_path / "kubeconfigs"
+    (directory / "..data").mkdir(parents=True)
+    for name in ("prod.yaml", "dev", ".hidden"):
+        (directory / name).write_text(KUBECONFIG)
+    assert get_clusters("", str(directory)) == [
+        Cluster("dev", str(directory / "dev"), None),
+        Cluster("prod", str(directory / "prod.yaml"), None),
+    ]
+    (directory / "broken").write_text("clusters: [")
+    with pytest.raises(ValueError, match="invalid kubeconfig"):
+        get_clusters("", str(directory))
+    with pytest.raises(ValueError, match="cannot read kubeconfig directory"):
+        get_clusters("", str(tmp_path / "missing"))
+
+
+def test_get_clusters_rejects_duplicate_names(kubeconfig, tmp_path):
+    directory = tmp_path / "kubeconfigs"
+    directory.mkdir()
+    (directory / "a.yaml").write_text(KUBECONFIG)
+    with pytest.raises(ValueError, match="duplicate cluster names: a"):
+        get_clusters("a", str(directory))
+
+
+def test_get_kube_api_uses_the_context_of_the_cluster(kubeconfig):
+    helper.initialize_kube_config(str(kubeconfig), "b")
+    assert helper.get_kube_api(10).url == "https://b.example.org"
+    assert helper.get_credentials_mtime() == os.stat(kubeconfig).st_mtime
+    helper.initialize_kube_config(str(kubeconfig))
+    assert helper.get_kube_api(10).url == "https://a.example.org"
+
+
+def test_setup_logging_with_cluster(capsys):
+    helper.setup_logging(False, False, "prod")
+    logging.getLogger("test").info("cycle done")
+    assert "INFO: [prod] cycle done" in capsys.readouterr().err
+    helper.setup_logging(False, True, "prod")
+    logging.getLogger("test").info("cycle done")
+    entry = json.loads(capsys.readouterr().err)
+    assert (entry["cluster"], entry["message"]) == ("prod", "cycle done")
+
+
+def test_main_starts_one_process_per_cluster(kubeconfig, monkeypatch):
+    cluster_processes = MagicMock()
+    monkeypatch.setattr("kube_downscaler.main.ClusterProcesses", cluster_processes)
+    monkeypatch.setattr("kube_downscaler.main.shutdown.GracefulShutdown", MagicMock())
+    mock_scale = MagicMock()
+    monkeypatch.setattr("kube_downscaler.main.scale", mock_scale)
+
+    main(["--dry-run", "--kubeconfig-contexts=a,b"])
+
+    clusters, argv = cluster_processes.call_args[0]
+    assert [cluster.name for cluster in clusters] == ["a", "b"]
+    assert argv == ["--dry-run", "--kubeconfig-contexts=a,b"]
+    cluster_processes.return_value.run.assert_called_once()
+    mock_scale.assert_not_called()
+
+
+def test_main_runs_a_single_cluster(kubeconfig, monkeypatch):
+    mock_scale = MagicMock()
+    monkeypatch.setattr("kube_downscaler.main.scale", mock_scale)
+
+    main(
+        ["--dry-run", "--once", "--kubeconfig-contexts=a,b"],
+        Cluster("b", str(kubeconfig), "b"),
+    )
+
+    mock_scale.assert_called_once()
+    assert helper.KUBE_CONFIG == (str(kubeconfig), "b")
+
+
+@pytest.mark.skipif(
+    "forkserver" not in multiprocessing.get_all_start_methods(),
+    reason="no fork server on this platform",
+)
+def test_cluster_processes_are_forked_from_a_preloaded_fork_server():
+    cluster_processes = ClusterProcesses([Cluster("a", "", None)], [])
+    assert cluster_processes.context.get_start_method() == "forkserver"
+    assert "kube_downscaler.main" in FORKSERVER_PRELOAD
+
+
+def exit_with_code_of_cluster(cluster, args):
+    """Process target: exits with the code in the file named after the cluster, then with 0."""
+    path = os.path.join(args[0], cluster.name)
+    with open(path) as f:
+        code = int(f.read())
+    with open(path, "w") as f:
+        f.write("0")
+    sys.exit(code)
+
+
+def test_cluster_processes_restart_crashed_processes(tmp_path, monkeypatch, caplog):
+    caplog.set_level(logging.INFO)
+    monkeypatch.setattr("kube_downscaler.clusters.RESTART_DELAY_SECONDS", 0)
+    monkeypatch.setattr("kube_downscaler.clusters.SUPERVISE_INTERVAL_SECONDS", 0.05)
+    (tmp_path / "ok").write_text("0")
+    (tmp_path / "crash").write_text("1")
+    cluster_processes = ClusterProcesses(
+        [Cluster("ok", "", None), Cluster("crash", "", None)],
+        [str(tmp_path)],
+        target=exit_with_code_of_cluster,
+    )
+
+    cluster_processes.run(MagicMock(shutdown_now=False))
+
+    assert "Process of cluster ok exited" in caplog.text
+    assert "Process of cluster crash exited with code 1, restarting it" in caplog.text
+    assert caplog.text.count("Process of cluster crash exited") == 2
+    assert cluster_processes.processes["crash"].exitcode == 0
@@ -0,0 +1,57 @@
+import threading
+import time
+
+import pytest
+
+from kube_downscaler.concurrency import map_bounded
+from kube_downscaler.concurrency import WorkerStats
+
+
+def test_map_bounded_preserves_order():
+    def slow_square(value):
+        time.sleep(0.01 * (5 - value))
+        return value * value
+
+    assert map_bounded(slow_square, range(5), max_workers=5) == [0, 1, 4, 9, 16]
+
+
+def test_map_bounded_serial_runs_in_calling_thread():
+    threads = map_bounded(lambda _: threading.current_thread(), range(3), 1)
+    assert threads == [threading.current_thread()] * 3
+
+
+def test_map_bounded_limits_workers():
+    lock = threading.Lock()
+    running = {"now": 0, "max": 0}
+
+    def work(_):
+        with lock:
+            running["now"] += 1
+            running["max"] = max(running["max"], running["now"])
+        time.sleep(0.01)
+        with lock:
+            running["now"] -= 1
+
+    map_bounded(work, range(20), max_workers=3)
+
+    assert running["max"] <= 3
+
+
+def test_map_bounded_raises_first_error():
+    def fail_on_two(value):
+        if value == 2:
+            raise ValueError("two")
+        return value
+
+    with pytest.raises(ValueError):
+        map_bounded(fail_on_two, range(4), max_workers=4)
+
+
+def test_worker_stats_summary():
+    stats = WorkerStats()
+    assert stats.summary() == "no resources processed"
+
+    map_bounded(lambda _: stats.record(2, 0.5), range(4), max_workers=2)
+
+    assert sum(stats.processed.values()) == 8
+    assert "resources in" in stats.summary()
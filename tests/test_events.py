@@ -1,9 +1,12 @@
 from unittest.mock import MagicMock
 
 import pytest
+from pykube.exceptions import HTTPError
 from pykube.query import Query
 
 from kube_downscaler import helper
+from kube_downscaler.events import EventRecorder
+from kube_downscaler.resources.event import EventsV1Event
 
 
 @pytest.fixture
@@ -56,3 +59,122 @@ def test_add_event(monkeypatch, resource, event):
     e = helper.add_event(resource, "test message", "reason", "Normal", False)
     assert e.obj["count"] == 1
     event.update.assert_not_called()
+
+
+@pytest.fixture
+def recorder_env(monkeypatch):
+    monkeypatch.setattr("kube_downscaler.helper.MAX_RETRIES", 0, raising=False)
+    monkeypatch.setattr("kube_downscaler.helper.TOKEN_BUCKET", None, raising=False)
+    monkeypatch.setattr("kube_downscaler.helper.CIRCUIT_BREAKER", None)
+    monkeypatch.setattr("kube_downscaler.helper.EVENT_RECORDER", None)
+    create = MagicMock()
+    patch = MagicMock()
+    monkeypatch.setattr("pykube.Event.create", create)
+    monkeypatch.setattr("pykube.Event.patch", patch)
+    monkeypatch.setattr("kube_downscaler.resources.event.EventsV1Event.create", create)
+    monkeypatch.setattr("kube_downscaler.resources.event.EventsV1Event.patch", patch)
+    return create, patch
+
+
+def drain(recorder):
+    batch = []
+    while not recorder.queue.empty():
+        batch.append(recorder.queue.get_nowait())
+    recorder.flush(batch)
+
+
+def test_add_event_uses_recorder(monkeypatch, resource):
+    recorder = MagicMock()
+    monkeypatch.setattr("kube_downscaler.helper.EVENT_RECORDER", recorder)
+    monkeypatch.setattr("kube_downscaler.helper.CIRCUIT_BREAKER", None)
+    list_events = MagicMock()
+    monkeypatch.setattr("pykube.objects.Event.objects", list_events)
+    assert helper.add_event(resource, "test message", "reason", "Normal", False) is None
+    recorder.record.assert_called_once_with(
+        resource, "test message", "reason", "Normal", False
+    )
+    list_events.assert_not_called()
+
+
+def test_recorder_merges_batch_and_bumps_cached_event(recorder_env, resource):
+    create, patch = recorder_env
+    recorder = EventRecorder()
+    for _ in range(3):
+        recorder.record(resource, "test message", "reason", "Normal", False)
+    recorder.record(resource, "other message", "reason", "Normal", False)
+    drain(recorder)
+    assert create.call_count == 2
+    patch.assert_not_called()
+    event = recorder.cache[("id-1", "reason", "test message")]
+    assert event.obj["count"] == 3
+    assert event.obj["involvedObject"]["uid"] == "id-1"
+
+    recorder.record(resource, "test message", "reason", "Normal", False)
+    drain(recorder)
+    assert create.call_count == 2
+    patch.assert_called_once()
+    assert patch.call_args[0][0]["count"] == 4
+
+
+def test_recorder_creates_new_event_when_bump_fails(recorder_env, resource):
+    create, patch = recorder_env
+    patch.side_effect = HTTPError(404, "not found")
+    recorder = EventRecorder()
+    recorder.record(resource, "test message", "reason", "Normal", False)
+    drain(recorder)
+    recorder.record(resource, "test message", "reason", "Normal", False)
+    drain(recorder)
+    assert create.call_count == 2
+    assert len(recorder.cache) == 1
+
+
+def test_recorder_series(recorder_env, resource):
+    create, patch = recorder_env
+    recorder = EventRecorder(series=True)
+    recorder.record(resource, "test message", "reason", "Normal", False)
+    recorder.record(resource, "test message", "reason", "Normal", False)
+    drain(recorder)
+    event = recorder.cache[("id-1", "reason", "test message")]
+    assert isinstance(event, EventsV1Event)
+    assert event.obj["note"] == "test message"
+    assert event.obj["regarding"]["uid"] == "id-1"
+    assert event.obj["series"]["count"] == 2
+
+    recorder.record(resource, "test message", "reason", "Normal", False)
+    drain(recorder)
+    assert patch.call_args[0][0]["series"]["count"] == 3
+
+
+def test_recorder_drops_when_queue_is_full(recorder_env, resource):
+    recorder = EventRecorder(queue_size=2)
+    for _ in range(5):
+        recorder.record(resource, "test message", "reason", "Normal", False)
+    assert recorder.queue.qsize() == 2
+    assert recorder.dropped == 3
+
+
+def test_recorder_skips_dry_run(recorder_env, resource):
+    recorder = EventRecorder()
+    recorder.record(resource, "test message", "reason", "Normal", True)
+    assert recorder.queue.empty()
+
+
+def test_recorder_evicts_least_recently_used(recorder_env, resource):
+    recorder = EventRecorder(cache_size=2)
+    for message in ["a", "b", "a", "c"]:
+        recorder.record(resource, message, "reason", "Normal", False)
+        drain(recorder)
+    assert list(recorder.cache) == [
+        ("id-1", "reason", "a"),
+        ("id-1", "reason", "c"),
+    ]
+
+
+def test_recorder_stop_flushes_queue(recorder_env, resource):
+    create, _ = recorder_env
+    recorder = EventRecorder()
+    recorder.start()
+    recorder.record(resource, "test message", "reason", "Normal", False)
+    recorder.stop()
+    assert not recorder.thread.is_alive()
+    create.assert_called_once()
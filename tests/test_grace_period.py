@@ -1,10 +1,14 @@
 from datetime import datetime
 from datetime import timedelta
 from datetime import timezone
+from unittest.mock import MagicMock
 
 from pykube import Deployment
 
+from kube_downscaler.main import get_sleep_seconds
+from kube_downscaler.scaler import autoscale_resource
 from kube_downscaler.scaler import within_grace_period
+from kube_downscaler.timespec import track_transitions
 
 ANNOTATION_NAME = "my-deployment-time"
 GRACE_PERIOD_ANNOTATION = "downscaler/grace-period"
@@ -124,3 +128,40 @@ def test_within_grace_period_wrong_deployment_time_annotation():
     assert not within_grace_period(
         deploy, 180, now, deployment_time_annotation=ANNOTATION_NAME
     )
+
+
+def test_sleep_until_the_grace_period_annotation_ends():
+    now = datetime.now(timezone.utc)
+    ts = now - timedelta(minutes=2)
+    deploy = Deployment(
+        MagicMock(),
+        {
+            "metadata": {
+                "name": "grace-period-test-deployment",
+                "namespace": "test-namespace",
+                "creationTimestamp": ts.strftime("%Y-%m-%dT%H:%M:%SZ"),
+                "annotations": {GRACE_PERIOD_ANNOTATION: "300"},
+            },
+            "spec": {"replicas": 1},
+        },
+    )
+    with track_transitions() as transitions:
+        autoscale_resource(
+            deploy,
+            upscale_target_only=False,
+            upscale_period="never",
+            downscale_period="never",
+            default_uptime="never",
+            default_downtime="always",
+            forced_uptime=False,
+            forced_downtime=False,
+            dry_run=True,
+            max_retries_on_conflict=0,
+            api=deploy.api,
+            kind=Deployment,
+            now=now,
+            grace_period=900,
+        )
+    assert deploy.replicas == 1
+    # the annotation's grace period ends 3 minutes from now, long before --max-resync-interval
+    assert 170 < get_sleep_seconds(now, transitions.next_transition, 900) <= 180
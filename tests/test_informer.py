@@ -0,0 +1,203 @@
+import json
+from unittest.mock import MagicMock
+
+import pykube
+import requests
+from pykube import Deployment
+from requests.models import Response
+
+from kube_downscaler.informer import Informer
+from kube_downscaler.informer import InformerCache
+from kube_downscaler.scaler import get_resources
+
+
+def make_http_error(status_code: int) -> requests.HTTPError:
+    response = Response()
+    response.status_code = status_code
+    return requests.HTTPError(response=response)
+
+
+def provider(api):
+    api_provider = MagicMock()
+    api_provider.get.return_value = api
+    return api_provider
+
+
+def deployment(name, namespace="default", resource_version="1"):
+    return {
+        "metadata": {
+            "name": name,
+            "namespace": namespace,
+            "resourceVersion": resource_version,
+        },
+        "spec": {"replicas": 1},
+    }
+
+
+def test_informer_relist_and_watch_events(monkeypatch):
+    monkeypatch.setattr("kube_downscaler.helper.MAX_RETRIES", 0, raising=False)
+    monkeypatch.setattr("kube_downscaler.helper.TOKEN_BUCKET", None, raising=False)
+    api = MagicMock()
+    response = MagicMock()
+    response.json.return_value = {
+        "metadata": {"resourceVersion": "10"},
+        "items": [deployment("deploy-1"), deployment("deploy-2")],
+    }
+    api.get.return_value = response
+
+    informer = Informer(provider(api), Deployment)
+    informer.relist()
+
+    assert informer.synced.is_set()
+    assert informer.resource_version == "10"
+    assert sorted(obj["metadata"]["name"] for obj in informer.list()) == [
+        "deploy-1",
+        "deploy-2",
+    ]
+    assert api.get.call_args.kwargs["url"] == "deployments"
+    assert "namespace" not in api.get.call_args.kwargs
+
+    informer.handle_event(
+        {"type": "MODIFIED", "object": deployment("deploy-1", resource_version="11")}
+    )
+    informer.handle_event({"type": "DELETED", "object": deployment("deploy-2")})
+    informer.handle_event(
+        {"type": "BOOKMARK", "object": {"metadata": {"resourceVersion": "15"}}}
+    )
+
+    objects = informer.list()
+    assert [obj["metadata"]["name"] for obj in objects] == ["deploy-1"]
+    assert objects[0]["metadata"]["resourceVersion"] == "11"
+    assert informer.resource_version == "15"
+
+
+def test_informer_list_returns_copies(monkeypatch):
+    informer = Informer(provider(MagicMock()), Deployment)
+    informer.handle_event({"type": "ADDED", "object": deployment("deploy-1")})
+
+    informer.list()[0]["spec"]["replicas"] = 0
+
+    assert informer.list()[0]["spec"]["replicas"] == 1
+
+
+def test_informer_watch_relists_on_gone(monkeypatch):
+    monkeypatch.setattr("kube_downscaler.helper.MAX_RETRIES", 0, raising=False)
+    monkeypatch.setattr("kube_downscaler.helper.TOKEN_BUCKET", None, raising=False)
+    api = MagicMock()
+    response = MagicMock()
+    response.iter_lines.return_value = [
+        json.dumps(
+            {"type": "ERROR", "object": {"kind": "Status", "code": 410}}
+        ).encode()
+    ]
+    api.get.return_value = response
+
+    informer = Informer(provider(api), Deployment)
+    informer.synced.set()
+    informer.last_list = float("inf")
+    informer.relist = MagicMock(side_effect=lambda: informer.stop())
+
+    informer.run()
+
+    informer.relist.assert_called_once()
+
+
+def test_informer_cache_falls_back_when_forbidden(monkeypatch):
+    monkeypatch.setattr("kube_downscaler.helper.MAX_RETRIES", 0, raising=False)
+    monkeypatch.setattr("kube_downscaler.helper.TOKEN_BUCKET", None, raising=False)
+    api = MagicMock()
+    api.get.side_effect = make_http_error(403)
+
+    cache = InformerCache(provider(api), sync_timeout=5)
+    assert cache.list(Deployment, frozenset()) is None
+    cache.stop()
+
+
+def test_get_resources_reads_from_informer_cache():
+    api = MagicMock()
+    cache = MagicMock()
+    cache.list.return_value = [deployment("deploy-1", namespace="ns-1")]
+
+    resources, excluded_namespaces = get_resources(
+        Deployment, api, frozenset(), frozenset(), informer_cache=cache
+    )
+
+    cache.list.assert_called_once_with(Deployment, frozenset())
+    api.get.assert_not_called()
+    assert [r.name for r in resources] == ["deploy-1"]
+    assert resources[0].api is api
+    assert excluded_namespaces == frozenset()
+
+
+def test_get_resources_informer_cache_namespaced():
+    cache = MagicMock()
+    cache.list.return_value = [deployment("deploy-1", namespace="ns-1")]
+
+    resources, excluded_namespaces = get_resources(
+        Deployment, MagicMock(), frozenset(["ns-1"]), frozenset(), informer_cache=cache
+    )
+
+    assert [r.namespace for r in resources] == ["ns-1"]
+    assert excluded_namespaces[0].fullmatch("ns-2")
+    assert not excluded_namespaces[0].fullmatch("ns-1")
+
+
+def test_informer_namespaced_request():
+    informer = Informer(provider(MagicMock()), Deployment, namespace="ns-1")
+    kwargs = informer.request_kwargs({"watch": "true"})
+    assert kwargs["namespace"] == "ns-1"
+    assert kwargs["version"] == "apps/v1"
+
+    informer = Informer(provider(MagicMock()), Deployment, namespace=pykube.all)
+    assert "namespace" not in informer.request_kwargs({})
+
+
+def test_informer_uses_the_current_api_client(monkeypatch):
+    monkeypatch.setattr("kube_downscaler.helper.MAX_RETRIES", 0, raising=False)
+    monkeypatch.setattr("kube_downscaler.helper.TOKEN_BUCKET", None, raising=False)
+    old_api, new_api = MagicMock(), MagicMock()
+    for api in (old_api, new_api):
+        api.get.return_value.json.return_value = {"items": []}
+    api_provider = MagicMock()
+    api_provider.get.side_effect = [old_api, new_api]
+
+    informer = Informer(api_provider, Deployment)
+    informer.relist()
+    informer.relist()
+
+    old_api.get.assert_called_once()
+    new_api.get.assert_called_once()
+
+
+def test_informer_cache_watches_cluster_wide_without_namespaces():
+    cache = InformerCache(MagicMock(), sync_timeout=0)
+    informer = MagicMock()
+    informer.forbidden = False
+    informer.list.return_value = [
+        deployment("deploy-1", namespace="ns-1"),
+        deployment("deploy-2", namespace="ns-2"),
+    ]
+    cache.get_informer = MagicMock(return_value=informer)
+
+    # e.g. the namespaces of a shard
+    objects = cache.list(Deployment, frozenset(["ns-2"]))
+
+    cache.get_informer.assert_called_once_with(Deployment, pykube.all)
+    assert [obj["metadata"]["name"] for obj in objects] == ["deploy-2"]
+
+
+def test_informer_cache_watches_the_configured_namespaces():
+    cache = InformerCache(MagicMock(), frozenset(["ns-1", "ns-2"]), sync_timeout=0)
+    informer = MagicMock()
+    informer.forbidden = False
+    informer.list.return_value = []
+    cache.get_informer = MagicMock(return_value=informer)
+
+    cache.list(Deployment, frozenset(["ns-1"]))
+    assert cache.get_informer.call_args_list[-1][0] == (Deployment, "ns-1")
+
+    cache.list(Deployment, frozenset())
+    assert sorted(call[0][1] for call in cache.get_informer.call_args_list[1:]) == [
+        "ns-1",
+        "ns-2",
+    ]
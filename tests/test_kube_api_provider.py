@@ -0,0 +1,105 @@
+from unittest.mock import MagicMock
+
+from kube_downscaler import helper
+from kube_downscaler.helper import KubeApiProvider
+from kube_downscaler.scaler import scale
+
+
+def test_api_client_reused_across_cycles(monkeypatch):
+    get_kube_api = MagicMock(side_effect=lambda timeout, pool_size: MagicMock())
+    monkeypatch.setattr("kube_downscaler.helper.get_kube_api", get_kube_api)
+    monkeypatch.setattr("kube_downscaler.helper.get_credentials_mtime", lambda: 1.0)
+
+    provider = KubeApiProvider(timeout=15, pool_size=20)
+    first = provider.get()
+    second = provider.get()
+
+    assert first is second
+    get_kube_api.assert_called_once_with(15, 20)
+
+
+def test_api_client_recreated_when_credentials_change(monkeypatch):
+    get_kube_api = MagicMock(side_effect=lambda timeout, pool_size: MagicMock())
+    monkeypatch.setattr("kube_downscaler.helper.get_kube_api", get_kube_api)
+    mtime = {"value": 1.0}
+    monkeypatch.setattr(
+        "kube_downscaler.helper.get_credentials_mtime", lambda: mtime["value"]
+    )
+
+    provider = KubeApiProvider(timeout=10)
+    first = provider.get()
+    mtime["value"] = 2.0
+    second = provider.get()
+
+    assert first is not second
+    first.session.close.assert_called_once()
+    assert get_kube_api.call_count == 2
+
+
+def test_connection_stats(monkeypatch):
+    pool = MagicMock()
+    pool.num_connections = 2
+    pool.num_requests = 10
+    adapter = MagicMock()
+    adapter.poolmanager.pools.keys.return_value = ["https://localhost:9443"]
+    adapter.poolmanager.pools.__getitem__.return_value = pool
+    api = MagicMock()
+    api.session.adapters = {"https://": adapter}
+    monkeypatch.setattr(
+        "kube_downscaler.helper.get_kube_api", MagicMock(return_value=api)
+    )
+    monkeypatch.setattr("kube_downscaler.helper.get_credentials_mtime", lambda: None)
+
+    provider = KubeApiProvider(timeout=10)
+    assert provider.connection_stats() == (0, 0)
+    provider.get()
+    assert provider.connection_stats() == (2, 8)
+
+    pool.num_requests = 15
+    assert provider.connection_stats() == (0, 5)
+
+
+def test_get_credentials_mtime_missing(monkeypatch, tmp_path):
+    monkeypatch.setattr(
+        "kube_downscaler.helper.SERVICE_ACCOUNT_TOKEN_PATH", str(tmp_path / "token")
+    )
+    monkeypatch.setenv("KUBECONFIG", str(tmp_path / "config"))
+    assert helper.get_credentials_mtime() is None
+
+    (tmp_path / "config").write_text("")
+    assert helper.get_credentials_mtime() is not None
+
+
+def test_scale_uses_api_provider(monkeypatch):
+    monkeypatch.setattr("kube_downscaler.helper.MAX_RETRIES", 0, raising=False)
+    monkeypatch.setattr("kube_downscaler.helper.TOKEN_BUCKET", None, raising=False)
+    get_kube_api = MagicMock()
+    monkeypatch.setattr("kube_downscaler.scaler.helper.get_kube_api", get_kube_api)
+    provider = MagicMock()
+    # empty lists without a continue token, the last page
+    provider.get.return_value.get.return_value.json.return_value = {
+        "metadata": {"continue": ""},
+        "items": [],
+    }
+
+    scale(
+        namespaces=frozenset({"default"}),
+        upscale_period="never",
+        downscale_period="never",
+        default_uptime="never",
+        default_downtime="always",
+        upscale_target_only=False,
+        include_resources=frozenset(["pods"]),
+        exclude_namespaces=frozenset(),
+        exclude_deployments=frozenset(),
+        dry_run=False,
+        grace_period=300,
+        admission_controller="",
+        constrained_downscaler=False,
+        api_server_timeout=10,
+        max_retries_on_conflict=0,
+        api_provider=provider,
+    )
+
+    provider.get.assert_called_once()
+    get_kube_api.assert_not_called()
@@ -0,0 +1,279 @@
+import json
+import re
+import threading
+import time
+from http.server import BaseHTTPRequestHandler
+from http.server import ThreadingHTTPServer
+
+import pykube
+import pytest
+
+from kube_downscaler import helper
+from kube_downscaler.leader import LeaderElectionConfig
+from kube_downscaler.leader import LeaderElector
+from kube_downscaler.resources.lease import Lease
+from kube_downscaler.tokenbucket import LANE_DEFAULT
+from kube_downscaler.tokenbucket import LANE_SCALE
+
+LEASE_PATH = re.compile(
+    r"^/apis/coordination.k8s.io/v1/namespaces/(?P<namespace>[^/]+)/leases(?:/(?P<name>[^/?]+))?"
+)
+
+
+def merge_patch(target, patch):
+    for key, value in patch.items():
+        if value is None:
+            target.pop(key, None)
+        elif isinstance(value, dict) and isinstance(target.get(key), dict):
+            merge_patch(target[key], value)
+        else:
+            target[key] = value
+
+
+class FakeApiServer(ThreadingHTTPServer):
+    """Minimal API server storing Leases, with the resourceVersion conflicts of the real one."""
+
+    daemon_threads = True
+
+    def __init__(self):
+        super().__init__(("127.0.0.1", 0), FakeApiHandler)
+        self.leases = {}
+        self.lock = threading.Lock()
+        self.resource_version = 0
+        self.thread = threading.Thread(target=self.serve_forever, daemon=True)
+
+    @property
+    def url(self):
+        return f"http://127.0.0.1:{self.server_address[1]}"
+
+    def holder(self, namespace="default", name="lease"):
+        with self.lock:
+            lease = self.leases.get((namespace, name))
+            return lease["spec"].get("holderIdentity") if lease else None
+
+    def next_resource_version(self):
+        self.resource_version += 1
+        return str(self.resource_version)
+
+
+class FakeApiHandler(BaseHTTPRequestHandler):
+    def log_message(self, format, *args):
+        pass
+
+    def reply(self, code, body):
+        data = json.dumps(body).encode()
+        self.send_response(code)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def status(self, code, reason):
+        self.reply(
+            code,
+            {"kind": "Status", "status": "Failure", "code": code, "message": reason},
+        )
+
+    def read_body(self):
+        return json.loads(self.rfile.read(int(self.headers["Content-Length"])))
+
+    def handle_lease(self, method):
+        match = LEASE_PATH.match(self.path)
+        if match is None:
+            return self.status(404, "not found")
+        namespace, name = match.group("namespace"), match.group("name")
+        server = self.server
+        with server.lock:
+            if method == "POST":
+                obj = self.read_body()
+                key = (namespace, obj["metadata"]["name"])
+                if key in server.leases:
+                    return self.status(409, "already exists")
+                obj["metadata"]["resourceVersion"] = server.next_resource_version()
+                server.leases[key] = obj
+                return self.reply(201, obj)
+            lease = server.leases.get((namespace, name))
+            if lease is None:
+                return self.status(404, "not found")
+            if method == "PATCH":
+                patch = self.read_body()
+                expected = patch.get("metadata", {}).get("resourceVersion")
+                if expected and expected != lease["metadata"]["resourceVersion"]:
+                    return self.status(409, "the object has been modified")
+                merge_patch(lease, patch)
+                lease["metadata"]["resourceVersion"] = server.next_resource_version()
+            return self.reply(200, lease)
+
+    def do_GET(self):
+        self.handle_lease("GET")
+
+    def do_POST(self):
+        self.handle_lease("POST")
+
+    def do_PATCH(self):
+        self.handle_lease("PATCH")
+
+
+@pytest.fixture
+def api_server():
+    server = FakeApiServer()
+    server.thread.start()
+    yield server
+    server.shutdown()
+    server.server_close()
+
+
+class ApiProvider:
+    def __init__(self, api_server):
+        self.api = pykube.HTTPClient(pykube.KubeConfig.from_url(api_server.url))
+        self.calls = 0
+
+    def get(self):
+        self.calls += 1
+        return self.api
+
+
+def elector(api_server, identity, lease_duration=1.0):
+    return LeaderElector(
+        ApiProvider(api_server),
+        LeaderElectionConfig(
+            "lease",
+            "default",
+            identity,
+            lease_duration=lease_duration,
+            renew_deadline=lease_duration / 2,
+            retry_period=0.05,
+        ),
+    )
+
+
+def wait_until(predicate, timeout):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if predicate():
+            return True
+        time.sleep(0.01)
+    return False
+
+
+def test_first_replica_acquires_and_standby_waits(api_server):
+    leader = elector(api_server, "a")
+    standby = elector(api_server, "b")
+    leader.start()
+    try:
+        assert leader.wait_for_leadership(2)
+        standby.start()
+        assert not standby.wait_for_leadership(0.5)
+        assert standby.leader == "a"
+        assert api_server.holder() == "a"
+        assert leader.status().startswith(
+            "leader a (this replica), lease renewal latency "
+        )
+        assert leader.status().endswith("ms")
+        assert standby.status().startswith("leader a, lease renewal latency n/a")
+    finally:
+        standby.stop()
+        leader.stop()
+
+
+def test_standby_takes_over_right_after_the_lease_expires(api_server):
+    leader = elector(api_server, "a")
+    standby = elector(api_server, "b")
+    leader.start()
+    assert leader.wait_for_leadership(2)
+    standby.start()
+    try:
+        assert not standby.wait_for_leadership(0.3)
+        # crash: the Lease is neither renewed nor released
+        leader.stop(release=False)
+        crashed = time.monotonic()
+        assert standby.wait_for_leadership(2)
+        # the lease lasts 1s, the takeover follows its expiry within a fraction of a second
+        assert time.monotonic() - crashed < 1.5
+        assert api_server.holder() == "b"
+        with api_server.lock:
+            assert (
+                api_server.leases[("default", "lease")]["spec"]["leaseTransitions"] == 1
+            )
+    finally:
+        standby.stop()
+
+
+def test_released_lease_is_taken_over_immediately(api_server):
+    leader = elector(api_server, "a", lease_duration=10.0)
+    standby = elector(api_server, "b", lease_duration=10.0)
+    leader.start()
+    assert leader.wait_for_leadership(2)
+    standby.start()
+    try:
+        assert not standby.wait_for_leadership(0.2)
+        leader.stop()
+        assert api_server.holder() is None
+        # far below the lease duration of 10s
+        assert standby.wait_for_leadership(2)
+        assert api_server.holder() == "b"
+    finally:
+        standby.stop()
+
+
+def test_every_renewal_gets_the_client_from_the_provider(api_server):
+    leader = elector(api_server, "a")
+    assert leader.try_acquire_or_renew(time.monotonic())
+    assert leader.try_acquire_or_renew(time.monotonic())
+    assert leader.api_provider.calls == 2
+
+
+def test_leader_steps_down_when_it_cannot_renew(api_server):
+    leader = elector(api_server, "a")
+    leader.start()
+    try:
+        assert leader.wait_for_leadership(2)
+        api_server.shutdown()
+        api_server.server_close()
+        assert wait_until(lambda: not leader.is_leader, 2)
+    finally:
+        leader.stop(release=False)
+
+
+def test_concurrent_acquisition_has_a_single_winner(api_server):
+    electors = [elector(api_server, identity) for identity in "abcd"]
+    for e in electors:
+        e.start()
+    try:
+        assert wait_until(lambda: any(e.is_leader for e in electors), 2)
+        time.sleep(0.3)
+        assert [e.config.identity for e in electors if e.is_leader] == [
+            api_server.holder()
+        ]
+    finally:
+        for e in electors:
+            e.stop()
+
+
+def test_scale_writes_stop_when_the_leadership_is_lost(monkeypatch):
+    monkeypatch.setattr("kube_downscaler.helper.MAX_RETRIES", 0, raising=False)
+    monkeypatch.setattr("kube_downscaler.helper.TOKEN_BUCKET", None, raising=False)
+    leading = threading.Event()
+    leading.set()
+    monkeypatch.setattr("kube_downscaler.helper.LEADER_CHECK", leading.is_set)
+    writes = []
+
+    def write():
+        writes.append(True)
+        return "written"
+
+    assert helper.call_with_exponential_backoff(write, lane=LANE_SCALE) == "written"
+    # the Lease is lost in the middle of the cycle
+    leading.clear()
+    with pytest.raises(helper.NotLeaderError):
+        helper.call_with_exponential_backoff(
+            write, context_msg="scaling deployment", lane=LANE_SCALE
+        )
+    assert len(writes) == 1
+    # reads keep going, e.g. for the informer cache of a standby replica
+    assert helper.call_with_exponential_backoff(write, lane=LANE_DEFAULT) == "written"
+
+
+def test_lease_resource():
+    assert Lease.version == "coordination.k8s.io/v1"
+    assert Lease.endpoint == "leases"
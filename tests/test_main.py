@@ -1,10 +1,14 @@
+import datetime
 import os.path
 import re
 from unittest.mock import MagicMock
 
 import pytest
 
+from kube_downscaler.helper import matches_time_spec
+from kube_downscaler.main import get_sleep_seconds
 from kube_downscaler.main import main
+from kube_downscaler.timespec import record_transition
 
 
 @pytest.fixture
@@ -88,3 +92,75 @@ def test_main_matching_labels(kubeconfig, monkeypatch):
     assert mock_scale.call_args.kwargs["matching_labels"] == frozenset(
         [re.compile("foo=bar"), re.compile(".*-type-.*=db")]
     )
+
+
+def test_main_sleeps_until_next_transition(kubeconfig, monkeypatch):
+    monkeypatch.setattr(os.path, "expanduser", lambda x: str(kubeconfig))
+
+    mock_shutdown = MagicMock()
+    mock_handler = MagicMock()
+    mock_handler.shutdown_now = False
+    mock_shutdown.GracefulShutdown.return_value = mock_handler
+
+    def mock_scale(*args, **kwargs):
+        mock_handler.shutdown_now = len(sleeps) == 1
+        matches_time_spec(
+            datetime.datetime.now(datetime.timezone.utc),
+            "2000-01-01T00:00:00+00:00-2100-01-01T00:00:00+00:00",
+        )
+        record_transition(
+            datetime.datetime.now(datetime.timezone.utc)
+            + datetime.timedelta(seconds=120)
+        )
+
+    sleeps = []
+    monkeypatch.setattr("kube_downscaler.main.scale", mock_scale)
+    monkeypatch.setattr("kube_downscaler.main.shutdown", mock_shutdown)
+    monkeypatch.setattr("kube_downscaler.main.time.sleep", sleeps.append)
+
+    main(["--dry-run", "--max-resync-interval=600"])
+
+    assert len(sleeps) == 1
+    assert 110 < sleeps[0] <= 120
+
+
+def test_get_sleep_seconds():
+    now = datetime.datetime.now(datetime.timezone.utc)
+    assert 290 < get_sleep_seconds(now, None, 300) <= 300
+    assert 50 < get_sleep_seconds(now, now + datetime.timedelta(seconds=60), 300) <= 60
+    assert 290 < get_sleep_seconds(now, now + datetime.timedelta(hours=1), 300) <= 300
+    assert get_sleep_seconds(now, now - datetime.timedelta(seconds=5), 300) == 1.0
+
+
+def test_main_leader_election_rejects_once(kubeconfig, monkeypatch):
+    monkeypatch.setattr(os.path, "expanduser", lambda x: str(kubeconfig))
+
+    mock_scale = MagicMock()
+    monkeypatch.setattr("kube_downscaler.main.scale", mock_scale)
+
+    main(["--dry-run", "--once", "--leader-election"])
+
+    mock_scale.assert_not_called()
+
+
+def test_main_dynamic_sharding_rejects_shard_count(kubeconfig, monkeypatch):
+    monkeypatch.setattr(os.path, "expanduser", lambda x: str(kubeconfig))
+
+    mock_scale = MagicMock()
+    monkeypatch.setattr("kube_downscaler.main.scale", mock_scale)
+
+    main(["--dry-run", "--dynamic-sharding", "--shard-count=2", "--shard-index=1"])
+
+    mock_scale.assert_not_called()
+
+
+def test_main_static_shard(kubeconfig, monkeypatch):
+    monkeypatch.setattr(os.path, "expanduser", lambda x: str(kubeconfig))
+
+    mock_scale = MagicMock()
+    monkeypatch.setattr("kube_downscaler.main.scale", mock_scale)
+
+    main(["--dry-run", "--once", "--shard-count=3", "--shard-index=2"])
+
+    shards = mock_scale.call_args[1]["shards"]
+    assert (shards.identity, shards.members()) == ("2", ["0", "1", "2"])
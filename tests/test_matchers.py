@@ -0,0 +1,156 @@
+import random
+import re
+
+import pytest
+
+from kube_downscaler.matchers import compile_label_matcher
+from kube_downscaler.matchers import compile_namespace_matcher
+from kube_downscaler.matchers import LabelMatcher
+from kube_downscaler.matchers import Matcher
+from kube_downscaler.matchers import namespace_field_selector
+
+
+def naive_matches(patterns, value):
+    return any(pattern.fullmatch(value) for pattern in patterns)
+
+
+def naive_label_matches(patterns, labels):
+    resource_labels = [f"{key}={value}" for key, value in labels.items()]
+    return any(
+        pattern.fullmatch(label) for pattern in patterns for label in resource_labels
+    )
+
+
+def test_matcher_literals_and_regexes():
+    matcher = Matcher(
+        [re.compile("kube-system"), re.compile("team-.*"), re.compile("dev|test")]
+    )
+    assert matcher.literals == frozenset(["kube-system"])
+    assert len(matcher.regexes) == 1
+    assert matcher.matches("kube-system")
+    assert matcher.matches("team-a")
+    assert matcher.matches("dev")
+    assert matcher.matches("test")
+    assert not matcher.matches("kube-system2")
+    assert not matcher.matches("my-team-a")
+    assert not matcher.matches("devtest")
+    assert Matcher([re.compile(r"app\.kubernetes\.io")]).literals == frozenset(
+        ["app.kubernetes.io"]
+    )
+    # memoized
+    assert matcher.memo["team-a"] is True
+
+
+def test_matcher_keeps_patterns_with_global_inline_flags():
+    matcher = Matcher([re.compile("(?i)prod"), re.compile("stag.*")])
+    assert len(matcher.regexes) == 2
+    assert matcher.matches("PROD")
+    assert matcher.matches("staging")
+    assert not matcher.matches("dev")
+
+
+def test_matcher_negative_lookahead():
+    # the pattern built for --namespace
+    matcher = Matcher([re.compile(r"^(?!default$|app$).+")])
+    assert not matcher.matches("default")
+    assert not matcher.matches("app")
+    assert matcher.matches("other")
+
+
+def test_label_matcher():
+    matcher = LabelMatcher([re.compile("app=foo"), re.compile("team=.*")])
+    assert matcher.enabled
+    assert matcher.matches({"app": "foo"})
+    assert matcher.matches({"app": "bar", "team": "a"})
+    assert not matcher.matches({"app": "bar"})
+    assert not matcher.matches({})
+    assert not matcher.matches(None)
+    assert len(matcher.memo) == 4
+
+
+def test_label_matcher_without_filter():
+    matcher = LabelMatcher([re.compile("")])
+    assert not matcher.enabled
+    assert matcher.matches({"app": "bar"})
+
+
+def test_matchers_compiled_once():
+    patterns = [re.compile("a"), re.compile("b.*")]
+    assert compile_namespace_matcher(patterns) is compile_namespace_matcher(
+        frozenset(reversed(patterns))
+    )
+    assert compile_label_matcher(patterns) is compile_label_matcher(frozenset(patterns))
+
+
+@pytest.mark.parametrize("seed", range(5))
+def test_matcher_equivalent_to_naive_loop(seed):
+    rnd = random.Random(seed)
+    words = ["app", "team", "tier", "web", "db", "a", "b", "prod", "dev"]
+    patterns = [
+        re.compile(rnd.choice(["", ".*", "[ab]", "d.", "(web|db)"]) + rnd.choice(words))
+        for _ in range(rnd.randint(1, 8))
+    ] + [re.compile(rnd.choice(words) + "=" + rnd.choice(words))]
+    matcher = Matcher(patterns)
+    label_matcher = LabelMatcher(patterns)
+    for _ in range(500):
+        value = "".join(rnd.choice(words) for _ in range(rnd.randint(1, 3)))
+        assert matcher.matches(value) == naive_matches(patterns, value)
+        labels = {
+            rnd.choice(words): rnd.choice(words) for _ in range(rnd.randint(0, 4))
+        }
+        assert label_matcher.matches(labels) == naive_label_matches(patterns, labels)
+
+
+def test_label_matcher_benchmark(benchmark, record_property):
+    """Microbenchmark: 20 label patterns against 5k resources sharing 50 label sets."""
+    patterns = [re.compile(f"app=service-{i}") for i in range(10)] + [
+        re.compile(f"team=team-{i}-.*") for i in range(10)
+    ]
+    label_sets = [
+        {
+            "app": f"service-{i}",
+            "team": f"other-{i}",
+            "tier": "backend",
+            "version": f"v{i}",
+            "release": "stable",
+        }
+        for i in range(50)
+    ]
+    resources = [dict(label_sets[i % len(label_sets)]) for i in range(5000)]
+
+    matcher = LabelMatcher(patterns)
+
+    assert [matcher.matches(labels) for labels in resources] == [
+        naive_label_matches(patterns, labels) for labels in resources
+    ]
+    naive = benchmark(
+        "naive",
+        lambda: [naive_label_matches(patterns, labels) for labels in resources],
+    )
+
+    def compiled_matches():
+        # a fresh matcher every run, its memo is built from scratch
+        compiled_matcher = LabelMatcher(patterns)
+        return [compiled_matcher.matches(labels) for labels in resources]
+
+    compiled = benchmark("compiled", compiled_matches)
+    record_property("speedup", naive / compiled)
+
+
+@pytest.mark.parametrize(
+    "patterns,expected",
+    [
+        ([""], None),
+        (["kube-system"], "metadata.namespace!=kube-system"),
+        (
+            ["kube-system", "team-.*", "default"],
+            "metadata.namespace!=default,metadata.namespace!=kube-system",
+        ),
+        (["team-.*"], None),
+        (["Not_A_Namespace"], None),
+    ],
+)
+def test_namespace_field_selector(patterns, expected):
+    assert (
+        namespace_field_selector(frozenset(re.compile(p) for p in patterns)) == expected
+    )
@@ -0,0 +1,119 @@
+import datetime
+from unittest.mock import MagicMock
+
+import pytest
+from pykube import Namespace
+
+from kube_downscaler import scaler
+from kube_downscaler.scaler import get_namespace_policy
+from kube_downscaler.scaler import NamespaceContextTable
+from kube_downscaler.scaler import prune_namespace_policies
+
+NOW = datetime.datetime(2024, 1, 1, 12, 0, tzinfo=datetime.timezone.utc)  # Monday
+
+
+@pytest.fixture(autouse=True)
+def namespace_policies(monkeypatch):
+    monkeypatch.setattr(scaler, "NAMESPACE_POLICIES", {})
+
+
+def namespace(name, annotations, resource_version="1"):
+    metadata = {"name": name, "uid": f"uid-{name}", "annotations": annotations}
+    if resource_version is not None:
+        metadata["resourceVersion"] = resource_version
+    return Namespace(MagicMock(), {"metadata": metadata})
+
+
+def make_table(forced_uptime=False):
+    return NamespaceContextTable(
+        NOW,
+        "never",
+        "never",
+        "always",
+        "never",
+        forced_uptime,
+        downtime_replicas=1,
+        is_downtime_replicas_percentage=False,
+    )
+
+
+def test_namespace_context_defaults():
+    context = make_table().context_for("default", namespace("default", {}))
+    assert context.uptime == "always"
+    assert context.downtime == "never"
+    assert context.upscale_period == "never"
+    assert context.downscale_period == "never"
+    assert not context.forced_uptime
+    assert not context.forced_downtime
+    assert context.downtime_replicas == 1
+    assert not context.is_downtime_replicas_percentage
+    assert not context.excluded
+
+
+def test_namespace_context_annotations():
+    ns = namespace(
+        "default",
+        {
+            "downscaler/uptime": "Mon-Fri 08:00-18:00 UTC",
+            "downscaler/downtime-replicas": "50%",
+            "downscaler/force-downtime": "Mon-Mon 11:00-13:00 UTC",
+            "downscaler/exclude-until": "2030-01-01",
+        },
+    )
+    context = make_table(forced_uptime=True).context_for("default", ns)
+    assert context.uptime == "Mon-Fri 08:00-18:00 UTC"
+    assert context.downtime_replicas == 50
+    assert context.is_downtime_replicas_percentage
+    assert context.forced_uptime
+    assert context.forced_downtime
+    assert context.excluded
+
+
+def test_namespace_context_built_once_per_cycle(monkeypatch):
+    parse = MagicMock(wraps=scaler.parse_namespace_policy)
+    monkeypatch.setattr(scaler, "parse_namespace_policy", parse)
+    table = make_table()
+    ns = namespace("default", {"downscaler/downtime": "always"})
+    first = table.context_for("default", ns)
+    assert table.context_for("default", ns) is first
+    assert parse.call_count == 1
+    assert table.summary() == "1 namespaces, 1 parsed, 0 cached"
+
+
+def test_namespace_policy_cached_by_resource_version(monkeypatch):
+    parse = MagicMock(wraps=scaler.parse_namespace_policy)
+    monkeypatch.setattr(scaler, "parse_namespace_policy", parse)
+
+    policy, cached = get_namespace_policy(
+        "default", namespace("default", {"downscaler/downtime": "always"})
+    )
+    assert not cached
+    assert policy.downtime == "always"
+
+    # the next cycle reuses the policy of the unchanged Namespace
+    table = make_table()
+    context = table.context_for(
+        "default", namespace("default", {"downscaler/downtime": "always"})
+    )
+    assert context.downtime == "always"
+    assert parse.call_count == 1
+    assert table.summary() == "1 namespaces, 0 parsed, 1 cached"
+
+    policy, cached = get_namespace_policy(
+        "default", namespace("default", {"downscaler/downtime": "never"}, "2")
+    )
+    assert not cached
+    assert policy.downtime == "never"
+    assert parse.call_count == 2
+
+
+def test_namespace_policy_without_resource_version_not_cached():
+    get_namespace_policy("default", namespace("default", {}, None))
+    assert scaler.NAMESPACE_POLICIES == {}
+
+
+def test_prune_namespace_policies():
+    get_namespace_policy("a", namespace("a", {}))
+    get_namespace_policy("b", namespace("b", {}))
+    prune_namespace_policies({"b": None})
+    assert list(scaler.NAMESPACE_POLICIES) == ["b"]
@@ -0,0 +1,230 @@
+import copy
+import datetime
+import json
+from unittest.mock import MagicMock
+
+import pytest
+from pykube import Deployment
+from pykube.exceptions import HTTPError
+
+from kube_downscaler.plan import CLEAR_ORIGINAL_REPLICAS
+from kube_downscaler.plan import Decision
+from kube_downscaler.plan import EXCLUDED
+from kube_downscaler.plan import FAILED
+from kube_downscaler.plan import NO_CHANGE
+from kube_downscaler.plan import Plan
+from kube_downscaler.plan import SCALE_DOWN
+from kube_downscaler.plan import SCALE_UP
+from kube_downscaler.plan import ScalingConfig
+from kube_downscaler.plan import WITHIN_GRACE_PERIOD
+from kube_downscaler.scaler import decide
+from kube_downscaler.scaler import execute_plan
+from kube_downscaler.scaler import ORIGINAL_REPLICAS_ANNOTATION
+from kube_downscaler.scaler import plan
+
+NOW = datetime.datetime(2024, 1, 1, 12, 0, tzinfo=datetime.timezone.utc)
+DOWNTIME = ScalingConfig("never", "never", "never", "always")
+UPTIME = ScalingConfig("never", "never", "always", "never")
+
+
+pytestmark = pytest.mark.usefixtures("no_retries")
+
+
+def deployment(api, name, replicas, annotations=None, namespace="default"):
+    return Deployment(
+        api,
+        {
+            "metadata": {
+                "name": name,
+                "namespace": namespace,
+                "creationTimestamp": "2023-01-01T00:00:00Z",
+                "annotations": dict(annotations or {}),
+                "labels": {},
+            },
+            "spec": {"replicas": replicas},
+        },
+    )
+
+
+@pytest.mark.parametrize(
+    "config,replicas,annotations,operation",
+    [
+        (DOWNTIME, 3, {}, SCALE_DOWN),
+        (DOWNTIME, 0, {}, NO_CHANGE),
+        (DOWNTIME, 3, {"downscaler/exclude": "true"}, EXCLUDED),
+        (UPTIME, 0, {ORIGINAL_REPLICAS_ANNOTATION: "3"}, SCALE_UP),
+        (UPTIME, 3, {ORIGINAL_REPLICAS_ANNOTATION: "3"}, CLEAR_ORIGINAL_REPLICAS),
+        (UPTIME, 3, {}, NO_CHANGE),
+        (DOWNTIME._replace(grace_period=10**10), 3, {}, WITHIN_GRACE_PERIOD),
+    ],
+)
+def test_decide(config, replicas, annotations, operation):
+    api = MagicMock()
+    resource = deployment(api, "app", replicas, annotations)
+    obj = copy.deepcopy(resource.obj)
+    decision = decide(resource, NOW, config)
+    assert decision.operation == operation
+    assert decision.key == ("Deployment", "default", "app")
+    # deciding neither changes the resource nor calls the API server
+    assert resource.obj == obj
+    assert api.mock_calls == []
+
+
+def test_decide_targets():
+    api = MagicMock()
+    down = decide(
+        deployment(api, "app", 3, {"downscaler/downtime-replicas": "1"}), NOW, DOWNTIME
+    )
+    assert (down.replicas, down.target_replicas) == (3, 1)
+    up = decide(
+        deployment(api, "app", 1, {ORIGINAL_REPLICAS_ANNOTATION: "3"}),
+        NOW,
+        UPTIME._replace(downtime_replicas=1),
+    )
+    assert (up.operation, up.replicas, up.target_replicas) == (SCALE_UP, 1, 3)
+
+
+def test_plan_is_serializable():
+    api = MagicMock()
+    snapshot = [
+        deployment(api, "a", 3),
+        deployment(api, "b", 0),
+        deployment(api, "c", 3, {"downscaler/downtime-replicas": "invalid"}),
+    ]
+    scaling_plan = plan(snapshot, NOW, DOWNTIME)
+    assert [d.operation for d in scaling_plan.decisions] == [
+        SCALE_DOWN,
+        NO_CHANGE,
+        FAILED,
+    ]
+    assert scaling_plan.counts() == {SCALE_DOWN: 1, NO_CHANGE: 1, FAILED: 1}
+    assert [d.name for d in scaling_plan.actions] == ["a"]
+    data = json.loads(json.dumps(scaling_plan.to_dict()))
+    assert Plan.from_dict(data) == scaling_plan
+
+
+def test_execute_plan():
+    api = MagicMock()
+    snapshot = [
+        deployment(api, "a", 3),
+        deployment(api, "b", 0),
+        deployment(api, "c", 2, namespace="other"),
+    ]
+    scaling_plan = plan(snapshot, NOW, DOWNTIME)
+    map_calls = []
+
+    def map_func(func, items, workers):
+        map_calls.append((len(items), workers))
+        return [func(item) for item in items]
+
+    written = execute_plan(
+        scaling_plan, snapshot, Deployment, False, workers=4, map_func=map_func
+    )
+
+    assert written == 2
+    assert map_calls == [(2, 4)]
+    assert api.patch.call_count == 2
+    patches = [json.loads(call[1]["data"]) for call in api.patch.call_args_list]
+    assert [p["spec"]["replicas"] for p in patches] == [0, 0]
+    assert [
+        p["metadata"]["annotations"][ORIGINAL_REPLICAS_ANNOTATION] for p in patches
+    ] == ["3", "2"]
+
+
+def test_execute_plan_dry_run():
+    api = MagicMock()
+    snapshot = [deployment(api, "a", 3)]
+    assert execute_plan(plan(snapshot, NOW, DOWNTIME), snapshot, Deployment, True) == 1
+    api.patch.assert_not_called()
+
+
+def test_execute_plan_from_serialized_plan():
+    api = MagicMock()
+    snapshot = [deployment(api, "a", 3)]
+    scaling_plan = Plan.from_dict(
+        json.loads(json.dumps(plan(snapshot, NOW, DOWNTIME).to_dict()))
+    )
+    assert scaling_plan.decisions[0] == Decision(
+        "Deployment",
+        "default",
+        "a",
+        SCALE_DOWN,
+        replicas=3,
+        target_replicas=0,
+        uptime="never",
+        downtime="always",
+    )
+    assert execute_plan(scaling_plan, snapshot, Deployment, False) == 1
+    assert json.loads(api.patch.call_args[1]["data"])["spec"]["replicas"] == 0
+
+
+def test_execute_plan_retries_conflicts(monkeypatch):
+    api = MagicMock()
+    api.raise_for_status.side_effect = [
+        HTTPError(409, "the object has been modified"),
+        None,
+    ]
+    snapshot = [deployment(api, "a", 3)]
+    # modified meanwhile: scaled up to 4 replicas
+    refreshed = deployment(api, "a", 4)
+    api.patch.return_value.json.return_value = copy.deepcopy(refreshed.obj)
+    get_resource = MagicMock(return_value=refreshed)
+    monkeypatch.setattr("kube_downscaler.scaler.get_resource", get_resource)
+
+    written = execute_plan(
+        plan(snapshot, NOW, DOWNTIME),
+        snapshot,
+        Deployment,
+        False,
+        max_retries_on_conflict=1,
+        decide_again=lambda resource: decide(resource, NOW, DOWNTIME),
+    )
+
+    assert written == 1
+    get_resource.assert_called_once_with(Deployment, api, "default", "a")
+    assert api.patch.call_count == 2
+    patch = json.loads(api.patch.call_args[1]["data"])
+    assert patch["metadata"]["annotations"][ORIGINAL_REPLICAS_ANNOTATION] == "4"
+
+
+def test_execute_plan_gives_up_on_conflicts_without_retries(monkeypatch):
+    api = MagicMock()
+    api.raise_for_status.side_effect = HTTPError(409, "the object has been modified")
+    snapshot = [deployment(api, "a", 3)]
+    get_resource = MagicMock()
+    monkeypatch.setattr("kube_downscaler.scaler.get_resource", get_resource)
+
+    assert execute_plan(plan(snapshot, NOW, DOWNTIME), snapshot, Deployment, False) == 0
+    get_resource.assert_not_called()
+    assert api.patch.call_count == 1
+
+
+def test_execute_plan_stops_when_the_leadership_is_lost(monkeypatch):
+    monkeypatch.setattr("kube_downscaler.helper.LEADER_CHECK", lambda: False)
+    api = MagicMock()
+    snapshot = [deployment(api, "a", 3), deployment(api, "b", 2)]
+    assert execute_plan(plan(snapshot, NOW, DOWNTIME), snapshot, Deployment, False) == 0
+    api.patch.assert_not_called()
+
+
+def test_plan_benchmark(benchmark, record_property):
+    """Microbenchmark: plan 100k synthetic resources without any HTTP call."""
+    api = MagicMock()
+    snapshot = [
+        deployment(
+            api,
+            f"app-{i}",
+            i % 4,
+            {ORIGINAL_REPLICAS_ANNOTATION: "2"} if i % 3 == 0 else {},
+            namespace=f"ns-{i % 100}",
+        )
+        for i in range(100000)
+    ]
+    plans = []
+    seconds = benchmark(
+        "plan", lambda: plans.append(plan(snapshot, NOW, UPTIME)), repeat=1
+    )
+    record_property("decisions_per_second", len(snapshot) / seconds)
+    [scaling_plan] = plans
+    assert len(scaling_plan.decisions) == len(snapshot)
+    assert api.mock_calls == []
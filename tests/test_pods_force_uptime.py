@@ -1,37 +1,120 @@
 from unittest.mock import MagicMock
-from unittest.mock import patch
+
+import pytest
 
 from kube_downscaler.scaler import FORCE_UPTIME_ANNOTATION
+from kube_downscaler.scaler import PARTIAL_OBJECT_METADATA_ACCEPT
 from kube_downscaler.scaler import pods_force_uptime
+from kube_downscaler.scaler import pods_force_uptime_needed
+from kube_downscaler.scaler import RUNNING_PODS_FIELD_SELECTOR
+
+
+pytestmark = pytest.mark.usefixtures("no_retries")
+
+
+def pod(name, annotations, phase=None):
+    obj = {
+        "metadata": {"name": name, "namespace": "default", "annotations": annotations}
+    }
+    if phase:
+        obj["status"] = {"phase": phase}
+    return obj
+
 
+def api_returning(*pages, paginated=True):
+    api = MagicMock()
+    responses = []
+    for i, items in enumerate(pages):
+        response = MagicMock()
+        metadata = {}
+        if paginated and i < len(pages) - 1:
+            metadata["continue"] = f"token-{i}"
+        response.json.return_value = {"metadata": metadata, "items": items}
+        responses.append(response)
+    api.get.side_effect = responses
+    return api
 
-@patch("pykube.Pod")
-@patch("pykube.HTTPClient")
-def test_pods_force_uptime_non_running(c, p):
-    pod1 = MagicMock()
-    pod1.obj = {"status": {"phase": "Succeeded"}}
-    pod1.annotations = {FORCE_UPTIME_ANNOTATION: "true"}
-    pod2 = MagicMock()
-    pod2.obj = {"status": {"phase": "Succeeded"}}
-    pod2.annotations = {FORCE_UPTIME_ANNOTATION: "true"}
-    p.objects.return_value.filter.return_value = [pod1, pod2]
-    force = pods_force_uptime(c, namespace="")
+
+def test_pods_force_uptime_non_running():
+    api = api_returning(
+        [
+            pod("pod-1", {FORCE_UPTIME_ANNOTATION: "true"}, phase="Succeeded"),
+            pod("pod-2", {FORCE_UPTIME_ANNOTATION: "true"}, phase="Succeeded"),
+        ]
+    )
+    force = pods_force_uptime(api, namespace="")
     assert not force
 
 
-@patch("pykube.Pod")
-@patch("pykube.HTTPClient")
-def test_pods_force_uptime(c, p):
-    pod1 = MagicMock()
-    pod1.obj = {"status": {"phase": "Running"}}
-    pod1.annotations = {FORCE_UPTIME_ANNOTATION: "true"}
-    p.objects.return_value.filter.return_value = [pod1]
-    force = pods_force_uptime(c, namespace="")
+def test_pods_force_uptime():
+    api = api_returning([pod("pod-1", {FORCE_UPTIME_ANNOTATION: "true"})])
+    force = pods_force_uptime(api, namespace="")
+    assert force
+
+    kwargs = api.get.call_args.kwargs
+    assert kwargs["url"] == "pods"
+    assert kwargs["params"]["fieldSelector"] == RUNNING_PODS_FIELD_SELECTOR
+    assert kwargs["headers"]["Accept"] == PARTIAL_OBJECT_METADATA_ACCEPT
+    assert "namespace" not in kwargs
+
+
+def test_pods_force_uptime_stops_at_first_match():
+    api = api_returning(
+        [pod("pod-1", {}), pod("pod-2", {FORCE_UPTIME_ANNOTATION: "true"})],
+        [pod("pod-3", {})],
+    )
+    force = pods_force_uptime(api, namespace="")
     assert force
+    assert api.get.call_count == 1
+
+
+def test_pods_force_uptime_namespaced():
+    api = api_returning([pod("pod-1", {})], [pod("pod-2", {})], paginated=False)
+    force = pods_force_uptime(api, namespace=frozenset(["ns-1", "ns-2"]))
+    assert not force
+    assert sorted(call.kwargs["namespace"] for call in api.get.call_args_list) == [
+        "ns-1",
+        "ns-2",
+    ]
+
+
+def test_pods_force_uptime_namespaced_concurrent(monkeypatch):
+    monkeypatch.setattr("kube_downscaler.helper.LIST_CONCURRENCY", 2)
+    api = MagicMock()
+
+    def get(url, version, namespace, **kwargs):
+        annotations = {FORCE_UPTIME_ANNOTATION: "true"} if namespace == "ns-2" else {}
+        response = MagicMock()
+        response.json.return_value = {
+            "metadata": {"continue": ""},
+            "items": [pod(f"pod-{namespace}", annotations)],
+        }
+        return response
+
+    api.get = MagicMock(side_effect=get)
+
+    force = pods_force_uptime(
+        api, namespace=frozenset(["ns-1", "ns-2", "ns-3", "ns-4"])
+    )
 
-    pod1 = MagicMock()
-    pod1.obj = {"status": {"phase": "Running"}}
-    pod1.annotations = {FORCE_UPTIME_ANNOTATION: "true"}
-    p.objects.return_value.filter.return_value = [pod1]
-    force = pods_force_uptime(c, namespace="")
     assert force
+    # ns-1 and ns-2 are listed together, the next chunk is not needed
+    assert sorted(call.kwargs["namespace"] for call in api.get.call_args_list) == [
+        "ns-1",
+        "ns-2",
+    ]
+
+
+def test_pods_force_uptime_needed():
+    annotated = MagicMock()
+    annotated.annotations = {FORCE_UPTIME_ANNOTATION: "false"}
+    plain = MagicMock()
+    plain.annotations = {}
+
+    assert not pods_force_uptime_needed(frozenset(), {"ns-1": annotated})
+    assert pods_force_uptime_needed(frozenset(), {"ns-1": annotated, "ns-2": plain})
+    # no namespaces could be read, keep the pods check
+    assert pods_force_uptime_needed(frozenset(), {})
+    # a namespace in scope could not be read, keep the pods check
+    assert pods_force_uptime_needed(frozenset(["ns-1", "ns-2"]), {"ns-1": annotated})
+    assert not pods_force_uptime_needed(frozenset(["ns-1"]), {"ns-1": annotated})
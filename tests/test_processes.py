@@ -0,0 +1,211 @@
+import datetime
+import json
+import logging
+import os
+import signal
+from unittest.mock import MagicMock
+
+import pytest
+
+from kube_downscaler import helper
+from kube_downscaler.plan import NO_CHANGE
+from kube_downscaler.plan import SCALE_DOWN
+from kube_downscaler.processes import evaluate_shard
+from kube_downscaler.processes import other_namespaces_patterns
+from kube_downscaler.processes import ProcessShards
+from kube_downscaler.processes import shard_namespaces
+from kube_downscaler.processes import ShardTask
+from kube_downscaler.processes import WorkerSettings
+from kube_downscaler.scaler import NamespaceContext
+
+NOW = datetime.datetime(2024, 1, 1, 12, 0, tzinfo=datetime.timezone.utc)
+DOWNTIME = NamespaceContext(
+    "never", "always", "never", "never", False, False, 0, False, False
+)
+
+
+pytestmark = pytest.mark.usefixtures("no_retries")
+
+
+def task(contexts, kinds=("deployments",)):
+    return ShardTask(
+        NOW,
+        kinds,
+        contexts,
+        frozenset(),
+        frozenset(),
+        False,
+        0,
+        None,
+        False,
+        False,
+        True,
+        1,
+    )
+
+
+def test_shard_namespaces():
+    assert shard_namespaces(["d", "a", "c", "b", "e"], 2) == [
+        ["a", "c", "e"],
+        ["b", "d"],
+    ]
+    assert shard_namespaces(["a"], 4) == [["a"]]
+    assert shard_namespaces([], 4) == []
+
+
+def test_worker_settings_split_rate_limit(monkeypatch):
+    monkeypatch.setattr("kube_downscaler.helper.RATE_LIMITER", None)
+    helper.initialize_token_bucket(20, 40, {"list": 2})
+    settings = WorkerSettings.from_parent(4, 10, 5)
+    assert (settings.qps, settings.burst) == (5, 10)
+    assert settings.request_costs == {"list": 2}
+    assert settings.api_server_timeout == 10
+
+
+def test_evaluate_shard(monkeypatch):
+    api = MagicMock()
+    monkeypatch.setattr(
+        "kube_downscaler.processes.API_PROVIDER", MagicMock(get=lambda: api)
+    )
+    listed = []
+
+    def get(url, version, namespace, **kwargs):
+        listed.append(namespace)
+        response = MagicMock()
+        response.json.return_value = {
+            "items": [
+                {
+                    "metadata": {
+                        "name": f"deploy-{replicas}",
+                        "namespace": namespace,
+                        "creationTimestamp": "2019-03-01T16:38:00Z",
+                    },
+                    "spec": {"replicas": replicas},
+                }
+                for replicas in (0, 2)
+            ]
+        }
+        return response
+
+    api.get = get
+
+    result = evaluate_shard(task({"ns-a": DOWNTIME, "ns-b": DOWNTIME}))
+
+    assert sorted(listed) == ["ns-a", "ns-b"]
+    assert result.namespaces == 2
+    assert result.counts == {SCALE_DOWN: 2, NO_CHANGE: 2}
+    assert result.written == 2
+    assert [(d.namespace, d.name) for d in result.actions] == [
+        ("ns-a", "deploy-2"),
+        ("ns-b", "deploy-2"),
+    ]
+    patches = [json.loads(call[1]["data"]) for call in api.patch.call_args_list]
+    assert [
+        [op["value"] for op in p if op["path"] == "/spec/replicas"] for p in patches
+    ] == [[2, 0], [2, 0]]
+
+
+def test_evaluate_shard_cluster_wide(monkeypatch):
+    api = MagicMock()
+    monkeypatch.setattr(
+        "kube_downscaler.processes.API_PROVIDER", MagicMock(get=lambda: api)
+    )
+    listed = []
+
+    def get(**kwargs):
+        listed.append(kwargs.get("namespace"))
+        response = MagicMock()
+        response.json.return_value = {
+            "items": [
+                {
+                    "metadata": {
+                        "name": "deploy",
+                        "namespace": namespace,
+                        "creationTimestamp": "2019-03-01T16:38:00Z",
+                    },
+                    "spec": {"replicas": 2},
+                }
+                for namespace in ("ns-a", "ns-b", "ns-other-shard")
+            ]
+        }
+        return response
+
+    api.get = get
+
+    result = evaluate_shard(
+        task({"ns-a": DOWNTIME, "ns-b": DOWNTIME})._replace(cluster_wide=True)
+    )
+
+    # a single list call for the shard, the namespace of the other shard is left alone
+    assert len(listed) == 1
+    assert [(d.namespace, d.name) for d in result.actions] == [
+        ("ns-a", "deploy"),
+        ("ns-b", "deploy"),
+    ]
+    assert result.written == 2
+
+
+def test_other_namespaces_patterns():
+    [pattern] = other_namespaces_patterns(frozenset(["ns-a", "ns.b"]))
+    assert not pattern.fullmatch("ns-a")
+    assert not pattern.fullmatch("ns.b")
+    assert pattern.fullmatch("nsxb")
+    assert pattern.fullmatch("ns-a-2")
+
+
+def test_evaluate_shard_without_namespaces_calls_no_api(monkeypatch):
+    monkeypatch.setattr("kube_downscaler.processes.API_PROVIDER", None)
+    result = evaluate_shard(task({}))
+    assert result.counts == {}
+    assert result.actions == ()
+
+
+def test_process_shards_merge_logs(caplog):
+    caplog.set_level(logging.DEBUG)
+    settings = WorkerSettings(10, 1, 0, 0, {}, False, 0, 0, 0, 0, 1, logging.DEBUG)
+    shard_pool = ProcessShards(2, settings)
+    try:
+        results = shard_pool.autoscale(
+            NOW,
+            # no kinds: the worker processes have no cluster to talk to
+            [],
+            {"ns-a": DOWNTIME, "ns-b": DOWNTIME, "ns-c": DOWNTIME},
+            frozenset(),
+            frozenset(),
+            False,
+            0,
+            None,
+            False,
+            False,
+            False,
+            1,
+        )
+    finally:
+        shard_pool.stop()
+    assert sorted(result.namespaces for result in results) == [1, 2]
+    assert "Worker processes in this cycle" in caplog.text
+    # records of the worker processes reach the handlers of this process
+    worker_records = [r for r in caplog.records if r.processName != "MainProcess"]
+    assert sorted(r.getMessage() for r in worker_records) == [
+        "Evaluating 1 namespaces for no kinds",
+        "Evaluating 2 namespaces for no kinds",
+    ]
+
+
+def test_process_shards_recover_from_killed_worker(caplog):
+    settings = WorkerSettings(10, 1, 0, 0, {}, False, 0, 0, 0, 0, 1, logging.INFO)
+    shard_pool = ProcessShards(2, settings)
+    tasks = [task({"ns-a": DOWNTIME}, kinds=()), task({"ns-b": DOWNTIME}, kinds=())]
+    try:
+        shard_pool.run(tasks)
+        broken_executor = shard_pool.executor
+        for process in list(broken_executor._processes.values()):
+            os.kill(process.pid, signal.SIGKILL)
+            process.join()
+
+        results = shard_pool.run(tasks)
+    finally:
+        shard_pool.stop()
+    assert shard_pool.executor is not broken_executor
+    assert [result.namespaces for result in results] == [1, 1]
+    assert "Pool of worker processes is broken" in caplog.text
@@ -0,0 +1,172 @@
+import datetime
+import json
+from unittest.mock import MagicMock
+
+import pytest
+from pykube import Deployment
+
+from kube_downscaler.plan import ScalingConfig
+from kube_downscaler.reconcile import ReconcileState
+from kube_downscaler.scaler import autoscale_resource
+from kube_downscaler.schedule import ScheduleTable
+from kube_downscaler.timespec import track_transitions
+
+NOW = datetime.datetime(2024, 1, 1, 12, 0, tzinfo=datetime.timezone.utc)
+CONFIG = ScalingConfig("never", "never", "always", "never")
+
+
+pytestmark = pytest.mark.usefixtures("no_retries")
+
+
+def deployment(api, name="app", replicas=3, resource_version="1", annotations=None):
+    return Deployment(
+        api,
+        {
+            "metadata": {
+                "name": name,
+                "namespace": "default",
+                "resourceVersion": resource_version,
+                "creationTimestamp": "2023-01-01T00:00:00Z",
+                "annotations": dict(annotations or {}),
+                "labels": {},
+            },
+            "spec": {"replicas": replicas},
+        },
+    )
+
+
+def incremental_state(resource, valid_until=None):
+    state = ReconcileState(3600)
+    state.start_cycle(NOW)
+    assert not state.should_skip(resource, CONFIG, NOW)
+    state.record(resource, CONFIG, valid_until)
+    state.start_cycle(NOW + datetime.timedelta(seconds=60))
+    return state
+
+
+def test_skip_unchanged_resource():
+    resource = deployment(MagicMock())
+    state = incremental_state(resource)
+    assert state.should_skip(resource, CONFIG, NOW)
+    assert state.summary() == "0 evaluated, 1 skipped (incremental)"
+
+
+@pytest.mark.parametrize(
+    "resource_version,config",
+    [
+        ("2", CONFIG),
+        ("1", CONFIG._replace(default_uptime="never", default_downtime="always")),
+        ("1", CONFIG._replace(forced_downtime=True)),
+    ],
+)
+def test_reevaluate_changed_resource_or_config(resource_version, config):
+    api = MagicMock()
+    state = incremental_state(deployment(api))
+    resource = deployment(api, resource_version=resource_version)
+    assert not state.should_skip(resource, config, NOW)
+    assert state.summary() == "1 evaluated, 0 skipped (incremental)"
+
+
+def test_reevaluate_after_schedule_boundary():
+    resource = deployment(MagicMock())
+    boundary = NOW + datetime.timedelta(minutes=30)
+    state = incremental_state(resource, valid_until=boundary)
+    with track_transitions() as transitions:
+        assert state.should_skip(resource, CONFIG, NOW)
+    # skipped resources still wake up the main loop at their boundary
+    assert transitions.next_transition == boundary
+    assert not state.should_skip(resource, CONFIG, boundary)
+
+
+def test_full_resync():
+    resource = deployment(MagicMock())
+    state = incremental_state(resource)
+    state.start_cycle(NOW + datetime.timedelta(hours=1))
+    assert not state.should_skip(resource, CONFIG, NOW)
+    assert state.summary() == "1 evaluated, 0 skipped (full resync)"
+
+
+def test_end_cycle_forgets_unseen_resources():
+    api = MagicMock()
+    state = incremental_state(deployment(api, "a"))
+    state.record(deployment(api, "b"), CONFIG, None)
+    assert state.should_skip(deployment(api, "b"), CONFIG, NOW)
+    state.end_cycle()
+    assert list(state.evaluations) == [("Deployment", "default", "b")]
+
+
+def scale(resource, state, default_uptime, default_downtime, now=NOW):
+    autoscale_resource(
+        resource,
+        "never",
+        "never",
+        default_uptime,
+        default_downtime,
+        False,
+        False,
+        False,
+        0,
+        resource.api,
+        Deployment,
+        False,
+        now,
+        reconcile_state=state,
+    )
+
+
+def test_autoscale_resource_skips_unchanged_resource():
+    api = MagicMock()
+    state = ReconcileState(3600)
+    state.start_cycle(NOW)
+    scale(deployment(api), state, "always", "never")
+    assert state.summary() == "1 evaluated, 0 skipped (full resync)"
+
+    state.start_cycle(NOW + datetime.timedelta(seconds=60))
+    scale(deployment(api), state, "always", "never")
+    assert state.summary() == "0 evaluated, 1 skipped (incremental)"
+    api.patch.assert_not_called()
+
+    # a changed schedule is picked up although the resource did not change
+    scale(deployment(api), state, "never", "always")
+    assert json.loads(api.patch.call_args[1]["data"])["spec"]["replicas"] == 0
+
+
+def test_autoscale_resource_reevaluates_scaled_resource():
+    api = MagicMock()
+    state = ReconcileState(3600)
+    state.start_cycle(NOW)
+    scale(deployment(api), state, "never", "always")
+    assert api.patch.call_count == 1
+    assert state.evaluations == {}
+
+    state.start_cycle(NOW + datetime.timedelta(seconds=60))
+    scale(deployment(api), state, "never", "always")
+    assert state.summary() == "1 evaluated, 0 skipped (incremental)"
+
+
+def test_autoscale_resource_reevaluates_at_schedule_boundary():
+    api = MagicMock()
+    state = ReconcileState(3600)
+    state.start_cycle(NOW)
+    # uptime on Monday 08:00-12:30, the resource is scaled down at 12:30
+    scale(deployment(api), state, "Mon-Mon 08:00-12:30 UTC", "never")
+    valid_until = state.evaluations[("Deployment", "default", "app")].valid_until
+    assert valid_until == datetime.datetime(
+        2024, 1, 1, 12, 30, tzinfo=datetime.timezone.utc
+    )
+
+    later = NOW + datetime.timedelta(minutes=31)
+    state.start_cycle(later)
+    scale(deployment(api), state, "Mon-Mon 08:00-12:30 UTC", "never", now=later)
+    assert state.summary() == "1 evaluated, 0 skipped (incremental)"
+
+
+def test_schedule_table_hit_records_transition():
+    table = ScheduleTable(NOW)
+    args = ("Mon-Mon 08:00-12:30 UTC", "never", "never", "never")
+    table.evaluate(*args)
+    with track_transitions() as transitions:
+        table.evaluate(*args)
+    assert transitions.next_transition == datetime.datetime(
+        2024, 1, 1, 12, 30, tzinfo=datetime.timezone.utc
+    )
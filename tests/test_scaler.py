@@ -5,9 +5,14 @@ from unittest.mock import MagicMock
 from unittest.mock import patch
 from unittest.mock import PropertyMock
 
+import requests
+from pykube import Deployment
+
 from kube_downscaler.scaler import autoscale_jobs
 from kube_downscaler.scaler import DOWNTIME_REPLICAS_ANNOTATION
 from kube_downscaler.scaler import EXCLUDE_ANNOTATION
+from kube_downscaler.scaler import get_resources
+from kube_downscaler.scaler import iter_namespace_batches
 from kube_downscaler.scaler import ORIGINAL_REPLICAS_ANNOTATION
 from kube_downscaler.scaler import scale
 from kube_downscaler.scaler import scale_down_jobs
@@ -18,6 +23,8 @@ def test_scale_custom_timeout(monkeypatch):
     api_server_timeout = 15  # Defined by the user
     api = MagicMock()
     api.timeout = 15  # Expected timeout
+    # empty lists without a continue token, the last page
+    api.get.return_value.json.return_value = {"metadata": {"continue": ""}, "items": []}
 
     mock_get_kube_api = MagicMock(return_value=api)
     monkeypatch.setattr("kube_downscaler.helper.MAX_RETRIES", 0, raising=False)
@@ -57,10 +64,8 @@ def test_scaler_always_up(monkeypatch):
     monkeypatch.setattr(
         "kube_downscaler.scaler.helper.get_kube_api", MagicMock(return_value=api)
     )
-    monkeypatch.setattr(
-        "kube_downscaler.scaler.helper.call_with_exponential_backoff",
-        MagicMock(return_value=api),
-    )
+    monkeypatch.setattr("kube_downscaler.helper.MAX_RETRIES", 0, raising=False)
+    monkeypatch.setattr("kube_downscaler.helper.TOKEN_BUCKET", None, raising=False)
 
     def get(url, version, **kwargs):
         if url == "pods":
@@ -85,8 +90,8 @@ def test_scaler_always_up(monkeypatch):
         elif url == "namespaces":
             data = {
                 "items": [
-                    {"name": "ns-1", "metadata": {}},
-                    {"name": "ns-2", "metadata": {}},
+                    {"metadata": {"name": "ns-1"}},
+                    {"metadata": {"name": "ns-2"}},
                 ]
             }
         else:
@@ -236,7 +241,7 @@ def test_scaler_namespace_excluded(monkeypatch):
     def get(url, version, **kwargs):
         if url == "pods":
             data = {"items": []}
-        elif url == "deployments":
+        elif url == "deployments?fieldSelector=metadata.namespace%21%3Dsystem-ns":
             data = {
                 "items": [
                     {
@@ -324,7 +329,7 @@ def test_scaler_namespace_excluded_regex(monkeypatch):
     def get(url, version, **kwargs):
         if url == "pods":
             data = {"items": []}
-        elif url == "deployments":
+        elif url == "deployments?fieldSelector=metadata.namespace%21%3Ddef":
             data = {
                 "items": [
                     {
@@ -4639,4 +4644,305 @@ def test_scaler_upscale_hpa_original_replicas_lte_max_replicas(
         },
         "spec": {"maxReplicas": 3, "minReplicas": 1},
     }
-    assert json.loads(api.patch.call_args[1]["data"]) == patch_data
\ No newline at end of file
+    assert json.loads(api.patch.call_args[1]["data"]) == patch_data
+
+def test_get_resources_paginated(monkeypatch):
+    monkeypatch.setattr("kube_downscaler.helper.MAX_RETRIES", 0, raising=False)
+    monkeypatch.setattr("kube_downscaler.helper.TOKEN_BUCKET", None, raising=False)
+    monkeypatch.setattr("kube_downscaler.helper.LIST_PAGE_SIZE", 1)
+    api = MagicMock()
+    pages = [
+        {
+            "metadata": {"continue": "token-1"},
+            "items": [{"metadata": {"name": "deploy-1", "namespace": "ns-1"}}],
+        },
+        {
+            "metadata": {},
+            "items": [{"metadata": {"name": "deploy-2", "namespace": "ns-2"}}],
+        },
+    ]
+
+    def get(url, version, **kwargs):
+        assert url == "deployments"
+        assert kwargs["params"]["limit"] == 1
+        response = MagicMock()
+        response.json.return_value = pages.pop(0)
+        return response
+
+    api.get = get
+
+    resources, _ = get_resources(Deployment, api, frozenset(), frozenset())
+
+    assert [r.name for r in resources] == ["deploy-1", "deploy-2"]
+
+
+def test_get_resources_paginated_error_on_later_page(monkeypatch, caplog):
+    monkeypatch.setattr("kube_downscaler.helper.MAX_RETRIES", 0, raising=False)
+    monkeypatch.setattr("kube_downscaler.helper.TOKEN_BUCKET", None, raising=False)
+    monkeypatch.setattr("kube_downscaler.helper.LIST_PAGE_SIZE", 1)
+    api = MagicMock()
+
+    def get(url, version, **kwargs):
+        response = MagicMock()
+        if "continue" in kwargs["params"]:
+            response.status_code = 429
+            response.raise_for_status.side_effect = requests.HTTPError(
+                response=response
+            )
+        response.json.return_value = {
+            "metadata": {"continue": "token-1"},
+            "items": [{"metadata": {"name": "deploy-1", "namespace": "ns-1"}}],
+        }
+        return response
+
+    api.get = get
+
+    resources, _ = get_resources(Deployment, api, frozenset(), frozenset())
+
+    assert [r.name for r in resources] == ["deploy-1"]
+    assert "429 Too Many Requests" in caplog.text
+
+
+def test_iter_namespace_batches_lists_the_next_page_after_processing(monkeypatch):
+    monkeypatch.setattr("kube_downscaler.helper.MAX_RETRIES", 0, raising=False)
+    monkeypatch.setattr("kube_downscaler.helper.TOKEN_BUCKET", None, raising=False)
+    monkeypatch.setattr("kube_downscaler.helper.LIST_PAGE_SIZE", 2)
+    api = MagicMock()
+    pages = [
+        {
+            "metadata": {"continue": "token-1"},
+            "items": [
+                {"metadata": {"name": "deploy-1", "namespace": "ns-1"}},
+                {"metadata": {"name": "deploy-2", "namespace": "ns-2"}},
+            ],
+        },
+        {
+            "metadata": {"continue": ""},
+            "items": [{"metadata": {"name": "deploy-3", "namespace": "ns-2"}}],
+        },
+    ]
+    requested = []
+
+    def get(url, version, **kwargs):
+        requested.append(kwargs["params"].get("continue"))
+        response = MagicMock()
+        response.json.return_value = pages[len(requested) - 1]
+        return response
+
+    api.get = get
+
+    batches = iter_namespace_batches(
+        api,
+        Deployment,
+        frozenset(),
+        {"ns-1": None, "ns-2": None},
+        frozenset(),
+        frozenset(),
+        frozenset(),
+        {"ns-1": "context-1", "ns-2": "context-2"},
+    )
+
+    first_page = next(batches)
+    assert requested == [None]
+    assert [
+        ([r.name for r in resources], context) for resources, context in first_page
+    ] == [(["deploy-1"], "context-1"), (["deploy-2"], "context-2")]
+    second_page = next(batches)
+    assert requested == [None, "token-1"]
+    assert [[r.name for r in resources] for resources, _ in second_page] == [
+        ["deploy-3"]
+    ]
+    assert next(batches, None) is None
+
+
+def test_get_resources_constrained_concurrent(monkeypatch):
+    monkeypatch.setattr("kube_downscaler.helper.MAX_RETRIES", 0, raising=False)
+    monkeypatch.setattr("kube_downscaler.helper.TOKEN_BUCKET", None, raising=False)
+    monkeypatch.setattr("kube_downscaler.helper.LIST_CONCURRENCY", 4)
+    api = MagicMock()
+    namespaces = frozenset(f"ns-{i}" for i in range(10))
+
+    def get(url, version, **kwargs):
+        namespace = kwargs["namespace"]
+        response = MagicMock()
+        response.json.return_value = {
+            "items": [
+                {"metadata": {"name": f"deploy-{namespace}", "namespace": namespace}}
+            ]
+        }
+        return response
+
+    api.get = get
+
+    resources, _ = get_resources(Deployment, api, namespaces, frozenset())
+
+    assert sorted(r.namespace for r in resources) == sorted(namespaces)
+
+
+def test_scaler_workers_process_all_namespaces(monkeypatch):
+    api = MagicMock()
+    monkeypatch.setattr(
+        "kube_downscaler.scaler.helper.get_kube_api", MagicMock(return_value=api)
+    )
+    monkeypatch.setattr("kube_downscaler.helper.MAX_RETRIES", 0, raising=False)
+    monkeypatch.setattr("kube_downscaler.helper.TOKEN_BUCKET", None, raising=False)
+    namespaces = [f"ns-{i}" for i in range(8)]
+
+    def get(url, version, **kwargs):
+        if url == "pods":
+            data = {"items": []}
+        elif url == "deployments":
+            data = {
+                "items": [
+                    {
+                        "metadata": {
+                            "name": f"deploy-{i}",
+                            "namespace": namespace,
+                            "creationTimestamp": "2019-03-01T16:38:00Z",
+                        },
+                        "spec": {"replicas": 1},
+                    }
+                    for namespace in namespaces
+                    for i in range(3)
+                ]
+            }
+        elif url == "namespaces":
+            data = {"items": [{"metadata": {"name": ns}} for ns in namespaces]}
+        else:
+            raise Exception(f"unexpected call: {url}, {version}, {kwargs}")
+
+        response = MagicMock()
+        response.json.return_value = data
+        return response
+
+    api.get = get
+    # MagicMock call recording is not thread-safe, list.append is
+    patches = []
+    api.patch = lambda **kwargs: patches.append(kwargs) or MagicMock()
+
+    scale(
+        constrained_downscaler=False,
+        namespaces=[],
+        upscale_period="never",
+        downscale_period="never",
+        default_uptime="never",
+        default_downtime="always",
+        upscale_target_only=False,
+        include_resources=frozenset(["deployments"]),
+        exclude_namespaces=[],
+        exclude_deployments=[],
+        dry_run=False,
+        grace_period=300,
+        admission_controller="",
+        api_server_timeout=10,
+        max_retries_on_conflict=0,
+        workers=4,
+    )
+
+    assert len(patches) == 24
+    for kwargs in patches:
+        assert json.loads(kwargs["data"])["spec"]["replicas"] == 0
+
+
+def test_get_resources_server_side_selectors(monkeypatch):
+    monkeypatch.setattr("kube_downscaler.helper.MAX_RETRIES", 0, raising=False)
+    monkeypatch.setattr("kube_downscaler.helper.TOKEN_BUCKET", None, raising=False)
+    monkeypatch.setattr("kube_downscaler.helper.LIST_PAGE_SIZE", 100)
+    api = MagicMock()
+    calls = []
+
+    def get(url, version, **kwargs):
+        calls.append(kwargs)
+        response = MagicMock()
+        response.json.return_value = {"metadata": {}, "items": []}
+        return response
+
+    api.get = get
+
+    resources, _ = get_resources(
+        Deployment,
+        api,
+        frozenset(),
+        frozenset([re.compile("kube-system"), re.compile("team-.*")]),
+    )
+    assert calls[-1]["params"] == {
+        "fieldSelector": "metadata.namespace!=kube-system",
+        "limit": 100,
+    }
+
+    # namespaces are listed one by one, no field selector needed
+    get_resources(
+        Deployment,
+        api,
+        frozenset(["default"]),
+        frozenset([re.compile("kube-system")]),
+    )
+    assert calls[-1]["namespace"] == "default"
+    assert calls[-1]["params"] == {"limit": 100}
+
+
+def test_scaler_upscales_resource_whose_labels_stopped_matching(monkeypatch):
+    api = MagicMock()
+    monkeypatch.setattr(
+        "kube_downscaler.scaler.helper.get_kube_api", MagicMock(return_value=api)
+    )
+    monkeypatch.setattr("kube_downscaler.helper.MAX_RETRIES", 0, raising=False)
+    monkeypatch.setattr("kube_downscaler.helper.TOKEN_BUCKET", None, raising=False)
+    listed = []
+
+    def get(url, version, **kwargs):
+        if url == "pods":
+            data = {"items": []}
+        elif url == "deployments":
+            listed.append(kwargs.get("params"))
+            data = {
+                "items": [
+                    {
+                        "metadata": {
+                            "name": "deploy-1",
+                            "namespace": "default",
+                            "creationTimestamp": "2019-03-01T16:38:00Z",
+                            # downscaled while it was labeled app=a
+                            "labels": {"app": "b"},
+                            "annotations": {ORIGINAL_REPLICAS_ANNOTATION: "2"},
+                        },
+                        "spec": {"replicas": 0},
+                    }
+                ]
+            }
+        elif url == "namespaces":
+            data = {"items": [{"metadata": {"name": "default"}}]}
+        else:
+            raise Exception(f"unexpected call: {url}, {version}, {kwargs}")
+
+        response = MagicMock()
+        response.json.return_value = data
+        return response
+
+    api.get = get
+
+    scale(
+        constrained_downscaler=False,
+        namespaces=frozenset(),
+        upscale_period="never",
+        downscale_period="never",
+        default_uptime="never",
+        default_downtime="always",
+        upscale_target_only=False,
+        include_resources=frozenset(["deployments"]),
+        exclude_namespaces=frozenset(),
+        exclude_deployments=frozenset(),
+        dry_run=False,
+        grace_period=300,
+        admission_controller="",
+        api_server_timeout=10,
+        max_retries_on_conflict=0,
+        matching_labels=frozenset([re.compile("app=a")]),
+    )
+
+    # not filtered by the API server, the labels are matched client-side
+    assert "labelSelector" not in str(listed)
+    assert api.patch.call_count == 1
+    patch_data = json.loads(api.patch.call_args[1]["data"])
+    assert patch_data["spec"]["replicas"] == 2
+    assert patch_data["metadata"]["annotations"][ORIGINAL_REPLICAS_ANNOTATION] is None
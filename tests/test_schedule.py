@@ -0,0 +1,67 @@
+from datetime import datetime
+from datetime import timezone
+
+import pytest
+
+from kube_downscaler.schedule import evaluate_schedule
+from kube_downscaler.schedule import ScheduleTable
+
+# Sunday, November 26th 2017
+NOW = datetime(2017, 11, 26, 15, 33, tzinfo=timezone.utc)
+
+
+def test_evaluate_schedule_uptime_downtime():
+    assert evaluate_schedule(NOW, "always", "never", "never", "never") == (
+        True,
+        False,
+    )
+    assert evaluate_schedule(
+        NOW, "Mon-Fri 08:00-18:00 UTC", "never", "never", "never"
+    ) == (False, False)
+    assert evaluate_schedule(
+        NOW, "always", "Sat-Sun 00:00-24:00 UTC", "never", "never"
+    ) == (False, False)
+
+
+def test_evaluate_schedule_periods():
+    weekend = "Sat-Sun 15:30-16:00 UTC"
+    weekdays = "Mon-Fri 08:00-18:00 UTC"
+    assert evaluate_schedule(NOW, weekend, weekdays, weekend, weekdays) == (
+        True,
+        False,
+    )
+    assert evaluate_schedule(NOW, weekdays, weekend, weekdays, weekend) == (
+        False,
+        False,
+    )
+    assert evaluate_schedule(NOW, weekend, weekend, weekend, weekend) == (True, True)
+    assert evaluate_schedule(NOW, weekdays, "never", weekdays, "never") == (
+        True,
+        True,
+    )
+
+
+def test_schedule_table_evaluates_each_combination_once(monkeypatch):
+    calls = []
+
+    def matches_time_spec(time, spec):
+        calls.append(spec)
+        return spec == "always"
+
+    monkeypatch.setattr("kube_downscaler.schedule.matches_time_spec", matches_time_spec)
+    table = ScheduleTable(NOW)
+    for _ in range(10):
+        assert table.evaluate("always", "never", "never", "never") == (True, False)
+        assert table.evaluate("never", "never", "never", "never") == (False, False)
+    assert calls == ["always", "never", "never"]
+    assert (table.hits, table.misses) == (18, 2)
+    assert table.summary() == "2 unique schedules, 18 hits, 2 misses"
+
+
+def test_schedule_table_does_not_cache_errors():
+    table = ScheduleTable(NOW)
+    for _ in range(2):
+        with pytest.raises(ValueError):
+            table.evaluate("Mon-Thur 09:00-20:00 UTC", "never", "never", "never")
+    assert table.misses == 2
+    assert table.decisions == {}
@@ -0,0 +1,190 @@
+import datetime
+import json
+import logging
+import re
+from unittest.mock import MagicMock
+
+import pytest
+from pykube.exceptions import HTTPError
+
+from kube_downscaler.events import micro_time
+from kube_downscaler.scaler import scale
+from kube_downscaler.sharding import PeerShards
+from kube_downscaler.sharding import shard_owner
+from kube_downscaler.sharding import ShardingConfig
+from kube_downscaler.sharding import StaticShards
+
+NAMESPACES = [f"ns-{i}" for i in range(1000)]
+
+
+pytestmark = pytest.mark.usefixtures("no_retries")
+
+
+def owners(members):
+    return {namespace: shard_owner(namespace, members) for namespace in NAMESPACES}
+
+
+def test_shard_owner_moves_only_the_namespaces_of_a_joining_member():
+    before = owners(["a", "b", "c"])
+    after = owners(["a", "b", "c", "d"])
+    moved = [
+        namespace for namespace in NAMESPACES if before[namespace] != after[namespace]
+    ]
+    assert all(after[namespace] == "d" for namespace in moved)
+    assert 200 < len(moved) < 300
+
+
+def test_shard_owner_moves_only_the_namespaces_of_a_leaving_member():
+    before = owners(["a", "b", "c"])
+    after = owners(["a", "c"])
+    for namespace in NAMESPACES:
+        if before[namespace] != "b":
+            assert after[namespace] == before[namespace]
+
+
+def test_static_shards_partition_namespaces():
+    owned = [StaticShards(index, 3).owned(NAMESPACES) for index in range(3)]
+    assert sorted(sum(owned, [])) == sorted(NAMESPACES)
+    assert all(250 < len(shard) < 420 for shard in owned)
+    assert StaticShards(0, 1).owned(NAMESPACES) == NAMESPACES
+    assert StaticShards(1, 3).status() == "shard 1 of 0, 1, 2"
+
+
+def lease(holder, renew_time, duration=15):
+    return {
+        "metadata": {"name": f"group-{holder}", "namespace": "default"},
+        "spec": {
+            "holderIdentity": holder,
+            "leaseDurationSeconds": duration,
+            "renewTime": micro_time(renew_time),
+        },
+    }
+
+
+def test_peer_shards_discover_live_peers(caplog):
+    caplog.set_level(logging.INFO)
+    now = datetime.datetime.now(datetime.timezone.utc)
+    api = MagicMock()
+    api.get.return_value.json.return_value = {
+        "items": [
+            lease("a", now),
+            lease("b", now - datetime.timedelta(seconds=5)),
+            # expired: the replica crashed without deleting its Lease
+            lease("c", now - datetime.timedelta(hours=1)),
+        ]
+    }
+    shards = PeerShards(
+        MagicMock(get=lambda: api),
+        ShardingConfig(dynamic=True, group="group", identity="a"),
+    )
+
+    shards.step()
+
+    assert api.patch.call_args[1]["url"] == "/leases/group-a"
+    assert (
+        api.get.call_args[1]["url"]
+        == "leases?labelSelector=downscaler%2Fshard-group%3Dgroup"
+    )
+    assert shards.wait_for_change(0)
+    assert shards.members() == ["a", "b"]
+    assert not shards.wait_for_change(0)
+    assert "changed to 2 replicas, joined: b" in caplog.text
+    assert shards.status() == "shard a of 2 replicas in group group"
+
+
+def test_peer_shards_create_their_lease():
+    api = MagicMock()
+    api.raise_for_status.side_effect = [HTTPError(404, "not found"), None]
+    api.post.return_value.json.return_value = lease("a", datetime.datetime.now())
+    api.get.return_value.json.return_value = {"items": []}
+    shards = PeerShards(
+        MagicMock(get=lambda: api),
+        ShardingConfig(dynamic=True, group="group", identity="a"),
+    )
+
+    shards.step()
+
+    created = json.loads(api.post.call_args[1]["data"])
+    assert created["metadata"]["labels"] == {"downscaler/shard-group": "group"}
+    assert created["spec"]["holderIdentity"] == "a"
+    assert shards.members() == ["a"]
+
+
+def test_peer_shards_keep_the_last_known_peers_on_errors():
+    api = MagicMock()
+    api.raise_for_status.side_effect = HTTPError(500, "internal error")
+    shards = PeerShards(
+        MagicMock(get=lambda: api),
+        ShardingConfig(dynamic=True, group="group", identity="a"),
+    )
+    shards.peers = ["a", "b"]
+
+    shards.step()
+
+    assert shards.members() == ["a", "b"]
+
+
+def test_scale_only_lists_and_scales_the_namespaces_of_the_shard(monkeypatch):
+    api = MagicMock()
+    monkeypatch.setattr(
+        "kube_downscaler.scaler.helper.get_kube_api", MagicMock(return_value=api)
+    )
+    namespaces = [f"ns-{i}" for i in range(8)] + ["kube-system"]
+    shards = StaticShards(1, 2)
+    owned = shards.owned(namespaces[:-1])
+    listed = []
+
+    def get(url, version, namespace=None, **kwargs):
+        if url == "namespaces":
+            data = {"items": [{"metadata": {"name": ns}} for ns in namespaces]}
+        elif url in ("pods", "deployments"):
+            listed.append((url, namespace))
+            data = {
+                "items": (
+                    [
+                        {
+                            "metadata": {
+                                "name": "deploy",
+                                "namespace": namespace,
+                                "creationTimestamp": "2023-01-01T00:00:00Z",
+                            },
+                            "spec": {"replicas": 1},
+                        }
+                    ]
+                    if url == "deployments"
+                    else []
+                )
+            }
+        else:
+            raise Exception(f"unexpected call: {url}, {version}, {kwargs}")
+        response = MagicMock()
+        response.json.return_value = data
+        return response
+
+    api.get = get
+
+    scale(
+        constrained_downscaler=False,
+        namespaces=frozenset(),
+        upscale_period="never",
+        downscale_period="never",
+        default_uptime="never",
+        default_downtime="always",
+        upscale_target_only=False,
+        include_resources=frozenset(["deployments"]),
+        exclude_namespaces=frozenset([re.compile("kube-system")]),
+        exclude_deployments=frozenset(),
+        dry_run=False,
+        grace_period=300,
+        admission_controller="",
+        api_server_timeout=10,
+        max_retries_on_conflict=0,
+        shards=shards,
+    )
+
+    assert 0 < len(owned) < 8
+    assert sorted(listed) == sorted(
+        [("pods", ns) for ns in owned] + [("deployments", ns) for ns in owned]
+    )
+    patched = sorted(call[1]["namespace"] for call in api.patch.call_args_list)
+    assert patched == sorted(owned)
@@ -1,9 +1,13 @@
 from datetime import datetime
+from datetime import timedelta
 from datetime import timezone
 
 import pytest
 
 from kube_downscaler.helper import matches_time_spec
+from kube_downscaler.timespec import compile_time_spec
+from kube_downscaler.timespec import record_transition
+from kube_downscaler.timespec import track_transitions
 
 
 def test_invalid_time_spec():
@@ -11,6 +15,15 @@ def test_invalid_time_spec():
         matches_time_spec(datetime.now(), "")
 
 
+def test_invalid_clause_after_a_matching_one():
+    # every clause is validated when the spec is compiled, not only the ones evaluated before the first match
+    with pytest.raises(ValueError):
+        matches_time_spec(
+            datetime(2020, 4, 10, 10, 11, tzinfo=timezone.utc),
+            "Mon-Sun 00:00-24:00 UTC,Mon-Thur 09:00-20:00 Europe/London",
+        )
+
+
 def test_time_spec():
     assert not matches_time_spec(datetime.now(), "never")
     assert matches_time_spec(datetime.now(), "always")
@@ -74,3 +87,157 @@ def test_week_starts_sunday():
     assert matches_time_spec(dt, "Sun-Fri 15:30-16:00 UTC")
     assert matches_time_spec(dt, "Sun-Mon 00:00-16:00 UTC")
     assert not matches_time_spec(dt, "Sun-Mon 00:00-15:00 UTC")
+
+
+def test_compiled_time_spec_is_cached():
+    compile_time_spec.cache_clear()
+    dt = datetime(2017, 11, 26, 15, 33, tzinfo=timezone.utc)
+    spec = "Mon-Fri 08:00-18:00 UTC, Sun-Sun 15:30-16:00 Europe/Berlin"
+    for _ in range(3):
+        matches_time_spec(dt, spec)
+    info = compile_time_spec.cache_info()
+    assert info.misses == 1
+    assert info.hits == 2
+
+
+def _bit(bitmap: bytes, minute_of_week: int) -> bool:
+    return bool(bitmap[minute_of_week >> 3] >> (minute_of_week & 7) & 1)
+
+
+def test_compiled_time_spec_benchmark(benchmark, record_property):
+    """Microbenchmark: matching a cached compiled spec against parsing the spec on every call, as before."""
+    spec = "Mon-Fri 08:00-18:00 Europe/Berlin,Sat-Sat 10:00-12:00 Europe/Berlin,2023-01-01T00:00:00+00:00-2023-01-02T00:00:00+00:00"
+    dt = datetime(2023, 1, 9, 12, 0, tzinfo=timezone.utc)
+
+    def parse_every_call():
+        return compile_time_spec.__wrapped__(spec).matches(dt)
+
+    assert parse_every_call() == matches_time_spec(dt, spec) is True
+    parsed = benchmark("parse_every_call", parse_every_call, number=200)
+    cached = benchmark("cached", lambda: matches_time_spec(dt, spec), number=200)
+    record_property("per_call_speedup", parsed / cached)
+
+
+def test_compiled_time_spec_keyed_by_defaults():
+    compiled = compile_time_spec("08:00-18:00", "UTC", "Mon-Fri")
+    other = compile_time_spec("08:00-18:00", "UTC", "Sat-Sun")
+    assert other is not compiled
+    assert compile_time_spec("08:00-18:00", "UTC", "Mon-Fri") is compiled
+
+
+def test_recurring_time_spec_bitmap():
+    compiled = compile_time_spec("Mon-Fri 08:00-18:00 UTC")
+    assert len(compiled.bitmaps) == 1
+    _, bitmap = compiled.bitmaps[0]
+    assert len(bitmap) * 8 == 7 * 24 * 60
+    # Monday 07:59, 08:00, 17:59 and 18:00
+    assert not _bit(bitmap, 7 * 60 + 59)
+    assert _bit(bitmap, 8 * 60)
+    assert _bit(bitmap, 17 * 60 + 59)
+    assert not _bit(bitmap, 18 * 60)
+    # Saturday 12:00
+    assert not _bit(bitmap, 5 * 1440 + 12 * 60)
+
+
+def test_recurring_time_spec_clauses_are_merged_per_zone():
+    compiled = compile_time_spec(
+        "Mon-Fri 08:00-12:00 UTC, Mon-Fri 13:00-18:00 UTC, Sat-Sat 10:00-11:00 Europe/Berlin"
+    )
+    assert len(compiled.bitmaps) == 2
+    _, utc_bitmap = compiled.bitmaps[0]
+    assert _bit(utc_bitmap, 9 * 60)
+    assert not _bit(utc_bitmap, 12 * 60 + 30)
+    assert _bit(utc_bitmap, 14 * 60)
+
+
+def test_recurring_time_spec_dst():
+    # Europe/Berlin is UTC+1 in winter and UTC+2 in summer
+    spec = "Mon-Fri 08:00-09:00 Europe/Berlin"
+    assert matches_time_spec(datetime(2023, 1, 9, 7, 30, tzinfo=timezone.utc), spec)
+    assert not matches_time_spec(datetime(2023, 1, 9, 6, 30, tzinfo=timezone.utc), spec)
+    assert matches_time_spec(datetime(2023, 7, 10, 6, 30, tzinfo=timezone.utc), spec)
+    assert not matches_time_spec(
+        datetime(2023, 7, 10, 7, 30, tzinfo=timezone.utc), spec
+    )
+
+
+def test_default_timezone_and_weekframe(monkeypatch):
+    # Sunday, November 26th 2017
+    dt = datetime(2017, 11, 26, 15, 33, tzinfo=timezone.utc)
+    monkeypatch.setattr("kube_downscaler.helper.DEFAULT_TIMEZONE", None)
+    with pytest.raises(ValueError):
+        matches_time_spec(dt, "Sat-Sun 15:30-16:00")
+    monkeypatch.setattr("kube_downscaler.helper.DEFAULT_TIMEZONE", "UTC")
+    monkeypatch.setattr("kube_downscaler.helper.DEFAULT_WEEKFRAME", "Sat-Sun")
+    assert matches_time_spec(dt, "Sat-Sun 15:30-16:00")
+    assert matches_time_spec(dt, "15:30-16:00")
+    monkeypatch.setattr("kube_downscaler.helper.DEFAULT_WEEKFRAME", "Mon-Fri")
+    assert not matches_time_spec(dt, "15:30-16:00")
+
+
+def test_next_transition_recurring():
+    # Monday, January 9th 2023 07:30 in Europe/Berlin (UTC+1)
+    dt = datetime(2023, 1, 9, 6, 30, 15, tzinfo=timezone.utc)
+    spec = compile_time_spec("Mon-Fri 08:00-20:00 Europe/Berlin")
+    assert spec.next_transition(dt) == datetime(2023, 1, 9, 7, 0, tzinfo=timezone.utc)
+    dt = datetime(2023, 1, 9, 7, 0, tzinfo=timezone.utc)
+    assert spec.next_transition(dt) == datetime(2023, 1, 9, 19, 0, tzinfo=timezone.utc)
+    # Friday evening: next transition is on Monday morning
+    dt = datetime(2023, 1, 13, 20, 0, tzinfo=timezone.utc)
+    assert spec.next_transition(dt) == datetime(2023, 1, 16, 7, 0, tzinfo=timezone.utc)
+
+
+def test_next_transition_keeps_the_time_zone():
+    # Monday, January 9th 2023 07:30 in Europe/Berlin, given in UTC-5
+    new_york = timezone(timedelta(hours=-5))
+    dt = datetime(2023, 1, 9, 1, 30, tzinfo=new_york)
+    spec = compile_time_spec("Mon-Fri 08:00-20:00 Europe/Berlin")
+    transition = spec.next_transition(dt)
+    assert transition == datetime(2023, 1, 9, 7, 0, tzinfo=timezone.utc)
+    assert transition.tzinfo == new_york
+    assert transition.hour == 2
+    assert not spec.matches(dt)
+    assert spec.matches(transition)
+
+
+def test_next_transition_across_dst():
+    # Sunday, March 26th 2023: Europe/Berlin switches from UTC+1 to UTC+2
+    dt = datetime(2023, 3, 25, 12, 0, tzinfo=timezone.utc)
+    spec = compile_time_spec("Mon-Fri 08:00-20:00 Europe/Berlin")
+    assert spec.next_transition(dt) == datetime(2023, 3, 27, 6, 0, tzinfo=timezone.utc)
+
+
+def test_next_transition_week_wrap_and_constant():
+    # Sunday, November 26th 2017
+    dt = datetime(2017, 11, 26, 15, 33, tzinfo=timezone.utc)
+    spec = compile_time_spec("Sun-Mon 00:00-24:00 UTC")
+    assert spec.next_transition(dt) == datetime(2017, 11, 28, 0, 0, tzinfo=timezone.utc)
+    assert compile_time_spec("Mon-Sun 00:00-24:00 UTC").next_transition(dt) is None
+    assert compile_time_spec("always").next_transition(dt) is None
+
+
+def test_next_transition_absolute():
+    dt = datetime(2017, 11, 26, 15, 33, tzinfo=timezone.utc)
+    spec = compile_time_spec(
+        "2017-11-26T14:00:00+00:00-2017-11-26T16:00:00+00:00, 2017-12-01T00:00:00+00:00-2017-12-02T00:00:00+00:00"
+    )
+    assert spec.next_transition(dt) == datetime(
+        2017, 11, 26, 16, 0, 1, tzinfo=timezone.utc
+    )
+    dt = datetime(2017, 11, 27, tzinfo=timezone.utc)
+    assert spec.next_transition(dt) == datetime(2017, 12, 1, tzinfo=timezone.utc)
+
+
+def test_track_transitions():
+    dt = datetime(2017, 11, 26, 15, 33, tzinfo=timezone.utc)
+    with track_transitions() as tracker:
+        matches_time_spec(dt, "Sat-Sun 15:30-16:00 UTC")
+        matches_time_spec(dt, "Mon-Fri 08:00-18:00 UTC")
+        record_transition(datetime(2017, 11, 26, 15, 45, tzinfo=timezone.utc))
+    assert tracker.next_transition == datetime(
+        2017, 11, 26, 15, 45, tzinfo=timezone.utc
+    )
+    matches_time_spec(dt, "Sat-Sun 15:34-16:00 UTC")
+    assert tracker.next_transition == datetime(
+        2017, 11, 26, 15, 45, tzinfo=timezone.utc
+    )